@@ -0,0 +1,73 @@
+"""
+    bench_hydration.py
+
+    Times hydrating entities from parsed responses with their from_dict
+    methods, and with those of their lazy versions where they have one.
+
+        python benchmarks/bench_hydration.py [iterations]
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import sys
+import timeit
+
+from securesubmit.entities.check import HpsCheckResponse
+from securesubmit.entities.credit import HpsCharge, HpsReportTransactionDetails, HpsReportTransactionSummary, \
+    HpsReversal
+from securesubmit.entities.debit import HpsDebitAuthorization
+from securesubmit.entities.gift import HpsGiftCardAlias, HpsGiftCardSale
+from securesubmit.entities.lazy import lazy_type
+from securesubmit.services import xmlbackend
+from securesubmit.tests import sample_responses
+
+CASES = [
+    ('HpsCharge', HpsCharge, sample_responses.CREDIT_SALE),
+    ('HpsReversal', HpsReversal, sample_responses.CREDIT_REVERSAL),
+    ('HpsDebitAuth', HpsDebitAuthorization, sample_responses.DEBIT_SALE),
+    ('ReportDetails', HpsReportTransactionDetails, sample_responses.REPORT_TXN_DETAIL),
+    ('ReportSummary', HpsReportTransactionSummary, sample_responses.REPORT_ACTIVITY),
+    ('HpsGiftSale', HpsGiftCardSale, sample_responses.GIFT_CARD_SALE),
+    ('HpsGiftAlias', HpsGiftCardAlias, sample_responses.GIFT_CARD_ALIAS),
+    ('HpsCheck', HpsCheckResponse, sample_responses.CHECK_SALE),
+]
+
+
+def _hydrate(entity_type, rsp):
+    if issubclass(entity_type, HpsReportTransactionSummary):
+        return entity_type.from_dict(rsp, None)
+    return entity_type.from_dict(rsp)
+
+
+def _read_three(entity_type, rsp):
+    """Hydrate and read the fields most callers look at."""
+    entities = _hydrate(entity_type, rsp)
+    if not isinstance(entities, list):
+        entities = [entities]
+    for entity in entities:
+        entity.transaction_id, entity.response_code, getattr(entity, 'authorization_code', None)
+
+
+def _best(function, iterations):
+    return min(timeit.repeat(function, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main(iterations=20000):
+    print '%-14s %12s %12s %12s %12s' % ('entity', 'from_dict', 'read 3', 'lazy', 'lazy read 3')
+    for name, entity_type, raw_response in CASES:
+        rsp = xmlbackend.backend.parse(raw_response)['Envelope']['Body']['PosResponse']['Ver1.0']
+        count = iterations if name != 'ReportSummary' else max(1, iterations / 50)
+        hydrated_types = [entity_type]
+        if lazy_type(entity_type) is not entity_type:
+            hydrated_types.append(lazy_type(entity_type))
+
+        timings = []
+        for hydrated_type in hydrated_types:
+            timings.append(_best(lambda: _hydrate(hydrated_type, rsp), count))
+            timings.append(_best(lambda: _read_three(hydrated_type, rsp), count))
+        print '%-14s' % name + ''.join(' %12.2f' % timing for timing in timings)
+    print '(microseconds per response)'
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
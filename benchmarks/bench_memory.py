@@ -0,0 +1,115 @@
+"""
+    bench_memory.py
+
+    Compares the memory held by a large activity report and a large
+    customer export hydrated into the regular entities and into the
+    slotted ones of securesubmit.entities.compact. Each case is built in
+    a forked child, so that one case's garbage does not skew the next.
+
+        python benchmarks/bench_memory.py [rows]
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import gc
+import os
+import sys
+import time
+
+from securesubmit.entities.compact import compact_type
+from securesubmit.entities.credit import HpsReportTransactionSummary
+from securesubmit.entities.payplan import HpsPayPlanCustomerCollection
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def _rss():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * _PAGE_SIZE
+
+
+def _report(rows):
+    details = []
+    for i in xrange(rows):
+        details.append({
+            'GatewayTxnId': str(1000 + i),
+            'OriginalGatewayTxnId': None,
+            'MaskedCardNbr': '411111******1111',
+            'GatewayRspCode': '0',
+            'GatewayRspMsg': 'Success',
+            'IssuerRspCode': '00',
+            'IssuerRspText': 'APPROVAL',
+            'Amt': '10.00',
+            'SettlementAmt': '10.00',
+            'TxnUtcDT': '2016-01-01T12:00:00.123Z',
+            'ServiceName': 'CreditSale',
+        })
+    return {
+        'Header': {'GatewayTxnId': '1', 'GatewayRspCode': '0', 'GatewayRspMsg': 'Success'},
+        'Transaction': {'ReportActivity': {'Details': details}},
+    }
+
+
+def _customers(rows):
+    results = []
+    for i in xrange(rows):
+        results.append({
+            'customerKey': str(i),
+            'customerIdentifier': 'customer-%d' % i,
+            'firstName': 'Bill',
+            'lastName': 'Johnson',
+            'customerStatus': 'Active',
+            'primaryEmail': 'bill@example.com',
+            'phoneDay': '5555555555',
+            'addressLine1': '1 Heartland Way',
+            'city': 'Jeffersonville',
+            'stateProvince': 'IN',
+            'zipPostalCode': '47130',
+            'country': 'USA',
+        })
+    return {'offset': 0, 'limit': rows, 'total': rows, 'results': results}
+
+
+CASES = [
+    ('ReportSummary', HpsReportTransactionSummary, _report,
+     lambda entity_type, rsp: entity_type.from_dict(rsp, None)),
+    ('CustomerCollection', HpsPayPlanCustomerCollection, _customers,
+     lambda entity_type, rsp: entity_type.from_dict(rsp)),
+]
+
+
+def _measure(entity_type, rsp, hydrate):
+    """The bytes and seconds taken to hydrate `rsp`, in a forked child."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        gc.collect()
+        before = _rss()
+        start = time.time()
+        result = hydrate(entity_type, rsp)
+        elapsed = time.time() - start
+        gc.collect()
+        os.write(write_end, '%d %f' % (_rss() - before, elapsed))
+        del result
+        os._exit(0)
+
+    os.close(write_end)
+    output = os.read(read_end, 64)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    held, elapsed = output.split()
+    return int(held), float(elapsed)
+
+
+def main(rows=50000):
+    print '%-20s %-8s %12s %12s %10s' % ('entity', 'type', 'held (MB)', 'bytes/row', 'build (s)')
+    for name, entity_type, build, hydrate in CASES:
+        rsp = build(rows)
+        for label, hydrated_type in (('regular', entity_type), ('slotted', compact_type(entity_type))):
+            held, elapsed = _measure(hydrated_type, rsp, hydrate)
+            print '%-20s %-8s %12.1f %12d %10.3f' % (name, label, held / 1048576.0, held / rows, elapsed)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,62 @@
+"""
+    bench_processes.py
+
+    Times a job of charges spread over several merchants, run by the
+    process engine with one worker and with one worker per core. The
+    stub gateway answers from a process of its own, so that it doesn't
+    compete with the workers for a GIL.
+
+        python benchmarks/bench_processes.py [requests] [merchants]
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import multiprocessing
+import sys
+import time
+
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.services.processes import HpsProcessEngine
+from securesubmit.tests.stub_gateway import StubGateway, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+def _serve(urls):
+    gateway = StubGateway()
+    urls.put(gateway.url)
+    gateway._server.serve_forever()
+
+
+def _run(service_type, merchants, requests, processes):
+    with HpsProcessEngine(merchants, service_type=service_type, processes=processes) as engine:
+        # start the workers and their connections before timing
+        list(engine.run([(merchant, 'charge', (10, 'usd', TestCreditCard.valid_visa)) for merchant in merchants]))
+        started = time.time()
+        failures = sum(1 for result in engine.run(requests) if not result.succeeded)
+        return time.time() - started, failures
+
+
+def main(count=2000, merchant_count=16):
+    urls = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(urls,))
+    server.daemon = True
+    server.start()
+
+    class Gateway(object):
+        url = urls.get()
+
+    service_type = stubbed(HpsCreditService, Gateway)
+    merchants = dict(('merchant%d' % i, stub_config()) for i in xrange(merchant_count))
+    names = sorted(merchants)
+    requests = [(names[i % merchant_count], 'charge', (10, 'usd', TestCreditCard.valid_visa)) for i in xrange(count)]
+
+    print '%-10s %10s %12s %10s' % ('processes', 'seconds', 'requests/s', 'failures')
+    for processes in sorted(set([1, multiprocessing.cpu_count()])):
+        elapsed, failures = _run(service_type, merchants, requests, processes)
+        print '%-10d %10.2f %12.0f %10d' % (processes, elapsed, count / elapsed, failures)
+
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,79 @@
+"""
+    bench_raw.py
+
+    Times reading a response into what the services return: the dicts
+    and entities of the default mode, the single-pass parser the credit
+    service uses for charges, and the views of raw mode, each followed by
+    reading the fields a settlement job looks at.
+
+        python benchmarks/bench_raw.py [iterations]
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import sys
+import timeit
+
+from securesubmit.entities.credit import HpsCharge, HpsReportTransactionSummary
+from securesubmit.entities.gift import HpsGiftCardSale
+from securesubmit.services import xmlbackend
+from securesubmit.services.parser import parse_response
+from securesubmit.services.raw import parse_raw_response
+from securesubmit.tests import sample_responses
+
+
+def _from_dict(from_dict):
+    def hydrate(raw_response):
+        return from_dict(xmlbackend.backend.parse(raw_response)['Envelope']['Body']['PosResponse']['Ver1.0'])
+    return hydrate
+
+
+def _read_charge(charge):
+    return charge.transaction_id, charge.response_code, charge.authorization_code
+
+
+def _read_raw(response):
+    return response.gateway_txn_id, response.response_code, response.get('AuthCode')
+
+
+def _read_summary(transactions):
+    return [(transaction.transaction_id, transaction.amount) for transaction in transactions]
+
+
+def _read_raw_summary(response):
+    return [(row.get('GatewayTxnId'), row.get('Amt')) for row in response.all('Details')]
+
+
+CASES = [
+    ('HpsCharge', sample_responses.CREDIT_SALE, [
+        ('from_dict', lambda raw: _read_charge(_from_dict(HpsCharge.from_dict)(raw))),
+        ('parser', lambda raw: _read_charge(parse_response(raw, HpsCharge).entity)),
+        ('raw', lambda raw: _read_raw(parse_raw_response(raw))),
+    ]),
+    ('HpsGiftSale', sample_responses.GIFT_CARD_SALE, [
+        ('from_dict', lambda raw: _from_dict(HpsGiftCardSale.from_dict)(raw).balance_amount),
+        ('raw', lambda raw: parse_raw_response(raw).get('BalanceAmt')),
+    ]),
+    ('ReportSummary', sample_responses.REPORT_ACTIVITY, [
+        ('from_dict', lambda raw: _read_summary(
+            _from_dict(lambda rsp: HpsReportTransactionSummary.from_dict(rsp, None))(raw))),
+        ('raw', lambda raw: _read_raw_summary(parse_raw_response(raw))),
+    ]),
+]
+
+
+def _best(function, iterations):
+    return min(timeit.repeat(function, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main(iterations=2000):
+    print 'backend: %s' % xmlbackend.backend.name
+    print '%-14s %-10s %12s' % ('response', 'mode', 'us/response')
+    for name, raw_response, modes in CASES:
+        count = iterations if name != 'ReportSummary' else max(1, iterations / 50)
+        for mode, read in modes:
+            print '%-14s %-10s %12.2f' % (name, mode, _best(lambda: read(raw_response), count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,68 @@
+"""
+    bench_reports.py
+
+    Compares the peak memory and time of reading a large activity report
+    from the stub gateway with list, which parses the whole document
+    before hydrating it, and with iter_list, which hydrates each row as
+    its chunk arrives. Each case runs in a forked child, whose peak RSS
+    is its own.
+
+        python benchmarks/bench_reports.py [rows]
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import os
+import resource
+import sys
+import time
+
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.tests.sample_responses import _report_detail
+from securesubmit.tests.stub_gateway import StubGateway, pos_response, stub_config, stubbed
+
+CASES = [
+    ('list', lambda service: sum(1 for _ in service.list())),
+    ('iter_list', lambda service: sum(1 for _ in service.iter_list())),
+]
+
+
+def _measure(service, read):
+    """The rows read, peak KB and seconds taken by `read`, in a forked
+    child."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        start = time.time()
+        rows = read(service)
+        elapsed = time.time() - start
+        os.write(write_end, '%d %d %f' % (rows, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed))
+        os._exit(0)
+
+    os.close(write_end)
+    output = os.read(read_end, 64)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    rows, peak, elapsed = output.split()
+    return int(rows), int(peak), float(elapsed)
+
+
+def main(rows=50000):
+    report = pos_response('ReportActivity', ''.join(_report_detail(1000 + i) for i in xrange(rows)))
+    gateway = StubGateway(handler=lambda tag, body: report, compress=True).start()
+
+    print '%-10s %-12s %8s %14s %10s' % ('method', 'compressed', 'rows', 'peak RSS (MB)', 'seconds')
+    for compress in (False, True):
+        config = stub_config()
+        config.compress_responses = compress
+        service = stubbed(HpsCreditService, gateway)(config)
+        for name, read in CASES:
+            count, peak, elapsed = _measure(service, read)
+            print '%-10s %-12s %8d %14.1f %10.2f' % (name, compress, count, peak / 1024.0, elapsed)
+
+    gateway.stop()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,69 @@
+"""
+    bench_serializers.py
+
+    Times building and serializing transaction elements with the XML
+    backend's ElementTree against the compiled serializers.
+
+        python benchmarks/bench_serializers.py [iterations]
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import sys
+import timeit
+
+from securesubmit.entities import HpsTransactionDetails
+from securesubmit.services.serializers import serialize
+from securesubmit.services.xmlbackend import etree as Et
+from securesubmit.tests import element_requests
+from securesubmit.tests.test_data import TestCardHolder, TestCheck, TestCreditCard, TestGiftCard
+
+
+def _details():
+    details = HpsTransactionDetails()
+    details.memo = 'memo'
+    details.invoice_number = '12345'
+    return details
+
+
+_credit_sale = dict(
+    amount=10, card_data=TestCreditCard.valid_visa, card_holder=TestCardHolder.valid_card_holder,
+    request_multi_use_token=True, descriptor='descriptor', allow_partial_auth=False,
+    details=_details(), direct_market_data=None, cpc_req=False, card_present=False,
+    reader_present=False)
+
+_credit_auth = dict(_credit_sale)
+del _credit_auth['direct_market_data']
+
+CASES = [
+    ('CreditSale', element_requests.credit_sale, _credit_sale),
+    ('CreditAuth', element_requests.credit_auth, _credit_auth),
+    ('CreditReturn', element_requests.credit_return,
+     dict(amount=10, card_data='token', card_holder=None, details=_details())),
+    ('GiftCardSale', element_requests.gift_card_sale,
+     dict(amount=10, gift_card=TestGiftCard.valid_gift_card_manual, currency='usd', gratuity=None, tax=None)),
+    ('CheckSale', element_requests.check_sale,
+     dict(action='SALE', check=TestCheck.approve, amount=10)),
+]
+
+
+def _best(function, iterations):
+    return min(timeit.repeat(function, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main(iterations=20000):
+    print '%-14s %12s %12s %8s' % ('transaction', 'etree (us)', 'compiled (us)', 'speedup')
+    for tag, build, arguments in CASES:
+        reference_arguments = dict(arguments)
+        if tag in ('CreditReturn', 'CreditReversal'):
+            compiled_arguments = dict(arguments, card_present=False, reader_present=False)
+        else:
+            compiled_arguments = arguments
+
+        etree = _best(lambda: Et.tostring(build(**reference_arguments)), iterations)
+        compiled = _best(lambda: serialize(tag, **compiled_arguments).xml, iterations)
+        print '%-14s %12.2f %12.2f %7.1fx' % (tag, etree, compiled, etree / compiled)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -8,6 +8,7 @@
 
 import datetime
 
+from securesubmit.entities.fields import HpsField, HpsFieldMap
 from securesubmit.infrastructure.enums import HpsTransactionType
 
 
@@ -36,6 +37,29 @@ class HpsTokenData(object):
     token_value = None
 
 
+class HpsTransactionHeader(object):
+    gateway_rsp_code = None
+    gateway_rsp_msg = None
+    rsp_dt = None
+    client_txn_id = None
+
+
+_SERVICE_NAMES = {HpsTransactionType.Authorize: "CreditAuth",
+                  HpsTransactionType.Capture: "CreditAddToBatch",
+                  HpsTransactionType.Charge: "CreditSale",
+                  HpsTransactionType.Refund: "CreditReturn",
+                  HpsTransactionType.Reverse: "CreditReversal",
+                  HpsTransactionType.Verify: "CreditAccountVerify",
+                  HpsTransactionType.List: "ReportActivity",
+                  HpsTransactionType.Get: "ReportTxnDetail",
+                  HpsTransactionType.Void: "CreditVoid",
+                  HpsTransactionType.BatchClose: "BatchClose",
+                  HpsTransactionType.SecurityError: "SecurityError"}
+
+_TRANSACTION_TYPES = dict((service_name, transaction_type)
+                          for transaction_type, service_name in _SERVICE_NAMES.items())
+
+
 class HpsTransaction(object):
     _header = None
     transaction_id = None
@@ -44,11 +68,17 @@ class HpsTransaction(object):
     response_text = None
     reference_number = None
 
+    _header_type = HpsTransactionHeader
+    _field_map = HpsFieldMap(
+        HpsField('RspCode', 'response_code'),
+        HpsField('RspText', 'response_text'),
+        HpsField('RefNbr', 'reference_number'))
+
     @classmethod
     def from_dict(cls, rsp):
         # hydrate the header
         transaction = cls()
-        transaction._header = HpsTransactionHeader()
+        transaction._header = cls._header_type()
         if 'ClientTxnId' in rsp['Header']:
             transaction._header.client_txn_id = rsp['Header']['ClientTxnId']
 
@@ -62,16 +92,7 @@ class HpsTransaction(object):
 
         # hydrate the body
         if 'Transaction' in rsp:
-            item = rsp['Transaction'].itervalues().next()
-            if item is not None:
-                if 'RspCode' in item:
-                    transaction.response_code = item['RspCode']
-
-                if 'RspText' in item:
-                    transaction.response_text = item['RspText']
-
-                if 'RefNbr' in item:
-                    transaction.reference_number = item['RefNbr']
+            cls._field_map.hydrate(transaction, rsp['Transaction'].itervalues().next())
         else:
             transaction.response_code = rsp['Header']['GatewayRspCode']
             transaction.response_text = rsp['Header']['GatewayRspMsg']
@@ -80,39 +101,11 @@ class HpsTransaction(object):
 
     @staticmethod
     def _transaction_type_to_service_name(transaction_type):
-        options = {HpsTransactionType.Authorize: "CreditAuth",
-                   HpsTransactionType.Capture: "CreditAddToBatch",
-                   HpsTransactionType.Charge: "CreditSale",
-                   HpsTransactionType.Refund: "CreditReturn",
-                   HpsTransactionType.Reverse: "CreditReversal",
-                   HpsTransactionType.Verify: "CreditAccountVerify",
-                   HpsTransactionType.List: "ReportActivity",
-                   HpsTransactionType.Get: "ReportTxnDetail",
-                   HpsTransactionType.Void: "CreditVoid",
-                   HpsTransactionType.BatchClose: "BatchClose",
-                   HpsTransactionType.SecurityError: "SecurityError"}
-        if transaction_type in options.viewkeys():
-            return options[transaction_type]
-        else:
-            return ""
+        return _SERVICE_NAMES.get(transaction_type, "")
 
     @staticmethod
     def _service_name_to_transaction_type(service_name):
-        options = {"CreditAuth": HpsTransactionType.Authorize,
-                   "CreditAddToBatch": HpsTransactionType.Capture,
-                   "CreditSale": HpsTransactionType.Charge,
-                   "CreditReturn": HpsTransactionType.Refund,
-                   "CreditReversal": HpsTransactionType.Reverse,
-                   "CreditAccountVerify": HpsTransactionType.Verify,
-                   "ReportActivity": HpsTransactionType.List,
-                   "ReportTxnDetail": HpsTransactionType.Get,
-                   "CreditVoid": HpsTransactionType.Void,
-                   "BatchClose": HpsTransactionType.BatchClose,
-                   "SecurityError": HpsTransactionType.SecurityError}
-        if service_name in options.viewkeys():
-            return options[service_name]
-        else:
-            return None
+        return _TRANSACTION_TYPES.get(service_name)
 
 
 class HpsTransactionDetails(object):
@@ -122,13 +115,6 @@ class HpsTransactionDetails(object):
     customer_id = None
 
 
-class HpsTransactionHeader(object):
-    gateway_rsp_code = None
-    gateway_rsp_msg = None
-    rsp_dt = None
-    client_txn_id = None
-
-
 class HpsDirectMarketData(object):
     invoice_number = None
     ship_month = None
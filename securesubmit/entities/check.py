@@ -7,6 +7,7 @@
 """
 
 from securesubmit.entities import HpsConsumer, HpsTransaction
+from securesubmit.entities.fields import HpsField, HpsFieldMap
 
 
 class HpsCheck(object):
@@ -50,60 +51,43 @@ class HpsCheckHolder(HpsConsumer):
     courtesy_card = None
 
 
-class HpsCheckResponse(HpsTransaction):
-    authorization_code = None
-    customer_id = None
-    details = None
+class HpsCheckResponseDetails(object):
+    message_type = None
+    code = None
+    message = None
+    field_number = None
+    field_name = None
+
+    _field_map = HpsFieldMap(
+        HpsField('Type', 'message_type'),
+        HpsField('Code', 'code'),
+        HpsField('Message', 'message'),
+        HpsField('FieldNumber', 'field_number'),
+        HpsField('FieldName', 'field_name'))
 
     @classmethod
     def from_dict(cls, rsp):
-        response = rsp['Transaction'].itervalues().next()
-
-        sale = super(HpsCheckResponse, cls).from_dict(rsp)
-        if 'RspCode' in response:
-            sale.response_code = str(response['RspCode'])
-
-        if 'RspMessage' in response:
-            sale.response_text = response['RspMessage']
-
-        if 'AuthCode' in response:
-            sale.authorization_code = response['AuthCode']
+        details = cls()
+        cls._field_map.hydrate(details, rsp)
 
-        def _hydrate_rsp_details(check_info):
-            details = HpsCheckResponseDetails()
-            if 'Type' in check_info:
-                details.message_type = check_info['Type']
+        return details
 
-            if 'Code' in check_info:
-                details.code = check_info['Code']
 
-            if 'Message' in check_info:
-                details.message = check_info['Message']
+def _hydrate_rsp_details(check_info):
+    if not check_info:
+        return None
+    if not isinstance(check_info, list):
+        check_info = [check_info]
+    return [HpsCheckResponseDetails.from_dict(info) for info in check_info]
 
-            if 'FieldNumber' in check_info:
-                details.field_number = check_info['FieldNumber']
-
-            if 'FieldName' in check_info:
-                details.field_name = check_info['FieldName']
-
-            return details
-
-        if ('CheckRspInfo' in response and
-                len(response['CheckRspInfo']) > 0):
-            sale.details = []
-            if isinstance(response['CheckRspInfo'], list):
-                for details in response['CheckRspInfo']:
-                    sale.details.append(_hydrate_rsp_details(details))
-            else:
-                sale.details.append(
-                    _hydrate_rsp_details(response['CheckRspInfo']))
-
-        return sale
 
+class HpsCheckResponse(HpsTransaction):
+    authorization_code = None
+    customer_id = None
+    details = None
 
-class HpsCheckResponseDetails(object):
-    message_type = None
-    code = None
-    message = None
-    field_number = None
-    field_name = None
+    _field_map = HpsTransaction._field_map.extend(
+        HpsField('RspCode', 'response_code', str),
+        HpsField('RspMessage', 'response_text'),
+        HpsField('AuthCode', 'authorization_code'),
+        HpsField('CheckRspInfo', 'details', _hydrate_rsp_details))
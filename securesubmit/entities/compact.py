@@ -0,0 +1,99 @@
+"""
+    compact.py
+
+    Slotted versions of the entities that come back in large numbers,
+    such as the rows of an activity report or a customer export. They are
+    subclasses of the entities they stand for, with the same attributes
+    and defaults, but keep them in __slots__: an instance never allocates
+    a __dict__ unless an attribute the entity does not declare is set.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+from enum import Enum
+
+from securesubmit.entities import HpsTransaction, HpsTransactionHeader
+from securesubmit.entities.credit import HpsAuthorization, HpsReportTransactionDetails, HpsReportTransactionSummary
+from securesubmit.entities.payplan import (
+    HpsPayPlanCustomer,
+    HpsPayPlanCustomerCollection,
+    HpsPayPlanSchedule,
+    HpsPayPlanScheduleCollection)
+
+_DATA_TYPES = (type(None), bool, int, long, float, basestring, list, tuple, dict, Enum)
+
+
+def _defaults(entity_type):
+    """The data attributes `entity_type` declares, with their defaults."""
+    defaults = {}
+    for cls in reversed(entity_type.__mro__[:-1]):
+        for name, value in vars(cls).items():
+            if not name.startswith('__') and isinstance(value, _DATA_TYPES):
+                defaults[name] = value
+    return sorted(defaults.items())
+
+
+def slotted(entity_type, **class_attributes):
+    """A subclass of `entity_type` keeping the attributes it declares in
+    slots. `class_attributes` are set on the subclass, for the hooks
+    naming the types an entity hydrates its parts into."""
+    defaults = _defaults(entity_type)
+    initialize = entity_type.__init__ if entity_type.__init__ is not object.__init__ else None
+
+    def __init__(self, *args, **kwargs):
+        for name, default in defaults:
+            setattr(self, name, default)
+        if initialize is not None:
+            initialize(self, *args, **kwargs)
+
+    def __getstate__(self):
+        state = dict((name, getattr(self, name)) for name, _ in defaults)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    namespace = dict(class_attributes)
+    namespace.update({
+        '__slots__': tuple(name for name, _ in defaults),
+        '__init__': __init__,
+        '__getstate__': __getstate__,
+        '__setstate__': __setstate__,
+        '__module__': __name__,
+        '__doc__': 'The slotted version of {0}.'.format(entity_type.__name__),
+    })
+    return type('HpsSlotted' + entity_type.__name__[len('Hps'):], (entity_type,), namespace)
+
+
+HpsSlottedTransactionHeader = slotted(HpsTransactionHeader)
+HpsSlottedTransaction = slotted(HpsTransaction, _header_type=HpsSlottedTransactionHeader)
+HpsSlottedAuthorization = slotted(HpsAuthorization, _header_type=HpsSlottedTransactionHeader)
+HpsSlottedReportTransactionDetails = slotted(HpsReportTransactionDetails,
+                                             _header_type=HpsSlottedTransactionHeader)
+HpsSlottedReportTransactionSummary = slotted(HpsReportTransactionSummary,
+                                             _header_type=HpsSlottedTransactionHeader)
+HpsSlottedPayPlanSchedule = slotted(HpsPayPlanSchedule)
+HpsSlottedPayPlanCustomer = slotted(HpsPayPlanCustomer)
+HpsSlottedPayPlanScheduleCollection = slotted(HpsPayPlanScheduleCollection,
+                                              _result_type=HpsSlottedPayPlanSchedule)
+HpsSlottedPayPlanCustomerCollection = slotted(HpsPayPlanCustomerCollection,
+                                              _result_type=HpsSlottedPayPlanCustomer)
+
+SLOTTED_TYPES = dict((slotted_type.__mro__[1], slotted_type) for slotted_type in (
+    HpsSlottedTransactionHeader,
+    HpsSlottedTransaction,
+    HpsSlottedAuthorization,
+    HpsSlottedReportTransactionDetails,
+    HpsSlottedReportTransactionSummary,
+    HpsSlottedPayPlanSchedule,
+    HpsSlottedPayPlanCustomer,
+    HpsSlottedPayPlanScheduleCollection,
+    HpsSlottedPayPlanCustomerCollection))
+
+
+def compact_type(entity_type):
+    """The slotted version of `entity_type`, or `entity_type` itself when
+    it has none."""
+    return SLOTTED_TYPES.get(entity_type, entity_type)
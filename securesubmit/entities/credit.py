@@ -13,6 +13,30 @@ from securesubmit.infrastructure.enums import HpsTrackDataMethod
 from securesubmit.infrastructure.validation import *
 
 
+_utc_date_pattern = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?Z\Z')
+
+
+def _utc_date(value):
+    # strptime is several times slower, which shows on reports of
+    # thousands of rows; it's left to reject what the pattern doesn't match
+    match = _utc_date_pattern.match(value)
+    if match is None:
+        pattern = '%Y-%m-%dT%H:%M:%SZ'
+        if '.' in value:
+            pattern = '%Y-%m-%dT%H:%M:%S.%fZ'
+        return datetime.datetime.strptime(value, pattern)
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+    return datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+
+
+def _tokenization_message(value):
+    token_data = HpsTokenData()
+    token_data.token_rsp_msg = value
+    return token_data
+
+
 class HpsAuthorization(HpsTransaction):
     authorization_code = None
     avs_result_code = None
@@ -28,38 +52,20 @@ class HpsAuthorization(HpsTransaction):
     descriptor = None
     token_data = None
 
+    _field_map = HpsTransaction._field_map.extend(
+        HpsField('AuthCode', 'authorization_code'),
+        HpsField('AVSRsltCode', 'avs_result_code'),
+        HpsField('AVSRsltText', 'avs_result_text'),
+        HpsField('CVVRsltCode', 'cvv_result_code'),
+        HpsField('CVVRsltText', 'cvv_result_text'),
+        HpsField('AuthAmt', 'authorized_amount'),
+        HpsField('CardType', 'card_type'),
+        HpsField('TxnDescriptor', 'descriptor'),
+        HpsField('CPCInd', 'cpc_indicator'))
+
     @classmethod
     def from_dict(cls, rsp):
-        auth_response = rsp['Transaction'].itervalues().next()
-
         auth = super(HpsAuthorization, cls).from_dict(rsp)
-        if 'AuthCode' in auth_response:
-            auth.authorization_code = auth_response['AuthCode']
-
-        if 'AVSRsltCode' in auth_response:
-            auth.avs_result_code = auth_response['AVSRsltCode']
-
-        if 'AVSRsltText' in auth_response:
-            auth.avs_result_text = auth_response['AVSRsltText']
-
-        if 'CVVRsltCode' in auth_response:
-            auth.cvv_result_code = auth_response['CVVRsltCode']
-
-        if 'CVVRsltText' in auth_response:
-            auth.cvv_result_text = auth_response['CVVRsltText']
-
-        if 'AuthAmt' in auth_response:
-            auth.authorized_amount = auth_response['AuthAmt']
-
-        if 'CardType' in auth_response:
-            auth.card_type = auth_response['CardType']
-
-        if 'TxnDescriptor' in auth_response:
-            auth.descriptor = auth_response['TxnDescriptor']
-
-        if 'CPCInd' in auth_response:
-            auth.cpc_indicator = auth_response['CPCInd']
-
         if 'TokenData' in rsp['Header']:
             auth.token_data = HpsTokenData()
             auth.token_data.token_rsp_code = rsp[
@@ -160,99 +166,38 @@ class HpsReportTransactionDetails(HpsAuthorization):
     reversed_amount = None
     payment_method_key = None
 
+    _field_map = HpsAuthorization._field_map.extend(
+        HpsField('OriginalGatewayTxnId', 'original_transaction_id'),
+        HpsField('ServiceName', 'transaction_type', HpsTransaction._service_name_to_transaction_type),
+        HpsField(('Data', 'SettlementAmt'), 'settlement_amount'),
+        HpsField(('Data', 'MaskedCardNbr'), 'masked_card_number'),
+        HpsField(('Data', 'ReqUtcDT'), 'transaction_utc_date', _utc_date),
+        HpsField(('Data', 'AuthAmt'), 'authorized_amount'),
+        HpsField(('Data', 'AuthCode'), 'authorization_code'),
+        HpsField(('Data', 'AVSRsltCode'), 'avs_result_code'),
+        HpsField(('Data', 'AVSRsltText'), 'avs_result_text'),
+        HpsField(('Data', 'CardType'), 'card_type'),
+        HpsField(('Data', 'TxnDescriptor'), 'descriptor'),
+        HpsField(('Data', 'CPCInd'), 'cpc_indicator'),
+        HpsField(('Data', 'CVVRsltCode'), 'cvv_result_code'),
+        HpsField(('Data', 'CVVRsltText'), 'cvv_result_text'),
+        HpsField(('Data', 'RefNbr'), 'reference_number'),
+        HpsField(('Data', 'ReturnAmtInfo'), 'returned_amount'),
+        HpsField(('Data', 'ReversalAmtInfo'), 'reversed_amount'),
+        HpsField(('Data', 'RspCode'), 'response_code'),
+        HpsField(('Data', 'RspText'), 'response_text'),
+        HpsField(('Data', 'PaymentMethodKey'), 'payment_method_key'),
+        HpsField(('Data', 'TokenizationMsg'), 'token_data', _tokenization_message),
+        HpsField(('Data', 'TxnStatus'), 'transaction_status'),
+        HpsField(('Data', 'AdditionalTxnFields', 'Description'), 'memo'),
+        HpsField(('Data', 'AdditionalTxnFields', 'InvoiceNbr'), 'invoice_number'),
+        HpsField(('Data', 'AdditionalTxnFields', 'CustomerID'), 'customer_id'))
+
     @classmethod
     def from_dict(cls, rsp):
         report_response = rsp['Transaction'].itervalues().next()
 
         details = super(HpsReportTransactionDetails, cls).from_dict(rsp)
-        if 'OriginalGatewayTxnId' in report_response:
-            details.original_transaction_id = report_response[
-                'OriginalGatewayTxnId']
-
-        if 'SettlementAmt' in report_response['Data']:
-            details.settlement_amount = report_response[
-                'Data']['SettlementAmt']
-
-        if 'MaskedCardNbr' in report_response['Data']:
-            details.masked_card_number = report_response[
-                'Data']['MaskedCardNbr']
-
-        if 'ServiceName' in report_response:
-            details.transaction_type = \
-                HpsTransaction._service_name_to_transaction_type(
-                    report_response['ServiceName'])
-
-        if 'ReqUtcDT' in report_response['Data']:
-            details.transaction_utc_date = report_response[
-                'ReqUtcDT'].ToLocalTime()
-
-        if 'AuthAmt' in report_response['Data']:
-            details.authorized_amount = report_response['Data']['AuthAmt']
-
-        if 'AuthCode' in report_response['Data']:
-            details.authorization_code = report_response['Data']['AuthCode']
-
-        if 'AVSRsltCode' in report_response['Data']:
-            details.avs_result_code = report_response['Data']['AVSRsltCode']
-
-        if 'AVSRsltText' in report_response['Data']:
-            details.avs_result_text = report_response['Data']['AVSRsltText']
-
-        if 'CardType' in report_response['Data']:
-            details.card_type = report_response['Data']['CardType']
-
-        if 'TxnDescriptor' in report_response['Data']:
-            details.descriptor = report_response['Data']['TxnDescriptor']
-
-        if 'CPCInd' in report_response['Data']:
-            details.cpc_indicator = report_response['Data']['CPCInd']
-
-        if 'CVVRsltCode' in report_response['Data']:
-            details.cvv_result_code = report_response['Data']['CVVRsltCode']
-
-        if 'CVVRsltText' in report_response['Data']:
-            details.cvv_result_text = report_response['Data']['CVVRsltText']
-
-        if 'RefNbr' in report_response['Data']:
-            details.reference_number = report_response['Data']['RefNbr']
-
-        if 'ReturnAmtInfo' in report_response['Data']:
-            details.returned_amount = report_response['Data']['ReturnAmtInfo']
-
-        if 'ReversalAmtInfo' in report_response['Data']:
-            details.reversed_amount = report_response['Data']['ReversalAmtInfo']
-
-        if 'RspCode' in report_response['Data']:
-            details.response_code = report_response['Data']['RspCode']
-
-        if 'RspText' in report_response['Data']:
-            details.response_text = report_response['Data']['RspText']
-
-        if 'PaymentMethodKey' in report_response['Data']:
-            details.payment_method_key = report_response['Data']['PaymentMethodKey']
-
-        if 'TokenizationMsg' in report_response['Data']:
-            details.token_data = HpsTokenData()
-            details.token_data.token_rsp_msg = \
-                report_response['Data']['TokenizationMsg']
-
-        if 'TxnStatus' in report_response['Data']:
-            details.transaction_status = report_response['Data']['TxnStatus']
-
-        if 'AdditionalTxnFields' in report_response['Data']:
-            if 'Description' in report_response['Data']['AdditionalTxnFields']:
-                details.memo = \
-                    report_response[
-                        'Data']['AdditionalTxnFields']['Description']
-            if 'InvoiceNbr' in report_response['Data']['AdditionalTxnFields']:
-                details.invoice_number = \
-                    report_response[
-                        'Data']['AdditionalTxnFields']['InvoiceNbr']
-            if 'CustomerID' in report_response['Data']['AdditionalTxnFields']:
-                details.customer_id = \
-                    report_response[
-                        'Data']['AdditionalTxnFields']['CustomerID']
-
         if report_response['Data']['RspCode'] != '00':
             if details.exceptions is None:
                 details.exceptions = HpsChargeExceptions()
@@ -274,58 +219,47 @@ class HpsReportTransactionSummary(HpsTransaction):
     transaction_utc_date = None
     exceptions = None
 
+    _detail_field_map = HpsFieldMap(
+        HpsField('OriginalGatewayTxnId', 'original_transaction_id', default=None),
+        HpsField('MaskedCardNbr', 'masked_card_number', default=None),
+        HpsField('IssuerRspCode', 'response_code', default=None),
+        HpsField('IssuerRspText', 'response_text', default=None),
+        HpsField('Amt', 'amount', default=None),
+        HpsField('SettlementAmt', 'settlement_amount', default=None),
+        HpsField('TxnUtcDT', 'transaction_utc_date', _utc_date, default=None),
+        HpsField('ServiceName', 'transaction_type', HpsTransaction._service_name_to_transaction_type))
+
     @classmethod
     def from_dict(cls, rsp, filter_by):
+        details = rsp['Transaction'].itervalues().next()['Details']
+        if not isinstance(details, list):
+            details = [details]
+        return list(cls.from_rows(rsp, details, filter_by))
+
+    @classmethod
+    def from_rows(cls, rsp, rows, filter_by):
+        """Yield the summaries of `rows`, the Details of the report whose
+        header and other fields `rsp` holds, as they are read from it.
+        The header is read once, and the summaries share it."""
         report_response = rsp['Transaction'].itervalues().next()
 
-        transactions = []
         service_name = ''
         if filter_by is not None:
             service_name = HpsTransaction._transaction_type_to_service_name(
                 filter_by)
 
-        for charge in report_response['Details']:
+        first = None
+        for charge in rows:
             if filter_by is None or charge['ServiceName'] == service_name:
-                trans = super(HpsReportTransactionSummary, cls).from_dict(rsp)
-
-                trans.original_transaction_id = None
-                if 'OriginalGatewayTxnId' in charge:
-                    trans.original_transaction_id = charge[
-                        'OriginalGatewayTxnId']
-
-                trans.masked_card_number = None
-                if 'MaskedCardNbr' in charge:
-                    trans.masked_card_number = charge['MaskedCardNbr']
-
-                trans.response_code = None
-                if 'IssuerRspCode' in charge:
-                    trans.response_code = charge['IssuerRspCode']
-
-                trans.response_text = None
-                if 'IssuerRspText' in charge:
-                    trans.response_text = charge['IssuerRspText']
-
-                trans.amount = None
-                if 'Amt' in charge:
-                    trans.amount = charge['Amt']
-
-                trans.settlement_amount = None
-                if 'SettlementAmt' in charge:
-                    trans.settlement_amount = charge['SettlementAmt']
-
-                trans.transaction_utc_date = None
-                if 'TxnUtcDT' in charge:
-                    pattern = '%Y-%m-%dT%H:%M:%SZ'
-                    if '.' in charge['TxnUtcDT']:
-                        pattern = '%Y-%m-%dT%H:%M:%S.%fZ'
-
-                    trans.transaction_utc_date = datetime.datetime.strptime(
-                        charge['TxnUtcDT'],
-                        pattern)
-
-                trans.transaction_type = \
-                    HpsTransaction._service_name_to_transaction_type(
-                        charge['ServiceName'])
+                if first is None:
+                    trans = first = super(HpsReportTransactionSummary, cls).from_dict(rsp)
+                else:
+                    trans = cls()
+                    trans._header = first._header
+                    trans.transaction_id = first.transaction_id
+                    trans.client_transaction_id = first.client_transaction_id
+                    cls._field_map.hydrate(trans, report_response)
+                cls._detail_field_map.hydrate(trans, charge)
 
                 if filter_by is not None:
                     trans.transaction_type = filter_by
@@ -345,9 +279,7 @@ class HpsReportTransactionSummary(HpsTransaction):
                                 charge['GatewayTxnId'],
                                 str(charge['IssuerRspCode']),
                                 charge['IssuerRspText'])
-                transactions.append(trans)
-
-        return transactions
+                yield trans
 
 
 class HpsReversal(HpsTransaction):
@@ -357,32 +289,12 @@ class HpsReversal(HpsTransaction):
     cvv_result_text = None
     cpc_indicator = None
 
-    @classmethod
-    def from_dict(cls, rsp):
-        reverse_response = rsp['Transaction'].itervalues().next()
-
-        reverse = super(HpsReversal, cls).from_dict(rsp)
-        reverse.avs_result_code = None
-        if 'AVSRsltCode' in reverse_response:
-            reverse.avs_result_code = reverse_response['AVSRsltCode']
-
-        reverse.avs_result_text = None
-        if 'AVSRsltText' in reverse_response:
-            reverse.avs_result_text = reverse_response['AVSRsltText']
-
-        reverse.cpc_indicator = None
-        if 'CPCInd' in reverse_response:
-            reverse.cpc_indicator = reverse_response['CPCInd']
-
-        reverse.cvv_result_code = None
-        if 'CVVRsltCode' in reverse_response:
-            reverse.cvv_result_code = reverse_response['CVVRsltCode']
-
-        reverse.cvv_result_text = None
-        if 'CVVRsltText' in reverse_response:
-            reverse.cvv_result_text = reverse_response['CVVRsltText']
-
-        return reverse
+    _field_map = HpsTransaction._field_map.extend(
+        HpsField('AVSRsltCode', 'avs_result_code', default=None),
+        HpsField('AVSRsltText', 'avs_result_text', default=None),
+        HpsField('CPCInd', 'cpc_indicator', default=None),
+        HpsField('CVVRsltCode', 'cvv_result_code', default=None),
+        HpsField('CVVRsltText', 'cvv_result_text', default=None))
 
 
 class HpsVoid(HpsTransaction):
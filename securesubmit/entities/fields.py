@@ -0,0 +1,223 @@
+"""
+    fields.py
+
+    Declarative maps from the dicts of a parsed response to entity
+    attributes. An entity declares its map once, and the map is compiled
+    to a hydrating function when the entity's module is imported. The
+    lazy entities wrap it in an HpsLazyFieldMap to defer it instead.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import itertools
+from collections import OrderedDict
+
+_missing = object()
+_empty = {}
+
+
+class HpsField(object):
+    """One attribute set from a response.
+
+    `path` is a key of the source dict, or a tuple of keys leading to
+    it through nested dicts. `converter`, when given, is applied to the
+    value. When the key is absent the attribute is left as it is, or
+    set to `default` when one is given."""
+
+    path = None
+    attribute = None
+    converter = None
+    default = _missing
+
+    def __init__(self, path, attribute, converter=None, default=_missing):
+        self.path = path if isinstance(path, tuple) else (path,)
+        self.attribute = attribute
+        self.converter = converter
+        self.default = default
+
+
+class HpsFieldMap(object):
+    """The fields of an entity. `hydrate(entity, source)` sets them on
+    `entity` from the dict `source`; a source that is not a dict, such
+    as the None of an empty element, is read as an empty one. Fields are
+    applied in order, those under a nested key after the level above."""
+
+    fields = None
+    hydrate = None
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.hydrate = _compile(fields)
+
+    def extend(self, *fields):
+        """A map with these fields applied after this map's."""
+        return HpsFieldMap(*(self.fields + fields))
+
+    def attributes(self):
+        """The keys of the fields set straight from the source dict, and
+        the attributes they set."""
+        return dict((field.path[0], field.attribute) for field in self.fields
+                    if len(field.path) == 1 and field.converter is None)
+
+
+class HpsLazyFieldMap(object):
+    """A field map deferring its fields to first access. `hydrate` keeps
+    the source on the entity, and each attribute is decoded from the
+    sources it was given when it is first read, then memoized in the
+    entity's __dict__. The entity's class needs the map's `descriptors`.
+
+    An attribute resolves to what the eager map would have set, but a
+    converter raising on a bad value raises on that access rather than
+    in from_dict."""
+
+    field_map = None
+    fields = None
+    resolvers = None
+
+    def __init__(self, field_map):
+        self.field_map = field_map
+        self.fields = field_map.fields
+        by_attribute = OrderedDict()
+        for field in reversed(_application_order(list(field_map.fields))):
+            by_attribute.setdefault(field.attribute, []).append(field)
+        self.resolvers = dict((name, _compile_resolver(fields)) for name, fields in by_attribute.items())
+
+    def hydrate(self, entity, source):
+        state = entity.__dict__
+        resolvers = self.resolvers
+        # values set before these fields are applied, which a missing key
+        # leaves in place
+        prior = None
+        for name in [name for name in state if name in resolvers]:
+            if prior is None:
+                prior = {}
+            prior[name] = state.pop(name)
+
+        # the stages are kept newest first
+        state['_lazy_stages'] = ((resolvers, source, prior),) + state.get('_lazy_stages', ())
+
+    def descriptors(self, entity_type):
+        """The attributes of `entity_type` this map sets, as descriptors
+        defaulting to the class's values."""
+        return dict((name, _LazyAttribute(name, getattr(entity_type, name, None)))
+                    for name in self.resolvers)
+
+
+class _LazyAttribute(object):
+    """Decodes an attribute from the entity's lazy sources on first read.
+    It defines no __set__, so the memoized value in the instance __dict__
+    takes precedence from then on."""
+
+    def __init__(self, name, default):
+        self.name = name
+        self.default = default
+
+    def __get__(self, entity, owner):
+        if entity is None:
+            return self.default
+
+        name = self.name
+        state = entity.__dict__
+        value = self.default
+        for resolvers, source, prior in state.get('_lazy_stages', ()):
+            resolve = resolvers.get(name)
+            if resolve is not None:
+                resolved = resolve(source)
+                if resolved is not _missing:
+                    value = resolved
+                    break
+            if prior is not None and name in prior:
+                value = prior[name]
+                break
+
+        state[name] = value
+        return value
+
+
+def _compile_resolver(fields):
+    """Generate the function returning what `fields`, given last applied
+    first, set their attribute to from a source, or _missing."""
+    lines = ['def resolve(source):',
+             '    if not isinstance(source, dict):',
+             '        source = _empty']
+    namespace = {'_missing': _missing, '_empty': _empty}
+    counter = itertools.count()
+    for field in fields:
+        lines.append('    value = source.get(%r, _missing)' % (field.path[0],))
+        for key in field.path[1:]:
+            lines.append('    value = value.get(%r, _missing) if isinstance(value, dict) else _missing' % (key,))
+        value = 'value'
+        if field.converter is not None:
+            converter = '_converter_%d' % next(counter)
+            namespace[converter] = field.converter
+            value = '%s(value)' % converter
+        lines.append('    if value is not _missing:')
+        lines.append('        return %s' % value)
+        if field.default is not _missing:
+            default = '_default_%d' % next(counter)
+            namespace[default] = field.default
+            lines.append('    return %s' % default)
+            break
+    else:
+        lines.append('    return _missing')
+    exec compile('\n'.join(lines), '<lazy field>', 'exec') in namespace
+    return namespace['resolve']
+
+
+def _compile(fields):
+    """Generate the straight-line function hydrating `fields`, so that a
+    response costs a lookup and an assignment per field."""
+    lines = ['def hydrate(entity, source):']
+    namespace = {'_missing': _missing, '_empty': _empty}
+    _emit(fields, 0, 'source', lines, namespace, itertools.count())
+    exec compile('\n'.join(lines), '<field map>', 'exec') in namespace
+    return namespace['hydrate']
+
+
+def _partition(fields, depth):
+    """The fields ending at `depth`, and those below it grouped by their
+    key at `depth`."""
+    leaves = []
+    groups = OrderedDict()
+    for field in fields:
+        if len(field.path) == depth + 1:
+            leaves.append(field)
+        else:
+            groups.setdefault(field.path[depth], []).append(field)
+    return leaves, groups
+
+
+def _application_order(fields, depth=0):
+    leaves, groups = _partition(fields, depth)
+    for group in groups.values():
+        leaves.extend(_application_order(group, depth + 1))
+    return leaves
+
+
+def _emit(fields, depth, source, lines, namespace, counter):
+    leaves, groups = _partition(fields, depth)
+
+    get = 'get_%d' % next(counter)
+    lines.append('    if not isinstance(%s, dict):' % source)
+    lines.append('        %s = _empty' % source)
+    lines.append('    %s = %s.get' % (get, source))
+
+    for field in leaves:
+        value = 'value'
+        if field.converter is not None:
+            converter = '_converter_%d' % next(counter)
+            namespace[converter] = field.converter
+            value = '%s(value)' % converter
+        lines.append('    value = %s(%r, _missing)' % (get, field.path[depth]))
+        lines.append('    if value is not _missing:')
+        lines.append('        entity.%s = %s' % (field.attribute, value))
+        if field.default is not _missing:
+            default = '_default_%d' % next(counter)
+            namespace[default] = field.default
+            lines.append('    else:')
+            lines.append('        entity.%s = %s' % (field.attribute, default))
+
+    for key, group in groups.items():
+        child = 'source_%d' % next(counter)
+        lines.append('    %s = %s(%r)' % (child, get, key))
+        _emit(group, depth + 1, child, lines, namespace, counter)
@@ -7,6 +7,7 @@
 """
 
 from securesubmit.entities import HpsTransaction
+from securesubmit.entities.fields import HpsField, HpsFieldMap
 
 
 class HpsGiftCard(object):
@@ -17,15 +18,18 @@ class HpsGiftCard(object):
     encryption_data = None
     pin = None
 
+    _field_map = HpsFieldMap(
+        HpsField('TrackData', 'track_data', default=None),
+        HpsField('CardNbr', 'card_number', default=None),
+        HpsField('Alias', 'alias', default=None),
+        HpsField('TokenValue', 'token_value', default=None),
+        HpsField('EncryptionData', 'encryption_data', default=None),
+        HpsField('PIN', 'pin', default=None))
+
     @classmethod
     def from_dict(cls, rsp):
         card = cls()
-        card.track_data = None if 'TrackData' not in rsp else rsp['TrackData']
-        card.card_number = None if 'CardNbr' not in rsp else rsp['CardNbr']
-        card.alias = None if 'Alias' not in rsp else rsp['Alias']
-        card.token_value = None if 'TokenValue' not in rsp else rsp['TokenValue']
-        card.encryption_data = None if 'EncryptionData' not in rsp else rsp['EncryptionData']
-        card.pin = None if 'PIN' not in rsp else rsp['PIN']
+        cls._field_map.hydrate(card, rsp)
 
         return card
 
@@ -44,34 +48,20 @@ class HpsGiftCardActivate(HpsTransaction):
        special rewards or promotions available on the account."""
     notes = None
 
+    _field_map = HpsFieldMap(
+        HpsField('AuthCode', 'authorization_code', default=None),
+        HpsField('BalanceAmt', 'balance_amount', default=None),
+        HpsField('PointsBalanceAmt', 'points_balance_amount', default=None),
+        HpsField('Rewards', 'rewards', default=None),
+        HpsField('Notes', 'notes', default=None),
+        HpsField('RspCode', 'response_code', str, default=None),
+        HpsField('RspText', 'response_text', default=None))
+
     @classmethod
     def from_dict(cls, rsp):
-        activation_rsp = rsp['Transaction'].itervalues().next()
-
         activation = cls()
         activation.transaction_id = rsp['Header']['GatewayTxnId']
-        activation.authorization_code = None
-        if 'AuthCode' in activation_rsp:
-            activation.authorization_code = activation_rsp['AuthCode']
-        activation.balance_amount = None
-        if 'BalanceAmt' in activation_rsp:
-            activation.balance_amount = activation_rsp['BalanceAmt']
-        activation.points_balance_amount = None
-        if 'PointsBalanceAmt' in activation_rsp:
-            activation.points_balance_amount = \
-                activation_rsp['PointsBalanceAmt']
-        activation.rewards = None
-        if 'Rewards' in activation_rsp:
-            activation.rewards = activation_rsp['Rewards']
-        activation.notes = None
-        if 'Notes' in activation_rsp:
-            activation.notes = activation_rsp['Notes']
-        activation.response_code = None
-        if 'RspCode' in activation_rsp:
-            activation.response_code = str(activation_rsp['RspCode'])
-        activation.response_text = None
-        if 'RspText' in activation_rsp:
-            activation.response_text = activation_rsp['RspText']
+        cls._field_map.hydrate(activation, rsp['Transaction'].itervalues().next())
 
         return activation
 
@@ -83,15 +73,16 @@ class HpsGiftCardAddValue(HpsGiftCardActivate):
 class HpsGiftCardAlias(HpsTransaction):
     gift_card = None
 
+    _field_map = HpsFieldMap(
+        HpsField('CardData', 'gift_card', HpsGiftCard.from_dict),
+        HpsField('RspCode', 'response_code', default=None),
+        HpsField('RspText', 'response_text', default=None))
+
     @classmethod
     def from_dict(cls, rsp):
-        item = rsp['Transaction'].itervalues().next()
-
         alias = cls()
         alias.transaction_id = rsp['Header']['GatewayTxnId']
-        alias.gift_card = HpsGiftCard.from_dict(item['CardData'])
-        alias.response_code = None if 'RspCode' not in item else item['RspCode']
-        alias.response_text = None if 'RspText' not in item else item['RspText']
+        cls._field_map.hydrate(alias, rsp['Transaction'].itervalues().next())
 
         return alias
 
@@ -120,19 +111,9 @@ class HpsGiftCardSale(HpsGiftCardActivate):
     split_tender_card_amount = None
     split_tender_balance_due = None
 
-    @classmethod
-    def from_dict(cls, rsp):
-        item = rsp['Transaction'].itervalues().next()
-
-        sale = super(HpsGiftCardSale, cls).from_dict(rsp)
-        sale.split_tender_card_amount = None
-        if 'SplitTenderCardAmt' in item:
-            sale.split_tender_card_amount = item['SplitTenderCardAmt']
-        sale.split_tender_balance_due = None
-        if 'SplitTenderBalanceDueAmt' in item:
-            sale.split_tender_balance_due = item['SplitTenderBalanceDueAmt']
-
-        return sale
+    _field_map = HpsGiftCardActivate._field_map.extend(
+        HpsField('SplitTenderCardAmt', 'split_tender_card_amount', default=None),
+        HpsField('SplitTenderBalanceDueAmt', 'split_tender_balance_due', default=None))
 
 
 class HpsGiftCardVoid(HpsGiftCardActivate):
@@ -0,0 +1,143 @@
+"""
+    lazy.py
+
+    Lazily hydrated versions of the credit entities. They are subclasses
+    of the entities they stand for whose field maps keep the parsed
+    response, and decode each attribute from it the first time it is
+    read. Code reading two or three fields of a response pays for those.
+    The details capture can return are deferred further: they are not
+    requested from the gateway until one of them is read.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+from securesubmit.entities import HpsTransaction
+from securesubmit.entities.credit import (
+    HpsAccountVerify,
+    HpsAuthorization,
+    HpsCharge,
+    HpsRecurringBilling,
+    HpsReportTransactionDetails,
+    HpsReportTransactionSummary)
+from securesubmit.entities.fields import HpsFieldMap, HpsLazyFieldMap
+
+
+def lazy(entity_type):
+    """A subclass of `entity_type` hydrating the fields of its field maps
+    on first access."""
+    namespace = {}
+    for name in dir(entity_type):
+        field_map = getattr(entity_type, name)
+        if isinstance(field_map, HpsFieldMap):
+            lazy_map = HpsLazyFieldMap(field_map)
+            namespace.update(lazy_map.descriptors(entity_type))
+            namespace[name] = lazy_map
+
+    def __getstate__(self):
+        for name in descriptors:
+            getattr(self, name)
+        state = dict(self.__dict__)
+        state.pop('_lazy_stages', None)
+        return state
+
+    descriptors = sorted(name for name, value in namespace.items() if not isinstance(value, HpsLazyFieldMap))
+    namespace.update({
+        '__getstate__': __getstate__,
+        '__module__': __name__,
+        '__doc__': 'The lazily hydrated version of {0}.'.format(entity_type.__name__),
+    })
+    return type('HpsLazy' + entity_type.__name__[len('Hps'):], (entity_type,), namespace)
+
+
+HpsLazyAuthorization = lazy(HpsAuthorization)
+HpsLazyAccountVerify = lazy(HpsAccountVerify)
+HpsLazyCharge = lazy(HpsCharge)
+HpsLazyRecurringBilling = lazy(HpsRecurringBilling)
+HpsLazyReportTransactionDetails = lazy(HpsReportTransactionDetails)
+HpsLazyReportTransactionSummary = lazy(HpsReportTransactionSummary)
+
+LAZY_TYPES = dict((lazy_type.__mro__[1], lazy_type) for lazy_type in (
+    HpsLazyAuthorization,
+    HpsLazyAccountVerify,
+    HpsLazyCharge,
+    HpsLazyRecurringBilling,
+    HpsLazyReportTransactionDetails,
+    HpsLazyReportTransactionSummary))
+
+
+def lazy_type(entity_type):
+    """The lazy version of `entity_type`, or `entity_type` itself when it
+    has none."""
+    return LAZY_TYPES.get(entity_type, entity_type)
+
+
+class _DeferredAttribute(object):
+    """Gets the entity's details on the first read of any attribute the
+    capture response doesn't give. Like _LazyAttribute it defines no
+    __set__, so the values in the instance __dict__ take precedence."""
+
+    def __init__(self, name, default):
+        self.name = name
+        self.default = default
+
+    def __get__(self, entity, owner):
+        if entity is None:
+            return self.default
+        entity._get_details()
+        return entity.__dict__.get(self.name, self.default)
+
+
+class HpsDeferredReportTransactionDetails(HpsReportTransactionDetails):
+    """The details of a captured transaction, returned by capture when
+    the config defers them. `transaction_id` is the captured transaction,
+    the header and client_transaction_id are those of the capture
+    response, and response_code and response_text are '00' and '' as
+    for edits. Reading any other attribute gets the details with
+    HpsCreditService.get, once, and raises what that raises."""
+
+    _fetch = None
+
+    @classmethod
+    def from_capture(cls, rsp, transaction_id, fetch):
+        """The details of `transaction_id`, captured with the response
+        `rsp`; `fetch()` gets the HpsReportTransactionDetails."""
+        capture = HpsTransaction.from_dict(rsp)
+        details = cls()
+        details._header = capture._header
+        details.transaction_id = int(transaction_id)
+        details.client_transaction_id = capture.client_transaction_id
+        details.response_code = '00'
+        details.response_text = ''
+        details._fetch = fetch
+        return details
+
+    @property
+    def details_fetched(self):
+        return self._fetch is None
+
+    def _get_details(self):
+        fetch = self._fetch
+        if fetch is None:
+            return
+        details = fetch()
+        state = self.__dict__
+        for name in _DEFERRED_ATTRIBUTES:
+            if name not in state:
+                state[name] = getattr(details, name)
+        self._fetch = None
+
+    def __getstate__(self):
+        self._get_details()
+        state = dict(self.__dict__)
+        state.pop('_fetch', None)
+        return state
+
+
+_DEFERRED_ATTRIBUTES = tuple(
+    name for name in dir(HpsReportTransactionDetails)
+    if not name.startswith('_') and not callable(getattr(HpsReportTransactionDetails, name)) and
+    name not in ('transaction_id', 'client_transaction_id', 'response_code', 'response_text'))
+for _name in _DEFERRED_ATTRIBUTES:
+    setattr(HpsDeferredReportTransactionDetails, _name,
+            _DeferredAttribute(_name, getattr(HpsReportTransactionDetails, _name)))
+del _name
@@ -16,9 +16,9 @@ class HpsPayPlanResource(object):
     def get_json_data(self):
         fields = dict()
 
-        for k in self.__dict__.keys():
-            value = self.__getattribute__(k)
-            if k in self.get_editable_fields() and value is not None:
+        for k in self.get_editable_fields() or ():
+            value = getattr(self, k, None)
+            if value is not None:
                 fields[self.to_camel_case(k)] = str(value)
 
         return fields
@@ -296,12 +296,11 @@ class HpsPayPlanSchedule(HpsPayPlanResource):
     def get_json_data(self):
         fields = dict()
 
-        editable_fields = self.get_editable_fields(self.schedule_started)
-        for k in self.__dict__.keys():
-            value = self.__getattribute__(k)
+        for k in self.get_editable_fields(self.schedule_started):
+            value = getattr(self, k, None)
             if isinstance(value, Enum):
                 value = str(value)
-            if k in editable_fields and value is not None:
+            if value is not None:
                 fields[self.to_camel_case(k)] = value
 
         return fields
@@ -404,6 +403,8 @@ class HpsPayPlanResourceCollection(object):
 
 
 class HpsPayPlanCustomerCollection(HpsPayPlanResourceCollection):
+    _result_type = HpsPayPlanCustomer
+
     @classmethod
     def from_dict(cls, rsp):
         collection = super(HpsPayPlanCustomerCollection, cls).from_dict(rsp)
@@ -411,12 +412,14 @@ class HpsPayPlanCustomerCollection(HpsPayPlanResourceCollection):
             collection.results = []
 
             for result in rsp['results']:
-                collection.results.append(HpsPayPlanCustomer.from_dict(result))
+                collection.results.append(cls._result_type.from_dict(result))
 
         return collection
 
 
 class HpsPayPlanPaymentMethodCollection(HpsPayPlanResourceCollection):
+    _result_type = HpsPayPlanPaymentMethod
+
     @classmethod
     def from_dict(cls, rsp):
         collection = super(HpsPayPlanPaymentMethodCollection, cls).from_dict(rsp)
@@ -424,12 +427,14 @@ class HpsPayPlanPaymentMethodCollection(HpsPayPlanResourceCollection):
             collection.results = []
 
             for result in rsp['results']:
-                collection.results.append(HpsPayPlanPaymentMethod.from_dict(result))
+                collection.results.append(cls._result_type.from_dict(result))
 
         return collection
 
 
 class HpsPayPlanScheduleCollection(HpsPayPlanResourceCollection):
+    _result_type = HpsPayPlanSchedule
+
     @classmethod
     def from_dict(cls, rsp):
         collection = super(HpsPayPlanScheduleCollection, cls).from_dict(rsp)
@@ -437,7 +442,7 @@ class HpsPayPlanScheduleCollection(HpsPayPlanResourceCollection):
             collection.results = []
 
             for result in rsp['results']:
-                collection.results.append(HpsPayPlanSchedule.from_dict(result))
+                collection.results.append(cls._result_type.from_dict(result))
 
         return collection
 
@@ -6,8 +6,13 @@
     :copyright: (c) Heartland Payment Systems. All rights reserved.
 """
 
+import os
+import threading
+import time
 from ConfigParser import ConfigParser, NoOptionError
 
+from securesubmit.infrastructure.enums import HpsExceptionCodes
+
 
 class HpsException(Exception):
     def __init__(self, message, inner_exception=None):
@@ -52,12 +57,11 @@ class HpsConfiguration:
     site_trace = None
     soap_service_uri = None
 
-    def __init__(self):
+    def __init__(self, filename='./config.cfg'):
         self.soap_service_uri = ('https://cert.api2.heartlandportico.com'
                                  '/Hps.Exchange.PosGateway'
                                  '/PosGatewayService.asmx?wsdl')
 
-        filename = './config.cfg'
         parser = ConfigParser()
         if parser.read(filename) == [filename]:
             try:
@@ -75,6 +79,68 @@ class HpsConfiguration:
                 raise HpsException('Could not read config file.')
 
 
+class HpsConfigurationLoader(object):
+    """Loads an HpsConfiguration from a config file once and hands out the
+    same instance until the file changes. The file is stat-ed at most once
+    every `check_interval` seconds; a changed modification time or size
+    causes it to be parsed again on the next `get()`."""
+
+    filename = './config.cfg'
+    check_interval = 1.0
+
+    _configuration = None
+    _signature = None
+    _checked_at = None
+    _lock = None
+
+    def __init__(self, filename='./config.cfg', check_interval=1.0):
+        self.filename = filename
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.time()
+            if (self._configuration is not None and
+                    now - self._checked_at < self.check_interval):
+                return self._configuration
+
+            signature = self._file_signature()
+            if self._configuration is None or signature != self._signature:
+                self._configuration = HpsConfiguration(self.filename)
+                self._signature = signature
+            self._checked_at = now
+            return self._configuration
+
+    def invalidate(self):
+        with self._lock:
+            self._configuration = None
+            self._signature = None
+            self._checked_at = None
+
+    def _file_signature(self):
+        path = os.path.abspath(self.filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path, None, None
+        return path, stat.st_mtime, stat.st_size
+
+
+_configuration_loader = HpsConfigurationLoader()
+
+
+def get_configuration():
+    """The process-wide configuration read from ./config.cfg."""
+    return _configuration_loader.get()
+
+
+def invalidate_configuration():
+    """Forget the cached configuration so the next service reads the
+    config file again."""
+    _configuration_loader.invalidate()
+
+
 class HpsCreditException(HpsException):
     transaction_id = None
     code = None
@@ -118,8 +184,37 @@ class HpsGatewayException(HpsException):
             self.details.gateway_response_code = gateway_response_code
             self.details.gateway_response_message = gateway_response_message
 
-            self.message = message
-            self.inner_exception = inner_exception
+        self.message = message
+        self.inner_exception = inner_exception
+
+
+class HpsDuplicateTransactionException(HpsGatewayException):
+    """Raised instead of retrying when the gateway already holds a
+    transaction for the client transaction id being retried."""
+    transaction_id = None
+    client_transaction_id = None
+
+    def __init__(self, transaction_id, client_transaction_id, message, inner_exception=None):
+        HpsGatewayException.__init__(
+            self, HpsExceptionCodes.duplicate_transaction, message,
+            None, None, inner_exception)
+        self.transaction_id = transaction_id
+        self.client_transaction_id = client_transaction_id
+
+
+class HpsCircuitOpenException(HpsGatewayException):
+    """Raised without contacting the gateway while the circuit breaker for
+    its endpoint is open. `retry_after` is the number of seconds until the
+    breaker lets a probe through."""
+    endpoint = None
+    retry_after = None
+
+    def __init__(self, endpoint, retry_after):
+        HpsGatewayException.__init__(
+            self, HpsExceptionCodes.circuit_open,
+            'The gateway endpoint is unavailable, failing fast.')
+        self.endpoint = endpoint
+        self.retry_after = retry_after
 
 
 class HpsGatewayExceptionDetails:
@@ -77,6 +77,9 @@ class HpsExceptionCodes(IntEnum):
     invalid_currency = 4
     invalid_date = 5
     missing_check_name = 27
+    deadline_exceeded = 28
+    duplicate_transaction = 29
+    circuit_open = 30
 
     # gateway codes
     unknown_gateway_error = 6
@@ -104,6 +107,15 @@ class HpsExceptionCodes(IntEnum):
     unknown_credit_error = 26
 
 
+class HpsCircuitState(Enum):
+    closed = 'CLOSED'
+    open = 'OPEN'
+    half_open = 'HALF_OPEN'
+
+    def __str__(self):
+        return str(self.value)
+
+
 class HpsTaxType(Enum):
     not_used = 'NOTUSED'
     sales_tax = 'SALESTAX'
@@ -136,6 +136,33 @@ class HpsGatewayResponseValidation(object):
                     'Unexpected response from HPS gateway.'
                 )
 
+    @staticmethod
+    def check_parsed_response(response, expected_type):
+        """check_response for an HpsPosResponse from the single-pass parser."""
+        HpsGatewayResponseValidation._check_codes(
+            response.header.gateway_rsp_code, response.header.gateway_rsp_msg,
+            response.transaction_type, expected_type)
+
+    @staticmethod
+    def check_raw_response(response, expected_type):
+        """check_response for the HpsRawResponse of raw mode."""
+        HpsGatewayResponseValidation._check_codes(
+            response.gateway_rsp_code, response.gateway_rsp_msg,
+            response.transaction_type, expected_type)
+
+    @staticmethod
+    def _check_codes(rsp_code, rsp_text, transaction_type, expected_type):
+        e = HpsGatewayResponseValidation.get_exception(rsp_code, rsp_text)
+
+        if e is not None:
+            raise e
+
+        if transaction_type is not None and transaction_type != expected_type:
+            raise HpsGatewayException(
+                HpsExceptionCodes.unexpected_gateway_response,
+                'Unexpected response from HPS gateway.'
+            )
+
     @staticmethod
     def get_exception(response_code, response_text):
         if response_code == '0':
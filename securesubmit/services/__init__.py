@@ -15,6 +15,48 @@ class _HpsConfigInterface(object):
     CERT_URL = None
     PROD_URL = None
 
+    # connection pool, see securesubmit.services.transport.HpsPoolSettings
+    pool_maxsize = 10
+    pool_block = False
+    pool_keep_alive = True
+    pool_idle_timeout = 60
+    pool_auto_size = True
+    pool_max_auto_size = 100
+
+    # per-phase socket timeouts in seconds, None waits indefinitely
+    connect_timeout = None
+    read_timeout = None
+
+    # return reports and pay plan resources as the slotted types of
+    # securesubmit.entities.compact, to hold large results in less memory
+    compact_entities = False
+
+    # decode the fields of credit responses on first access rather than
+    # when the response is read, see securesubmit.entities.lazy
+    lazy_entities = False
+
+    # have the credit, gift card and check services return the read-only
+    # views of securesubmit.services.raw instead of entities
+    raw_responses = False
+
+    # requests submit_many keeps in flight, None for pool_maxsize so that
+    # each one has a pooled connection
+    bulk_concurrency = None
+
+    # ask for gzip or deflate compressed responses; SOAP responses are
+    # then decompressed into the parser as they arrive
+    compress_responses = False
+
+    # an HpsDetailCache for the details HpsCreditService.get returns, see
+    # securesubmit.services.cache; None always asks the gateway, as does
+    # raw_responses
+    detail_cache = None
+
+    # have capture return the details of the captured transaction without
+    # requesting them, until an attribute only they hold is read; see
+    # securesubmit.entities.lazy.HpsDeferredReportTransactionDetails
+    defer_capture_details = False
+
     def validate(self):
         pass
 
@@ -98,6 +140,12 @@ class HpsServicesConfig(_HpsConfigInterface):
     developer_id = None
     site_trace = None
 
+    # see securesubmit.services.retry.HpsRetryPolicy, None disables retries
+    retry_policy = None
+
+    # see securesubmit.services.circuit.HpsCircuitBreakerPolicy, None disables the breaker
+    circuit_breaker = None
+
     def __init__(self):
         self.UAT_URL = 'https://api-uat.heartlandportico.com/paymentserver.v1/PosGatewayService.asmx?wsdl'
         self.CERT_URL = 'https://cert.api2.heartlandportico.com/Hps.Exchange.PosGateway/PosGatewayService.asmx?wsdl'
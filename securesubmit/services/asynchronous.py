@@ -0,0 +1,100 @@
+"""
+    asynchronous.py
+
+    Non-blocking variants of the classic gateway services. Each call is
+    handed to a shared worker pool and returns immediately with an
+    `AsyncResult`; `result.get(timeout)` yields the same entity (or raises
+    the same exception) the blocking service would have.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+from securesubmit.services.bulk import _BATCH_METHODS
+from securesubmit.services.gateway import (
+    HpsCreditService,
+    HpsGiftCardService,
+    HpsCheckService,
+    HpsBatchService)
+
+
+DEFAULT_WORKER_COUNT = 20
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+_default_pool_pid = os.getpid()
+
+
+def get_default_pool():
+    """The worker pool shared by every async service that was not handed
+    one explicitly. Created on first use, and again in a forked child,
+    which inherits the pool but none of its threads."""
+    global _default_pool, _default_pool_lock, _default_pool_pid
+    if _default_pool_pid != os.getpid():
+        _default_pool_lock = threading.Lock()
+        _default_pool = None
+        _default_pool_pid = os.getpid()
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ThreadPool(DEFAULT_WORKER_COUNT)
+        return _default_pool
+
+
+class _HpsAsyncService(object):
+    _service_type = None
+    _config = None
+    _logging = False
+    _pool = None
+    _local = None
+
+    def __init__(self, config=None, enable_logging=False, pool=None):
+        self._config = config
+        self._logging = enable_logging
+        self._pool = pool if pool is not None else get_default_pool()
+        self._local = threading.local()
+
+    @property
+    def services_config(self):
+        return self._config
+
+    def _service(self):
+        """The blocking services keep per-call state on the instance, so
+        every worker thread gets its own copy."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._service_type(self._config, self._logging)
+            self._local.service = service
+        return service
+
+    def _call(self, name, args, kwargs):
+        return getattr(self._service(), name)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # a batch waiting on the pool from inside the pool could starve it
+        if name[:1] == '_' or name in _BATCH_METHODS or not callable(getattr(self._service_type, name, None)):
+            raise AttributeError(name)
+
+        def wrapper(*args, **kwargs):
+            return self._pool.apply_async(self._call, (name, args, kwargs))
+
+        return wrapper
+
+
+class HpsAsyncCreditService(_HpsAsyncService):
+    _service_type = HpsCreditService
+
+
+class HpsAsyncGiftCardService(_HpsAsyncService):
+    _service_type = HpsGiftCardService
+
+
+class HpsAsyncCheckService(_HpsAsyncService):
+    _service_type = HpsCheckService
+
+
+class HpsAsyncBatchService(_HpsAsyncService):
+    _service_type = HpsBatchService
@@ -0,0 +1,176 @@
+"""
+    bulk.py
+
+    Submitting many transactions through a classic service at once. The
+    requests run on the worker pool of securesubmit.services.asynchronous
+    with a bounded number in flight, and every request's outcome is kept,
+    so that one decline does not abort a batch.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import copy
+import Queue
+import threading
+from multiprocessing.pool import CLOSE, RUN, TERMINATE
+
+from securesubmit.infrastructure import HpsArgumentException, HpsException
+
+DEFAULT_CONCURRENCY = 10
+
+# how often a batch waiting on the pool checks that the pool still runs
+POOL_CHECK_INTERVAL = 1.0
+
+# the methods that run a batch of their own on the pool
+_BATCH_METHODS = ('submit_many', 'get_many')
+
+
+class HpsBulkResult(object):
+    """The outcome of one request of a batch: the `value` the service
+    method returned, or the `exception` it raised."""
+
+    index = None
+    request = None
+    value = None
+    exception = None
+
+    def __init__(self, index, request, value=None, exception=None):
+        self.index = index
+        self.request = request
+        self.value = value
+        self.exception = exception
+
+    @property
+    def succeeded(self):
+        return self.exception is None
+
+    def get(self):
+        """The value, or raise the exception."""
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+
+class HpsBulkMixin(object):
+    """Adds submit_many to a blocking service."""
+
+    def submit_many(self, requests, concurrency=None, progress=None, pool=None):
+        """Run every request and return their HpsBulkResults in the order
+        of `requests`.
+
+        A request is a `(method, args)` or `(method, args, kwargs)` tuple
+        naming a public method of this service, such as
+        `('charge', (10, 'usd', card))`. At most `concurrency` requests
+        are in flight, by default the config's bulk_concurrency.
+        `progress(completed, total, result)` is called on the calling
+        thread as each request completes. `pool` defaults to the pool the
+        async services share. The requests run inside the deadline of
+        the call, if any."""
+        requests = [_request(self, request) for request in requests]
+        total = len(requests)
+        if concurrency is None:
+            concurrency = _concurrency(getattr(self, '_config', None))
+        _check_concurrency(concurrency)
+
+        results = [None] * total
+        completed = 0
+        for index, value, exception in _dispatch(self, [_method_call(request) for request in requests],
+                                                 concurrency, pool):
+            results[index] = result = HpsBulkResult(index, requests[index], value, exception)
+            completed += 1
+            if progress is not None:
+                progress(completed, total, result)
+
+        return results
+
+
+def _request(service, request):
+    if not isinstance(request, tuple) or len(request) not in (2, 3):
+        raise HpsArgumentException('A request must be a (method, args) or (method, args, kwargs) tuple.')
+
+    name = request[0]
+    if name[:1] == '_' or name in _BATCH_METHODS or not callable(getattr(service, name, None)):
+        raise HpsArgumentException('{0} is not a method that can be submitted.'.format(name))
+    if len(request) == 2:
+        request = request + ({},)
+    return request
+
+
+def _concurrency(config):
+    concurrency = getattr(config, 'bulk_concurrency', None)
+    if concurrency is None:
+        concurrency = getattr(config, 'pool_maxsize', None)
+    return concurrency or DEFAULT_CONCURRENCY
+
+
+def _check_concurrency(concurrency):
+    if concurrency < 1:
+        raise HpsArgumentException('Concurrency must be at least 1.')
+
+
+def _method_call(request):
+    name, args, kwargs = request
+    return lambda service: getattr(service, name)(*args, **kwargs)
+
+
+def _dispatch(service, calls, concurrency, pool=None):
+    """Run `calls`, functions of a service, on `pool` with at most
+    `concurrency` in flight, each on its worker thread's copy of
+    `service` and under the calling thread's deadline. Yields the index,
+    value and exception of each call as it completes, on the calling
+    thread. `pool` defaults to the pool the async services share."""
+    if pool is None:
+        # asynchronous imports the services, so it can't be imported
+        # with them
+        from securesubmit.services.asynchronous import get_default_pool
+        pool = get_default_pool()
+
+    deadline = getattr(service, '_deadline', None)
+    done = Queue.Queue()
+    workers = threading.local()
+    in_flight = 0
+    for index, call in enumerate(calls):
+        while in_flight >= concurrency:
+            yield _next_done(done, pool, in_flight)
+            in_flight -= 1
+        pool.apply_async(_run, (service, workers, deadline, index, call), callback=done.put)
+        in_flight += 1
+    while in_flight:
+        yield _next_done(done, pool, in_flight)
+        in_flight -= 1
+
+
+def _run(service, workers, deadline, index, call):
+    """Run `call` on the worker thread's copy of `service`, under
+    `deadline`: the blocking services keep per-call state on the
+    instance."""
+    # gateway imports this module, so it can't be imported with it
+    from securesubmit.services.gateway import _deadline_scope
+
+    try:
+        worker = getattr(workers, 'service', None)
+        if worker is None:
+            worker = workers.service = copy.copy(service)
+        with _deadline_scope(worker, deadline):
+            return index, call(worker), None
+    except BaseException, e:
+        # a call that returned nothing would leave its batch waiting
+        return index, None, e
+
+
+def _next_done(done, pool, in_flight):
+    while True:
+        try:
+            return done.get(timeout=POOL_CHECK_INTERVAL)
+        except Queue.Empty:
+            if _pool_stopped(pool):
+                raise HpsException('The pool stopped with {0} calls in flight.'.format(in_flight))
+
+
+def _pool_stopped(pool):
+    """Whether `pool` will run no more of the calls handed to it: it was
+    terminated, or closed and its workers are gone."""
+    state = getattr(pool, '_state', RUN)
+    if state == TERMINATE:
+        return True
+    return state == CLOSE and not any(worker.is_alive() for worker in getattr(pool, '_pool', ()))
@@ -0,0 +1,276 @@
+"""
+    cache.py
+
+    A cache of the transaction details HpsCreditService.get returns,
+    enabled by setting a config's detail_cache. Recent details are kept
+    in memory for a while; the details of settled transactions, which no
+    longer change, can also be kept on disk, one JSON file of their field
+    values per transaction, so that they outlive the process and are
+    shared with the others using the same directory. Details are kept
+    apart by merchant, under a hash of the merchant's credentials. A
+    service drops a transaction's details when it captures, edits, voids,
+    reverses or refunds it.
+
+    Whoever can write to the directory can make get return details of
+    their choosing, so it has to be private to the processes trusted with
+    the merchants' transactions. The cache creates it, and each merchant's
+    directory, readable by their owner only.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import copy
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from securesubmit.entities import HpsTokenData
+from securesubmit.entities.compact import HpsSlottedReportTransactionDetails, _defaults
+from securesubmit.entities.credit import HpsReportTransactionDetails, _utc_date
+from securesubmit.entities.lazy import HpsLazyReportTransactionDetails
+from securesubmit.infrastructure.enums import HpsTransactionType
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+SETTLED_STATUSES = ('C',)
+
+# the types a file can name, and the fields it holds
+_STORED_TYPES = dict((entity_type.__name__, entity_type) for entity_type in (
+    HpsReportTransactionDetails,
+    HpsSlottedReportTransactionDetails,
+    HpsLazyReportTransactionDetails))
+_FIELDS = tuple(name for name, _ in _defaults(HpsReportTransactionDetails) if not name.startswith('_'))
+_HEADER_FIELDS = ('gateway_rsp_code', 'gateway_rsp_msg', 'rsp_dt', 'client_txn_id')
+_TOKEN_FIELDS = ('token_rsp_code', 'token_rsp_msg', 'token_value')
+
+
+class HpsCacheStats(object):
+    """The lookups a cache answered from memory and from disk, and those
+    it missed."""
+
+    memory_hits = 0
+    disk_hits = 0
+    misses = 0
+
+    def __init__(self, memory_hits=0, disk_hits=0, misses=0):
+        self.memory_hits = memory_hits
+        self.disk_hits = disk_hits
+        self.misses = misses
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def __repr__(self):
+        return 'HpsCacheStats(memory_hits={0}, disk_hits={1}, misses={2})'.format(
+            self.memory_hits, self.disk_hits, self.misses)
+
+
+class HpsDetailCache(object):
+    """Holds up to `max_entries` details in memory, the least recently
+    used going first, each for `ttl` seconds. With a `directory`, the
+    details of transactions whose status is one of `settled_statuses`,
+    by default those of closed batches, are also written there and kept
+    until they are invalidated; see the module's notes on trusting it.
+    Each method takes the `merchant` the transaction belongs to, any
+    string naming it; only a hash of it is kept. Every caller gets a
+    copy of the details the cache holds, and changing it leaves them
+    alone; the copy is shallow, so parts such as the header are shared
+    and should be treated as read-only. Safe to share between threads."""
+
+    _max_entries = None
+    _ttl = None
+    _directory = None
+    _settled_statuses = None
+    _entries = None
+    _lock = None
+    _memory_hits = 0
+    _disk_hits = 0
+    _misses = 0
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, directory=None,
+                 settled_statuses=SETTLED_STATUSES):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._directory = directory
+        self._settled_statuses = frozenset(settled_statuses)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            _make_private_directory(directory)
+
+    def get(self, transaction_id, merchant=None):
+        """The cached details of `transaction_id`, or None."""
+        key = (_namespace(merchant), int(transaction_id))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                self._entries[key] = entry
+                self._memory_hits += 1
+                return copy.copy(entry[1])
+
+        details = self._read(key)
+        with self._lock:
+            if details is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, details)
+        return copy.copy(details)
+
+    def put(self, transaction_id, details, merchant=None):
+        key = (_namespace(merchant), int(transaction_id))
+        # a copy of a lazy entity is decoded in full, so the one held is
+        # never written to as it is read
+        details = copy.copy(details)
+        with self._lock:
+            self._remember(key, details)
+        if getattr(details, 'transaction_status', None) in self._settled_statuses:
+            self._write(key, details)
+
+    def invalidate(self, transaction_id, merchant=None):
+        key = (_namespace(merchant), int(transaction_id))
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._directory is not None:
+            try:
+                os.remove(self._path(key))
+            except OSError, e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    def clear(self):
+        """Drop the details held in memory; those on disk are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return HpsCacheStats(self._memory_hits, self._disk_hits, self._misses)
+
+    def _remember(self, key, details):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time() + self._ttl, details)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        namespace, transaction_id = key
+        return os.path.join(self._directory, namespace, '{0}.json'.format(transaction_id))
+
+    def _read(self, key):
+        if self._directory is None:
+            return None
+        try:
+            stored = open(self._path(key), 'rb')
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        with stored:
+            try:
+                return _decode(json.load(stored))
+            except Exception:
+                # damaged, or written by a version whose entities differ;
+                # the gateway has the details
+                return None
+
+    def _write(self, key, details):
+        if self._directory is None:
+            return
+        try:
+            content = json.dumps(_encode(details))
+        except (KeyError, TypeError, ValueError):
+            # details holding more than field values, such as the
+            # exceptions of a decline, are only kept in memory
+            return
+
+        path = self._path(key)
+        _make_private_directory(os.path.dirname(path))
+        # written aside and renamed, so that no reader sees half a file
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as stored:
+                stored.write(content)
+            os.rename(temporary, path)
+        except Exception:
+            os.remove(temporary)
+            raise
+
+
+def _namespace(merchant):
+    return hashlib.sha256('' if merchant is None else merchant).hexdigest()[:32]
+
+
+def _make_private_directory(path):
+    try:
+        os.makedirs(path, 0700)
+    except OSError, e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def _encode_token_data(token_data):
+    return dict((name, getattr(token_data, name)) for name in _TOKEN_FIELDS)
+
+
+def _decode_token_data(values):
+    token_data = HpsTokenData()
+    for name in _TOKEN_FIELDS:
+        setattr(token_data, name, values.get(name))
+    return token_data
+
+
+# the fields whose values aren't stored as they are, and how they are
+# written and read back
+_CODECS = {
+    'transaction_type': (lambda value: value.name, lambda value: HpsTransactionType[value]),
+    'transaction_utc_date': (lambda value: value.strftime('%Y-%m-%dT%H:%M:%S.%fZ'), _utc_date),
+    'token_data': (_encode_token_data, _decode_token_data),
+}
+
+
+def _encode(details):
+    """The field values of `details`, for json.dumps, which raises a
+    TypeError for any value that isn't plain data."""
+    entity_type = type(details)
+    if _STORED_TYPES[entity_type.__name__] is not entity_type:
+        raise TypeError(entity_type.__name__)
+
+    fields = {}
+    for name in _FIELDS:
+        value = getattr(details, name)
+        if value is not None and name in _CODECS:
+            value = _CODECS[name][0](value)
+        fields[name] = value
+
+    header = None
+    if details._header is not None:
+        header = dict((name, getattr(details._header, name)) for name in _HEADER_FIELDS)
+    return {'type': entity_type.__name__, 'header': header, 'fields': fields}
+
+
+def _decode(stored):
+    entity_type = _STORED_TYPES[stored['type']]
+    details = entity_type()
+    for name in _FIELDS:
+        value = stored['fields'].get(name)
+        if value is not None and name in _CODECS:
+            value = _CODECS[name][1](value)
+        setattr(details, name, value)
+
+    if stored['header'] is not None:
+        details._header = entity_type._header_type()
+        for name in _HEADER_FIELDS:
+            setattr(details._header, name, stored['header'].get(name))
+    return details
@@ -0,0 +1,139 @@
+"""
+    circuit.py
+
+    Per-endpoint circuit breakers, shared by every service in the process.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import threading
+import time
+
+from securesubmit.infrastructure import HpsCircuitOpenException
+from securesubmit.infrastructure.enums import HpsCircuitState
+
+
+class HpsCircuitBreakerPolicy(object):
+    """When to stop sending requests to a degraded endpoint.
+
+    The circuit opens after `failure_threshold` consecutive failed calls.
+    Network errors count as failures, and so does any call that took
+    longer than `slow_call_threshold` seconds when that is set. While open,
+    calls fail straight away with HpsCircuitOpenException. After
+    `reset_timeout` seconds the circuit goes half-open and lets
+    `half_open_probes` calls through: if they all succeed the circuit
+    closes, if any of them fails it opens again."""
+
+    failure_threshold = 5
+    slow_call_threshold = None
+    reset_timeout = 30
+    half_open_probes = 1
+
+    def __init__(self, failure_threshold=5, slow_call_threshold=None,
+                 reset_timeout=30, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+
+    def key(self):
+        return (self.failure_threshold, self.slow_call_threshold,
+                self.reset_timeout, self.half_open_probes)
+
+
+class HpsCircuitBreaker(object):
+    _policy = None
+    _endpoint = None
+    _state = HpsCircuitState.closed
+    _failures = 0
+    _opened_at = None
+    _probes = 0
+    _probe_successes = 0
+    _lock = None
+
+    def __init__(self, policy=None, endpoint=None):
+        self._policy = policy if policy is not None else HpsCircuitBreakerPolicy()
+        self._endpoint = endpoint
+        self._lock = threading.Lock()
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == HpsCircuitState.open and self._reset_due():
+                return HpsCircuitState.half_open
+            return self._state
+
+    def before_call(self):
+        """Admit a call, or raise HpsCircuitOpenException when the circuit
+        is open or its half-open probes are already in flight."""
+        with self._lock:
+            if self._state == HpsCircuitState.open:
+                if not self._reset_due():
+                    raise self._open_error()
+                self._state = HpsCircuitState.half_open
+                self._probes = 0
+                self._probe_successes = 0
+
+            if self._state == HpsCircuitState.half_open:
+                if self._probes >= self._policy.half_open_probes:
+                    raise self._open_error()
+                self._probes += 1
+
+    def record_success(self, elapsed=None):
+        threshold = self._policy.slow_call_threshold
+        if threshold is not None and elapsed is not None and elapsed > threshold:
+            self.record_failure()
+            return
+
+        with self._lock:
+            self._failures = 0
+            if self._state == HpsCircuitState.half_open:
+                self._probe_successes += 1
+                if self._probe_successes >= self._policy.half_open_probes:
+                    self._state = HpsCircuitState.closed
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (self._state == HpsCircuitState.half_open or
+                    self._failures >= self._policy.failure_threshold):
+                self._state = HpsCircuitState.open
+                self._opened_at = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._state = HpsCircuitState.closed
+            self._failures = 0
+            self._opened_at = None
+
+    def _reset_due(self):
+        return time.time() - self._opened_at >= self._policy.reset_timeout
+
+    def _open_error(self):
+        retry_after = max(0.0, self._opened_at + self._policy.reset_timeout - time.time())
+        return HpsCircuitOpenException(self._endpoint, retry_after)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint, policy):
+    """The breaker guarding `endpoint` under `policy`, created on first use."""
+    key = (endpoint, policy.key())
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = HpsCircuitBreaker(policy, endpoint)
+            _breakers[key] = breaker
+        return breaker
+
+
+def reset_circuit_breakers():
+    with _breakers_lock:
+        for breaker in _breakers.values():
+            breaker.reset()
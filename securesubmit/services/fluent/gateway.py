@@ -1,5 +1,3 @@
-import xml.etree.cElementTree as Et
-
 from securesubmit.entities import HpsTransaction
 from securesubmit.entities.check import HpsCheckResponse
 from securesubmit.entities.credit import HpsReportTransactionDetails, HpsReportTransactionSummary, HpsCharge, \
@@ -17,6 +15,7 @@ from securesubmit.infrastructure.validation import HpsIssuerResponseValidation,
     HpsInputValidation
 from securesubmit.services.fluent import HpsBuilderAbstract
 from securesubmit.services.gateway import HpsSoapGatewayService
+from securesubmit.services.xmlbackend import etree as Et
 
 
 """
@@ -114,20 +113,20 @@ class HpsFluentCreditService(HpsSoapGatewayService):
 
         rvalue = None
         if transaction.tag == 'ReportTxnDetail':
-            rvalue = HpsReportTransactionDetails.from_dict(rsp)
+            rvalue = self._entity_type(HpsReportTransactionDetails).from_dict(rsp)
         elif transaction.tag == 'ReportActivity':
-            rvalue = HpsReportTransactionSummary.from_dict(
+            rvalue = self._entity_type(HpsReportTransactionSummary).from_dict(
                 rsp, self._filter_by)
         elif transaction.tag == 'CreditSale':
-            rvalue = HpsCharge.from_dict(rsp)
+            rvalue = self._entity_type(HpsCharge).from_dict(rsp)
         elif transaction.tag == 'CreditAccountVerify':
-            rvalue = HpsAccountVerify.from_dict(rsp)
+            rvalue = self._entity_type(HpsAccountVerify).from_dict(rsp)
         elif transaction.tag == 'CreditAuth':
-            rvalue = HpsAuthorization.from_dict(rsp)
+            rvalue = self._entity_type(HpsAuthorization).from_dict(rsp)
         elif transaction.tag == 'CreditReturn':
             rvalue = HpsRefund.from_dict(rsp)
         elif transaction.tag == 'CreditReversal':
-            rvalue = HpsReversal.from_dict(rsp)
+            rvalue = self._entity_type(HpsReversal).from_dict(rsp)
         elif transaction.tag == 'CreditVoid':
             rvalue = HpsVoid.from_dict(rsp)
         elif transaction.tag == 'CreditTxnEdit':
@@ -135,9 +134,9 @@ class HpsFluentCreditService(HpsSoapGatewayService):
         elif transaction.tag == 'CreditCPCEdit':
             rvalue = HpsCPCEdit.from_dict(rsp)
         elif transaction.tag == 'RecurringBilling':
-            rvalue = HpsRecurringBilling.from_dict(rsp)
+            rvalue = self._entity_type(HpsRecurringBilling).from_dict(rsp)
         elif transaction.tag == 'CreditAdditionalAuth':
-            rvalue = HpsAuthorization.from_dict(rsp)
+            rvalue = self._entity_type(HpsAuthorization).from_dict(rsp)
         elif transaction.tag == 'PrePaidBalanceInquiry':
             rvalue = HpsAuthorization.from_dict(rsp)
         elif transaction.tag == 'PrePaidAddValue':
@@ -7,14 +7,15 @@
 """
 import base64
 import urllib
-import urllib3.contrib.pyopenssl
-import certifi
-import xml.etree.cElementTree as Et
+import xml.etree.cElementTree as _stdlib_etree
 import itertools
+import threading
 import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import jsonpickle
-import xmltodict as xmltodict
 
 from securesubmit.infrastructure import *
 from securesubmit.entities.credit import *
@@ -23,10 +24,25 @@ from securesubmit.entities.check import *
 from securesubmit.entities.gift import *
 from securesubmit.entities.payplan import *
 from securesubmit.entities.activation import *
+from securesubmit.entities.compact import compact_type
+from securesubmit.entities.lazy import lazy_type, HpsDeferredReportTransactionDetails
 from securesubmit.infrastructure.enums import EncodingType
-
-urllib3.contrib.pyopenssl.inject_into_urllib3()
-http = urllib3.PoolManager(cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+from securesubmit.services.transport import (
+    ACCEPT_ENCODING,
+    get_transport,
+    request_timeout,
+    is_timeout,
+    is_network_error,
+    is_connect_error,
+    HpsDeadline)
+from securesubmit.services.retry import next_client_txn_id
+from securesubmit.services.bulk import HpsBulkMixin
+from securesubmit.services.circuit import get_circuit_breaker
+from securesubmit.services.serializers import serialize, HpsSerializedTransaction
+from securesubmit.services.parser import parse_response, iter_report_rows, HpsPosResponse
+from securesubmit.services.raw import parse_raw_response, HpsRawResponse
+from securesubmit.services import xmlbackend
+from securesubmit.services.xmlbackend import etree as Et
 
 
 class HpsSoapGatewayService(object):
@@ -34,19 +50,21 @@ class HpsSoapGatewayService(object):
     _base_config = None
     _url = None
     _logging = False
+    _deadlines = None
 
     def __init__(self, config=None, enable_logging=False):
-        self._base_config = HpsConfiguration()
         self._config = config
         self._logging = enable_logging
+        self._deadlines = threading.local()
 
-        self._url = self._base_config.soap_service_uri
         if self._config is not None:
             self._url = self._config.service_uri
-
-        secret_api_key = self._base_config.secret_api_key
-        if self._config is not None:
             secret_api_key = self._config.secret_api_key
+        else:
+            # the config file is only consulted when no config is given
+            self._base_config = get_configuration()
+            self._url = self._base_config.soap_service_uri
+            secret_api_key = self._base_config.secret_api_key
 
         if secret_api_key is not None and secret_api_key != "":
             if "_uat_" in secret_api_key:
@@ -67,93 +85,92 @@ class HpsSoapGatewayService(object):
     @services_config.setter
     def services_config(self, value):
         self._config = value
+        if value is None and self._base_config is None:
+            self._base_config = get_configuration()
+
+    def deadline(self, seconds):
+        """Bound every gateway call made inside the block, including
+        automatic reversals, to `seconds` in total. Nested deadlines can
+        only shorten the budget. The deadline applies to the calls the
+        current thread makes."""
+        return _deadline_scope(self, HpsDeadline(seconds))
+
+    @property
+    def _deadline(self):
+        return getattr(self._deadlines, 'deadline', None)
 
-    def do_transaction(self, transaction, client_transaction_id=None):
+    def warm_up(self, connections=1):
+        """Open `connections` keep-alive connections to the gateway before
+        the first transaction needs them, and return an HpsWarmUpReport
+        of the handshakes."""
+        try:
+            report = get_transport(self._config).warm_up(
+                self._url, connections, request_timeout(self._config, self._deadline))
+        except Exception, e:
+            if self._deadline is not None and is_timeout(e):
+                raise _deadline_exceeded(e)
+            raise HpsGatewayException(HpsExceptionCodes.unknown_gateway_error, 'Unable to connect', None, None, e)
+        if self._logging:
+            print 'Warm up: ' + repr(report)
+        return report
+
+    def do_transaction(self, transaction, client_transaction_id=None, response_type=None, stream=False,
+                       retry=True):
+        """Send `transaction` and return the PosResponse as a dict, or, when
+        `response_type` is given, as an HpsPosResponse hydrating an entity
+        of that type. A `response_type` of HpsRawResponse returns the
+        read-only view of raw mode. With `stream`, the response is returned
+        unparsed, as an iterable of its chunks. Without `retry`, the
+        transaction is sent once, ignoring the config's retry policy."""
         if self._is_config_invalid():
             raise HpsAuthenticationException(
                 HpsExceptionCodes.invalid_configuration,
                 ('The HPS SDK has not been properly configured. Please make sure to initialize the config either '
                  'in a service constructor or in your App.config or Web.config file.')
             )
-        try:
-            # Envelope
-            envelope = Et.Element("soap:Envelope")
-            envelope.set("xmlns:soap", "http://schemas.xmlsoap.org/soap/envelope/")
-            envelope.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
-            envelope.set("xmlns:xsd", "http://www.w3.org/2001/XMLSchema")
-            body = Et.SubElement(envelope, "soap:Body")
-
-            # Request
-            request = Et.SubElement(body, "PosRequest")
-            request.set("xmlns", "http://Hps.Exchange.PosGateway")
-            version1 = Et.SubElement(request, "Ver1.0")
-
-            # Header
-            header = Et.SubElement(version1, "Header")
-            # secret_api_key = None
-            if self._config is not None:
-                secret_api_key = self._config.secret_api_key
-            else:
-                secret_api_key = self._base_config.secret_api_key
+        _check_deadline(self._deadline)
 
-            if secret_api_key is not None and secret_api_key != "":
-                api_key = Et.SubElement(header, "SecretAPIKey")
-                api_key.text = secret_api_key.strip()
-            else:
-                site_id = Et.SubElement(header, 'SiteId')
-                device_id = Et.SubElement(header, 'DeviceId')
-                license_id = Et.SubElement(header, 'LicenseId')
-                username = Et.SubElement(header, 'UserName')
-                password = Et.SubElement(header, 'Password')
-
-                if self._config is not None:
-                    site_id.text = str(self._config.site_id)
-                    device_id.text = str(self._config.device_id)
-                    license_id.text = str(self._config.license_id)
-                    username.text = self._config.username
-                    password.text = self._config.password
-                else:
-                    site_id.text = str(self._base_config.site_id)
-                    device_id.text = str(self._base_config.device_id)
-                    license_id.text = str(self._base_config.license_id)
-                    username.text = self._base_config.username
-                    password.text = self._base_config.password
-
-            developer_id = self._base_config.developer_id
-            version_id = self._base_config.version_number
-            if self._config is not None:
-                developer_id = self._config.developer_id
-                version_id = self._config.version_number
-
-            if developer_id != '' and developer_id is not None:
-                Et.SubElement(header, 'DeveloperID').text = developer_id
-            if version_id != '' and version_id is not None:
-                Et.SubElement(header, 'VersionNbr').text = version_id
+        policy = self._retry_policy() if retry else None
+        if client_transaction_id is None and policy is not None and policy.generate_client_txn_id:
+            client_transaction_id = str(next_client_txn_id())
+
+        try:
+            envelope_start, envelope_middle, envelope_end = _envelope_fragments(
+                self._config if self._config is not None else self._base_config, self._header_fields())
 
+            xml_parts = [envelope_start]
             if client_transaction_id is not None:
-                client_txn_id = Et.SubElement(header, 'ClientTxnId')
+                client_txn_id = Et.Element('ClientTxnId')
                 client_txn_id.text = client_transaction_id
+                xml_parts.append(Et.tostring(client_txn_id))
+            xml_parts.append(envelope_middle)
+            if isinstance(transaction, HpsSerializedTransaction):
+                xml_parts.append(transaction.xml)
+            else:
+                xml_parts.append(Et.tostring(transaction))
+            xml_parts.append(envelope_end)
 
-            # Transaction
-            trans = Et.SubElement(version1, "Transaction")
-            trans.append(transaction)
-
-            xml = Et.tostring(envelope).encode('utf-8')
+            xml = ''.join(xml_parts).encode('utf-8')
             if self._logging:
                 print 'URL: ' + self._url
                 print 'Request: ' + xml
 
-            request_headers = {'Content-type': 'text/xml; charset=UTF-8',
-                               'Content-length': str(len(xml))}
-            request = http.request('POST', self._url, headers=request_headers, body=xml)
-            raw_response = request.data
+            # a compressed response is decompressed into the parser as it
+            # arrives, unless the whole document is wanted
+            chunked = stream or (self._compress_responses() and response_type is not HpsRawResponse)
+            raw_response = self._post(xml, client_transaction_id, chunked and not self._logging, policy)
             if self._logging:
                 print 'Response: ' + raw_response
 
-            namespaces = {"http://Hps.Exchange.PosGateway": None,
-                          "http://schemas.xmlsoap.org/soap/envelope/": None}
+            if stream:
+                return raw_response
+
+            if response_type is HpsRawResponse:
+                return parse_raw_response(raw_response)
+            if response_type is not None:
+                return parse_response(raw_response, response_type)
 
-            response = xmltodict.parse(raw_response, process_namespaces=True, namespaces=namespaces)
+            response = xmlbackend.backend.parse(raw_response)
 
             if ('Envelope' in response and
                     'Body' in response['Envelope'] and
@@ -161,11 +178,141 @@ class HpsSoapGatewayService(object):
                 return response['Envelope']['Body']['PosResponse']
             else:
                 raise HpsException("Unexpected response")
+        except HpsGatewayException:
+            raise
         except Exception, e:
             if self._logging:
                 print e.message
+            if self._deadline is not None and is_timeout(e):
+                raise _deadline_exceeded(e)
             raise HpsGatewayException(HpsExceptionCodes.unknown_gateway_error, 'Unable to process transaction', None, None, e)
 
+    def _header_fields(self):
+        """The (tag, text) pairs of the request header, apart from the
+        ClientTxnId, in the order they are sent."""
+        config = self._config if self._config is not None else self._base_config
+
+        secret_api_key = config.secret_api_key
+        if secret_api_key is not None and secret_api_key != "":
+            fields = [('SecretAPIKey', secret_api_key.strip())]
+        else:
+            fields = [('SiteId', str(config.site_id)),
+                      ('DeviceId', str(config.device_id)),
+                      ('LicenseId', str(config.license_id)),
+                      ('UserName', config.username),
+                      ('Password', config.password)]
+
+        if config.developer_id != '' and config.developer_id is not None:
+            fields.append(('DeveloperID', config.developer_id))
+        if config.version_number != '' and config.version_number is not None:
+            fields.append(('VersionNbr', config.version_number))
+
+        return tuple(fields)
+
+    def find_transaction_id(self, client_transaction_id):
+        """Look up the gateway transaction id recorded for a client
+        transaction id, or None when the gateway has no such transaction."""
+        transaction = Et.Element('FindTransactions')
+        criteria = Et.SubElement(transaction, 'Criteria')
+        Et.SubElement(criteria, 'ClientTxnId').text = str(client_transaction_id)
+
+        # sent once and without a ClientTxnId of its own: a lookup that
+        # failed the same way would otherwise start a lookup of its own
+        rsp = self.do_transaction(transaction, retry=False)['Ver1.0']
+        HpsGatewayResponseValidation.check_response(rsp, transaction.tag)
+
+        found = rsp['Transaction']['FindTransactions'] if 'Transaction' in rsp else None
+        if found is None or 'Transactions' not in found:
+            return None
+
+        records = found['Transactions']
+        if not isinstance(records, list):
+            records = [records]
+        for record in records:
+            if record is not None and 'GatewayTxnId' in record:
+                return int(record['GatewayTxnId'])
+        return None
+
+    def _retry_policy(self):
+        return getattr(self._config, 'retry_policy', None)
+
+    def _entity_type(self, entity_type):
+        return _configured_entity_type(self._config, entity_type)
+
+    def _raw_responses(self):
+        return getattr(self._config, 'raw_responses', False)
+
+    def _compress_responses(self):
+        return getattr(self._config, 'compress_responses', False)
+
+    def _circuit_breaker(self):
+        policy = getattr(self._config, 'circuit_breaker', None)
+        if policy is None:
+            return None
+        return get_circuit_breaker(self._url, policy)
+
+    def _post(self, xml, client_transaction_id=None, stream=False, policy=None):
+        """Post `xml` and return the response body, or with `stream` an
+        iterator of its decoded chunks, retrying as `policy` allows."""
+        request_headers = {'Content-type': 'text/xml; charset=UTF-8',
+                           'Content-length': str(len(xml))}
+        if self._compress_responses():
+            request_headers['Accept-Encoding'] = ACCEPT_ENCODING
+        breaker = self._circuit_breaker()
+        attempt = 0
+        while True:
+            attempt += 1
+            _check_deadline(self._deadline)
+            if breaker is not None:
+                breaker.before_call()
+
+            started = time.time()
+            try:
+                transport = get_transport(self._config)
+                response = transport.request('POST', self._url, headers=request_headers, body=xml,
+                                             preload_content=not stream,
+                                             **_request_options(self._config, self._deadline, policy))
+            except Exception, e:
+                if breaker is not None:
+                    breaker.record_failure()
+                if policy is None or attempt >= policy.max_attempts or not is_network_error(e):
+                    raise
+
+                if not is_connect_error(e):
+                    # the gateway may have processed the request
+                    if client_transaction_id is None:
+                        raise
+                    self._check_not_processed(client_transaction_id, e)
+
+                delay = policy.delay(attempt)
+                if self._deadline is not None and self._deadline.remaining() <= delay:
+                    raise
+                if self._logging:
+                    print 'Retrying after error: ' + str(e)
+                time.sleep(delay)
+            else:
+                if breaker is not None:
+                    if response.status >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success(time.time() - started)
+                if stream:
+                    return transport.stream(self._url, response)
+                return response.data
+
+    def _check_not_processed(self, client_transaction_id, error):
+        try:
+            transaction_id = self.find_transaction_id(client_transaction_id)
+        except HpsException:
+            # without a clean lookup a retry could duplicate the transaction
+            raise error
+
+        if transaction_id is not None:
+            raise HpsDuplicateTransactionException(
+                transaction_id, client_transaction_id,
+                'The gateway already processed this client transaction id.',
+                error)
+
     def _is_config_invalid(self):
         """Determine whether the HPS config has been initialized,
         in one way or another.
@@ -477,10 +624,12 @@ class HpsRestGatewayService(object):
     _offset = None
     _search_fields = None
     _logging = False
+    _deadlines = None
 
     def __init__(self, config=None, enable_logging=False):
         self._config = config
         self._logging = enable_logging
+        self._deadlines = threading.local()
 
         config.validate()
         self._url = config.service_uri()
@@ -495,6 +644,30 @@ class HpsRestGatewayService(object):
         self._search_fields = search_fields
         return self
 
+    def deadline(self, seconds):
+        """Bound every request the current thread makes inside the block
+        to `seconds` in total."""
+        return _deadline_scope(self, HpsDeadline(seconds))
+
+    @property
+    def _deadline(self):
+        return getattr(self._deadlines, 'deadline', None)
+
+    def warm_up(self, connections=1):
+        """Open `connections` keep-alive connections to the API before the
+        first request needs them, and return an HpsWarmUpReport of the
+        handshakes."""
+        try:
+            report = get_transport(self._config).warm_up(
+                self._url, connections, request_timeout(self._config, self._deadline))
+        except Exception, e:
+            if self._deadline is not None and is_timeout(e):
+                raise _deadline_exceeded(e)
+            raise
+        if self._logging:
+            print 'Warm up: ' + repr(report)
+        return report
+
     def do_request(self, verb, endpoint, data=None, additional_headers=None):
         url = self._url + endpoint
         if self._logging:
@@ -505,17 +678,26 @@ class HpsRestGatewayService(object):
 
         headers = self._config.get_headers(additional_headers)
         headers['Authorization'] = 'Basic ' + base64.b64encode(self._config.secret_api_key)
+        if getattr(self._config, 'compress_responses', False):
+            headers['Accept-Encoding'] = ACCEPT_ENCODING
 
-        if data is not None:
-            encoded_data = jsonpickle.encode(data, False, False, True)
-            if self._logging:
-                print 'Request: ' + encoded_data
+        _check_deadline(self._deadline)
+        options = _request_options(self._config, self._deadline)
+        try:
+            if data is not None:
+                encoded_data = jsonpickle.encode(data, False, False, True)
+                if self._logging:
+                    print 'Request: ' + encoded_data
 
-            response = http.request(verb, url, headers=headers, body=encoded_data)
-        else:
-            if self._logging:
-                print 'Request: ' + url
-            response = http.request(verb, url, headers=headers)
+                response = get_transport(self._config).request(verb, url, headers=headers, body=encoded_data, **options)
+            else:
+                if self._logging:
+                    print 'Request: ' + url
+                response = get_transport(self._config).request(verb, url, headers=headers, **options)
+        except Exception, e:
+            if self._deadline is not None and is_timeout(e):
+                raise _deadline_exceeded(e)
+            raise
 
         if self._logging:
             print 'Response: ' + response.data
@@ -527,6 +709,9 @@ class HpsRestGatewayService(object):
         else:
             raise HpsException('Unexpected response.')
 
+    def _entity_type(self, entity_type):
+        return _configured_entity_type(self._config, entity_type)
+
     @staticmethod
     def hydrate_response(object_type, response):
         if response is None or response == '':
@@ -536,7 +721,7 @@ class HpsRestGatewayService(object):
         return object_type.from_dict(rsp)
 
 
-class HpsCreditService(HpsSoapGatewayService):
+class HpsCreditService(HpsBulkMixin, HpsSoapGatewayService):
     _filter_by = None
 
     def __init__(self, config=None, enable_logging=False):
@@ -546,16 +731,65 @@ class HpsCreditService(HpsSoapGatewayService):
         if transaction_id is None or transaction_id <= 0:
             raise HpsArgumentException('Invalid transaction id.')
 
+        # raw responses aren't entities, so they are neither cached nor
+        # answered from the cache
+        cache = self._detail_cache() if not self._raw_responses() else None
+        if cache is not None:
+            details = cache.get(transaction_id, self._merchant())
+            if details is not None:
+                return details
+
         # Build the transaction request.
         transaction = Et.Element("ReportTxnDetail")
         Et.SubElement(transaction, "TxnId").text = str(transaction_id)
 
-        return self._submit_transaction(transaction)
+        details = self._submit_transaction(transaction)
+        if cache is not None:
+            cache.put(transaction_id, details, self._merchant())
+        return details
+
+    def get_many(self, transaction_ids, concurrency=None, pool=None):
+        """Get the details of every transaction of `transaction_ids`, with
+        up to `concurrency` requests in flight as for submit_many. Returns
+        an OrderedDict mapping each distinct id, in the order first seen,
+        to the HpsBulkResult of its get: the HpsReportTransactionDetails,
+        or the exception raised for that id."""
+        transaction_ids = list(OrderedDict.fromkeys(transaction_ids))
+        results = self.submit_many([('get', (transaction_id,)) for transaction_id in transaction_ids],
+                                   concurrency=concurrency, pool=pool)
+        return OrderedDict(zip(transaction_ids, results))
 
     def list(self, utc_start=None, utc_end=None, filter_by=None):
+        transaction = self._report_activity(utc_start, utc_end)
+        self._filter_by = filter_by
+
+        return self._submit_transaction(transaction)
+
+    def iter_list(self, utc_start=None, utc_end=None, filter_by=None):
+        """Yield the summaries list returns one at a time, as the report
+        is read from the gateway, so that memory stays flat however many
+        rows it has. The report is requested when iteration starts."""
+        rsp, rows = self._report(utc_start, utc_end)
+
+        entity_type = self._entity_type(HpsReportTransactionSummary)
+        for summary in entity_type.from_rows(rsp, rows, filter_by):
+            yield summary
+
+    def _report(self, utc_start, utc_end):
+        """Request the activity of a range and return the checked
+        response, as a dict without its Details, and an iterator of the
+        Details rows, read as it is consumed."""
+        transaction = self._report_activity(utc_start, utc_end)
+
+        rows = self._report_rows(self.do_transaction(transaction, stream=True))
+        rsp = next(rows)
+        self._process_charge_gateway_response(rsp, transaction.tag)
+        self._process_charge_issuer_response(rsp, transaction.tag)
+        return rsp, rows
+
+    def _report_activity(self, utc_start, utc_end):
         HpsInputValidation.check_date_not_future(utc_start)
         HpsInputValidation.check_date_not_future(utc_end)
-        self._filter_by = filter_by
 
         transaction = Et.Element("ReportActivity")
 
@@ -567,7 +801,17 @@ class HpsCreditService(HpsSoapGatewayService):
             end = Et.SubElement(transaction, "RptEndUtcDT")
             end.text = utc_end.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
-        return self._submit_transaction(transaction)
+        return transaction
+
+    def _report_rows(self, chunks):
+        # the body is read as the rows are, after do_transaction returned
+        try:
+            for row in iter_report_rows(chunks):
+                yield row
+        except Exception, e:
+            if self._deadline is not None and is_timeout(e):
+                raise _deadline_exceeded(e)
+            raise HpsGatewayException(HpsExceptionCodes.unknown_gateway_error, 'Unable to process transaction', None, None, e)
 
     def charge(self, amount, currency, card_data,
                card_holder=None,
@@ -582,55 +826,19 @@ class HpsCreditService(HpsSoapGatewayService):
         HpsInputValidation.check_amount(amount)
         HpsInputValidation.check_currency(currency)
 
-        # Built the transaction request
-        transaction = Et.Element('CreditSale')
-        block1 = Et.SubElement(transaction, 'Block1')
-        Et.SubElement(block1, 'AllowDup').text = 'Y'
-        partial_auth = Et.SubElement(block1, 'AllowPartialAuth')
-        if allow_partial_auth:
-            partial_auth.text = 'Y'
-        else:
-            partial_auth.text = 'N'
-
-        Et.SubElement(block1, 'Amt').text = str(amount)
-
-        # Add Card Holder
-        if card_holder is not None:
-            block1.append(_hydrate_card_holder_data(card_holder))
-
-        # Add Card Data
-        card_data_element = Et.SubElement(block1, 'CardData')
-        if isinstance(card_data, HpsCreditCard):
-            card_data_element.append(_hydrate_card_manual_entry(card_data, card_present, reader_present))
-            if card_data.encryption_data is not None:
-                card_data_element.append(_hydrate_encryption_data(card_data.encryption_data))
-        elif isinstance(card_data, HpsTrackData):
-            card_data_element.append(_hydrate_track_data(card_data))
-            if card_data.encryption_data is not None:
-                card_data_element.append(_hydrate_encryption_data(card_data.encryption_data))
-        else:
-            card_data_element.append(_hydrate_token_data(card_data, card_present, reader_present))
-
-        # CPC request
-        if cpc_req is True:
-            Et.SubElement(block1, 'CPCReq').text = 'Y'
-
-        # Add Token Request
-        token_request = Et.SubElement(card_data_element, 'TokenRequest')
-        if request_multi_use_token:
-            token_request.text = 'Y'
-        else:
-            token_request.text = 'N'
-
-        # Handle the AdditionalTxnFields
-        if details is not None:
-            block1.append(_hydrate_additional_txn_fields(details))
-
-        if descriptor is not None:
-            Et.SubElement(block1, "TxnDescriptor").text = descriptor
-
-        if direct_market_data is not None:
-            block1.append(_hydrate_direct_market_data(direct_market_data))
+        transaction = serialize(
+            'CreditSale',
+            amount=amount,
+            card_data=card_data,
+            card_holder=card_holder,
+            request_multi_use_token=request_multi_use_token,
+            descriptor=descriptor,
+            allow_partial_auth=allow_partial_auth,
+            details=details,
+            direct_market_data=direct_market_data,
+            cpc_req=cpc_req,
+            card_present=card_present,
+            reader_present=reader_present)
 
         # Submit the transaction
         client_txn_id = _get_client_txn_id(details)
@@ -642,33 +850,13 @@ class HpsCreditService(HpsSoapGatewayService):
                client_transaction_id=None,
                card_present=False,
                reader_present=False):
-        # Build the transaction request.
-        transaction = Et.Element('CreditAccountVerify')
-        block1 = Et.SubElement(transaction, 'Block1')
-
-        # Add Card Holder
-        if card_holder is not None:
-            block1.append(_hydrate_card_holder_data(card_holder))
-
-        # Add Card Data
-        card_data_element = Et.SubElement(block1, 'CardData')
-        if isinstance(card_data, HpsCreditCard):
-            card_data_element.append(_hydrate_card_manual_entry(card_data, card_present, reader_present))
-            if card_data.encryption_data is not None:
-                card_data_element.append(_hydrate_encryption_data(card_data.encryption_data))
-        elif isinstance(card_data, HpsTrackData):
-            card_data_element.append(_hydrate_track_data(card_data))
-            if card_data.encryption_data is not None:
-                card_data_element.append(_hydrate_encryption_data(card_data.encryption_data))
-        else:
-            card_data_element.append(_hydrate_token_data(card_data, card_present, reader_present))
-
-        # Add Token Request
-        token_request = Et.SubElement(card_data_element, 'TokenRequest')
-        if request_multi_use_token:
-            token_request.text = 'Y'
-        else:
-            token_request.text = 'N'
+        transaction = serialize(
+            'CreditAccountVerify',
+            card_data=card_data,
+            card_holder=card_holder,
+            request_multi_use_token=request_multi_use_token,
+            card_present=card_present,
+            reader_present=reader_present)
 
         return self._submit_transaction(transaction, client_transaction_id)
 
@@ -684,51 +872,18 @@ class HpsCreditService(HpsSoapGatewayService):
         HpsInputValidation.check_amount(amount)
         HpsInputValidation.check_currency(currency)
 
-        # Build the transaction Request
-        transaction = Et.Element('CreditAuth')
-        block1 = Et.SubElement(transaction, 'Block1')
-        Et.SubElement(block1, 'AllowDup').text = 'Y'
-        partial_auth = Et.SubElement(block1, 'AllowPartialAuth')
-        if allow_partial_auth:
-            partial_auth.text = 'Y'
-        else:
-            partial_auth.text = 'N'
-
-        Et.SubElement(block1, 'Amt').text = str(amount)
-
-        # Add Card Holder
-        if card_holder is not None:
-            block1.append(_hydrate_card_holder_data(card_holder))
-
-        card_data_element = Et.SubElement(block1, 'CardData')
-        if isinstance(card_data, HpsCreditCard):
-            card_data_element.append(_hydrate_card_manual_entry(card_data, card_present, reader_present))
-            if card_data.encryption_data is not None:
-                card_data_element.append(_hydrate_encryption_data(card_data.encryption_data))
-        elif isinstance(card_data, HpsTrackData):
-            card_data_element.append(_hydrate_track_data(card_data))
-            if card_data.encryption_data is not None:
-                card_data_element.append(_hydrate_encryption_data(card_data.encryption_data))
-        else:
-            card_data_element.append(_hydrate_token_data(card_data, card_present, reader_present))
-
-        # CPC request
-        if cpc_req is True:
-            Et.SubElement(block1, 'CPCReq').text = 'Y'
-
-        # Add Token Request
-        token_request = Et.SubElement(card_data_element, 'TokenRequest')
-        if request_multi_use_token:
-            token_request.text = 'Y'
-        else:
-            token_request.text = 'N'
-
-        # Handle the AdditionalTxnFields
-        if details is not None:
-            block1.append(_hydrate_additional_txn_fields(details))
-
-        if descriptor is not None:
-            Et.SubElement(block1, "TxnDescriptor").text = descriptor
+        transaction = serialize(
+            'CreditAuth',
+            amount=amount,
+            card_data=card_data,
+            card_holder=card_holder,
+            request_multi_use_token=request_multi_use_token,
+            descriptor=descriptor,
+            allow_partial_auth=allow_partial_auth,
+            details=details,
+            cpc_req=cpc_req,
+            card_present=card_present,
+            reader_present=reader_present)
 
         client_txn_id = _get_client_txn_id(details)
         return self._submit_transaction(transaction, client_txn_id)
@@ -741,7 +896,8 @@ class HpsCreditService(HpsSoapGatewayService):
         Et.SubElement(block1, 'GatewayTxnId').text = str(transaction_id)
         Et.SubElement(block1, 'Amt').text = str(amount)
 
-        return self._submit_transaction(transaction)
+        with self._changing(transaction_id):
+            return self._submit_transaction(transaction)
 
     def capture(self, transaction_id,
                 amount=None,
@@ -763,9 +919,13 @@ class HpsCreditService(HpsSoapGatewayService):
             transaction.append(_hydrate_direct_market_data(direct_market_data))
 
         # Submit the transaction
-        rsp = self.do_transaction(transaction, client_transaction_id)["Ver1.0"]
-        self._process_charge_gateway_response(rsp, transaction.tag)
+        with self._changing(transaction_id):
+            rsp = self.do_transaction(transaction, client_transaction_id)["Ver1.0"]
+            self._process_charge_gateway_response(rsp, transaction.tag)
 
+        if getattr(self._config, 'defer_capture_details', False):
+            return HpsDeferredReportTransactionDetails.from_capture(
+                rsp, transaction_id, lambda: self.get(transaction_id))
         return self.get(transaction_id)
 
     def refund(self, amount, currency, card_data,
@@ -774,68 +934,41 @@ class HpsCreditService(HpsSoapGatewayService):
         HpsInputValidation.check_amount(amount)
         HpsInputValidation.check_currency(currency)
 
-        # Build the transaction request
-        transaction = Et.Element('CreditReturn')
-        block1 = Et.SubElement(transaction, 'Block1')
-        Et.SubElement(block1, 'AllowDup').text = "Y"
-        Et.SubElement(block1, 'Amt').text = str(amount)
-
-        # Add Card Holder
-        if card_holder is not None:
-            block1.append(_hydrate_card_holder_data(card_holder))
-
-        # Card Data
-        if isinstance(card_data, HpsCreditCard):
-            card_data_element = Et.SubElement(block1, 'CardData')
-            card_data_element.append(
-                _hydrate_card_manual_entry(card_data))
-        elif isinstance(card_data, (basestring, str)):
-            card_data_element = Et.SubElement(block1, 'CardData')
-            token_data = Et.SubElement(card_data_element, 'TokenData')
-            Et.SubElement(token_data, 'TokenValue').text = card_data
-        else:
-            Et.SubElement(block1, 'GatewayTxnId').text = str(card_data)
-
-        # Additional Txn
-        if details is not None:
-            block1.append(_hydrate_additional_txn_fields(details))
+        transaction = serialize(
+            'CreditReturn',
+            amount=amount,
+            card_data=card_data,
+            card_holder=card_holder,
+            details=details,
+            card_present=False,
+            reader_present=False)
 
         client_txn_id = _get_client_txn_id(details)
-        return self._submit_transaction(transaction, client_txn_id)
+        with self._changing(_gateway_txn_id(card_data)):
+            return self._submit_transaction(transaction, client_txn_id)
 
     def reverse(self, card_data, amount, currency, details=None):
         HpsInputValidation.check_amount(amount)
         HpsInputValidation.check_currency(currency)
 
-        # Build the transaction request
-        transaction = Et.Element('CreditReversal')
-        block1 = Et.SubElement(transaction, 'Block1')
-        Et.SubElement(block1, 'Amt').text = str(amount)
-
-        # Card Data
-        if isinstance(card_data, HpsCreditCard):
-            card_data_element = Et.SubElement(block1, 'CardData')
-            card_data_element.append(
-                _hydrate_card_manual_entry(card_data))
-        elif isinstance(card_data, (basestring, str)):
-            card_data_element = Et.SubElement(block1, 'CardData')
-            token_data = Et.SubElement(card_data_element, 'TokenData')
-            Et.SubElement(token_data, 'TokenValue').text = card_data
-        else:
-            Et.SubElement(block1, 'GatewayTxnId').text = str(card_data)
-
-        # Additional Txn
-        if details is not None:
-            block1.append(_hydrate_additional_txn_fields(details))
+        transaction = serialize(
+            'CreditReversal',
+            amount=amount,
+            card_data=card_data,
+            details=details,
+            card_present=False,
+            reader_present=False)
 
         client_txn_id = _get_client_txn_id(details)
-        return self._submit_transaction(transaction, client_txn_id)
+        with self._changing(_gateway_txn_id(card_data)):
+            return self._submit_transaction(transaction, client_txn_id)
 
     def void(self, transaction_id, client_transaction_id=None):
         transaction = Et.Element('CreditVoid')
         Et.SubElement(transaction, 'GatewayTxnId').text = str(transaction_id)
 
-        return self._submit_transaction(transaction, client_transaction_id)
+        with self._changing(transaction_id):
+            return self._submit_transaction(transaction, client_transaction_id)
 
     def edit(self,
              transaction_id,
@@ -853,7 +986,8 @@ class HpsCreditService(HpsSoapGatewayService):
             Et.SubElement(transaction, 'GratuityAmtInfo').text = str(gratuity)
 
         # Submit the transaction
-        trans = self._submit_transaction(transaction, client_transaction_id)
+        with self._changing(transaction_id):
+            trans = self._submit_transaction(transaction, client_transaction_id)
         trans.response_code = '00'
         trans.response_text = ''
 
@@ -864,7 +998,8 @@ class HpsCreditService(HpsSoapGatewayService):
         Et.SubElement(transaction, 'GatewayTxnId').text = str(transaction_id)
         transaction.append(_hydrate_cpc_data(cpc_data))
 
-        return self._submit_transaction(transaction)
+        with self._changing(transaction_id):
+            return self._submit_transaction(transaction)
 
     def recurring(self, payment_data, amount, schedule=None, card_holder=None, one_time=False, details=None):
         HpsInputValidation.check_amount(amount)
@@ -919,53 +1054,83 @@ class HpsCreditService(HpsSoapGatewayService):
 
     # def balance inquiry
 
-    def _submit_transaction(self, transaction, client_transaction_id=None):
-        rsp = self.do_transaction(transaction, client_transaction_id)['Ver1.0']
+    def _detail_cache(self):
+        return getattr(self._config, 'detail_cache', None)
+
+    def _merchant(self):
+        """The credentials naming the config's merchant in the detail
+        cache, which keeps no more than a hash of them."""
+        return '\0'.join(str(value) for tag, value in self._header_fields()
+                         if tag in ('SecretAPIKey', 'SiteId', 'DeviceId', 'LicenseId', 'UserName'))
 
+    @contextmanager
+    def _changing(self, transaction_id):
+        """Drop the cached details of `transaction_id` once the block has
+        changed the transaction, or may have, having failed."""
+        try:
+            yield
+        finally:
+            cache = self._detail_cache()
+            if cache is not None and transaction_id is not None:
+                cache.invalidate(transaction_id, self._merchant())
+
+    def _submit_transaction(self, transaction, client_transaction_id=None):
         amount = None
         if transaction.tag == 'CreditSale' or \
                 transaction.tag == 'CreditAuth':
-            amount = transaction.iter('Amt').next().text
+            if isinstance(transaction, HpsSerializedTransaction):
+                amount = str(transaction.arguments['amount'])
+            else:
+                amount = transaction.iter('Amt').next().text
+
+        response_type = _response_types.get(transaction.tag)
+        if self._raw_responses():
+            response_type = HpsRawResponse
+        if response_type is not None:
+            response = self.do_transaction(transaction, client_transaction_id, response_type)
+            self._process_charge_gateway_response(response, transaction.tag, amount, 'usd')
+            self._process_charge_issuer_response(response, transaction.tag, amount, 'usd')
+            if response_type is HpsRawResponse:
+                return response
+            return response.entity
+
+        rsp = self.do_transaction(transaction, client_transaction_id)['Ver1.0']
 
         self._process_charge_gateway_response(rsp, transaction.tag, amount, 'usd')
         self._process_charge_issuer_response(rsp, transaction.tag, amount, 'usd')
 
         rvalue = None
         if transaction.tag == 'ReportTxnDetail':
-            rvalue = HpsReportTransactionDetails.from_dict(rsp)
+            rvalue = self._entity_type(HpsReportTransactionDetails).from_dict(rsp)
         elif transaction.tag == 'ReportActivity':
-            rvalue = HpsReportTransactionSummary.from_dict(
+            rvalue = self._entity_type(HpsReportTransactionSummary).from_dict(
                 rsp, self._filter_by)
-        elif transaction.tag == 'CreditSale':
-            rvalue = HpsCharge.from_dict(rsp)
-        elif transaction.tag == 'CreditAccountVerify':
-            rvalue = HpsAccountVerify.from_dict(rsp)
-        elif transaction.tag == 'CreditAuth':
-            rvalue = HpsAuthorization.from_dict(rsp)
-        elif transaction.tag == 'CreditReturn':
-            rvalue = HpsRefund.from_dict(rsp)
-        elif transaction.tag == 'CreditReversal':
-            rvalue = HpsReversal.from_dict(rsp)
-        elif transaction.tag == 'CreditVoid':
-            rvalue = HpsVoid.from_dict(rsp)
         elif transaction.tag == 'CreditTxnEdit':
             rvalue = HpsTransaction.from_dict(rsp)
         elif transaction.tag == 'CreditCPCEdit':
             rvalue = HpsCPCEdit.from_dict(rsp)
         elif transaction.tag == 'RecurringBilling':
-            rvalue = HpsRecurringBilling.from_dict(rsp)
+            rvalue = self._entity_type(HpsRecurringBilling).from_dict(rsp)
         elif transaction.tag == 'CreditAdditionalAuth':
-            rvalue = HpsAuthorization.from_dict(rsp)
+            rvalue = self._entity_type(HpsAuthorization).from_dict(rsp)
         elif transaction.tag == 'ManageTokens':
             rvalue = HpsTransaction.from_dict(rsp)
 
         return rvalue
 
     def _process_charge_issuer_response(self, response, expected_type, *args):
-        transaction_id = response['Header']['GatewayTxnId']
-        transaction = response['Transaction'][expected_type] if 'Transaction' in response else None
+        if isinstance(response, (HpsPosResponse, HpsRawResponse)):
+            if response.transaction_type is None:
+                return
+            transaction_id = response.gateway_txn_id
+            response_code = response.response_code
+            response_text = response.response_text
+        else:
+            transaction_id = response['Header']['GatewayTxnId']
+            transaction = response['Transaction'][expected_type] if 'Transaction' in response else None
+            if transaction is None:
+                return
 
-        if transaction is not None:
             response_code = None
             if 'RspCode' in transaction:
                 response_code = transaction['RspCode']
@@ -974,48 +1139,60 @@ class HpsCreditService(HpsSoapGatewayService):
             if 'RspText' in transaction:
                 response_text = transaction['RspText']
 
-            if response_code is not None:
-                if response_code == '91':
-                    try:
-                        self.reverse(int(transaction_id), *args)
-                    except HpsGatewayException, e:
-                        if e.details.gateway_response_code == '3':
-                            HpsIssuerResponseValidation.check_response(
-                                transaction_id,
-                                response_code,
-                                response_text)
-                        raise HpsCreditException(
+        if response_code is not None:
+            if response_code == '91':
+                try:
+                    self.reverse(int(transaction_id), *args)
+                except HpsGatewayException, e:
+                    if e.details is not None and e.details.gateway_response_code == '3':
+                        HpsIssuerResponseValidation.check_response(
                             transaction_id,
-                            HpsExceptionCodes.issuer_timeout_reversal_error,
-                            ('Error occurred while reversing ',
-                             'a charge due to HPS issuer time-out.'),
-                            e)
-                    except Exception, e:
-                        raise HpsCreditException(
-                            transaction_id,
-                            HpsExceptionCodes.issuer_timeout_reversal_error,
-                            'Error occurred while reversing a charge due to HPS issuer time-out.',
-                            e
-                        )
-                HpsIssuerResponseValidation.check_response(
-                    transaction_id, response_code, response_text)
+                            response_code,
+                            response_text)
+                    raise HpsCreditException(
+                        transaction_id,
+                        HpsExceptionCodes.issuer_timeout_reversal_error,
+                        ('Error occurred while reversing ',
+                         'a charge due to HPS issuer time-out.'),
+                        e)
+                except Exception, e:
+                    raise HpsCreditException(
+                        transaction_id,
+                        HpsExceptionCodes.issuer_timeout_reversal_error,
+                        'Error occurred while reversing a charge due to HPS issuer time-out.',
+                        e
+                    )
+            HpsIssuerResponseValidation.check_response(
+                transaction_id, response_code, response_text)
 
     def _process_charge_gateway_response(self, response, expected_type, *args):
-        response_code = response['Header']['GatewayRspCode']
-        if response_code == 0:
-            return
-        if response_code == 30:
+        if isinstance(response, HpsPosResponse):
+            response_code = response.header.gateway_rsp_code
+            transaction_id = response.gateway_txn_id
+        elif isinstance(response, HpsRawResponse):
+            response_code = response.gateway_rsp_code
+            transaction_id = response.gateway_txn_id
+        else:
+            response_code = response['Header']['GatewayRspCode']
+            transaction_id = response['Header']['GatewayTxnId']
+
+        # only a charge or an authorization, whose amount is known, is
+        # reversed; anything else raises the gateway's error below
+        if response_code == '30' and args and args[0] is not None:
             try:
-                self.reverse(
-                    response['Header']['GatewayTxnId'],
-                    *args)
+                self.reverse(int(transaction_id), *args)
             except Exception, e:
                 raise HpsGatewayException(
                     HpsExceptionCodes.gateway_timeout_reversal_error,
-                    ('Error occurred while reversing ',
-                     'a charge due to HPS gateway time-out.'),
-                    e)
-        HpsGatewayResponseValidation.check_response(response, expected_type)
+                    'Error occurred while reversing a charge due to HPS gateway time-out.',
+                    None, None, e)
+
+        if isinstance(response, HpsPosResponse):
+            HpsGatewayResponseValidation.check_parsed_response(response, expected_type)
+        elif isinstance(response, HpsRawResponse):
+            HpsGatewayResponseValidation.check_raw_response(response, expected_type)
+        else:
+            HpsGatewayResponseValidation.check_response(response, expected_type)
 
 
 class HpsBatchService(HpsSoapGatewayService):
@@ -1049,7 +1226,7 @@ class HpsBatchService(HpsSoapGatewayService):
         return batch
 
 
-class HpsCheckService(HpsSoapGatewayService):
+class HpsCheckService(HpsBulkMixin, HpsSoapGatewayService):
     def __init__(self, config, enable_logging=False):
         HpsSoapGatewayService.__init__(self, config, enable_logging)
 
@@ -1114,27 +1291,13 @@ class HpsCheckService(HpsSoapGatewayService):
                 HpsExceptionCodes.missing_check_name,
                 'For sec code CCD the check name is required.', 'check_name')
 
-        transaction = Et.Element('CheckSale')
-        block1 = Et.SubElement(transaction, 'Block1')
-        Et.SubElement(block1, 'Amt').text = str(amount)
-        block1.append(_hydrate_check_data(check))
-        Et.SubElement(block1, 'CheckAction').text = action
-        Et.SubElement(block1, 'SECCode').text = str(check.sec_code)
-
-        if check.check_verify is True:
-            verify_element = Et.SubElement(block1, 'VerifyInfo')
-            Et.SubElement(verify_element, 'CheckVerify').text = 'Y' if check.check_verify else 'N'
-
-        if check.check_type is not None:
-            Et.SubElement(block1, 'CheckType').text = str(check.check_type)
-        if check.data_entry_mode is not None:
-            Et.SubElement(block1, 'DataEntryMode').text = str(check.data_entry_mode)
-        if check.check_holder is not None:
-            block1.append(_hydrate_consumer_info(check))
-
+        transaction = serialize('CheckSale', action=action, check=check, amount=amount)
         return self._submit_transaction(transaction, client_transaction_id)
 
     def _submit_transaction(self, transaction, client_transaction_id=None):
+        if self._raw_responses():
+            return self._submit_raw_transaction(transaction, client_transaction_id)
+
         rsp = self.do_transaction(transaction, client_transaction_id)['Ver1.0']
         HpsGatewayResponseValidation.check_response(rsp, transaction.tag)
 
@@ -1150,8 +1313,22 @@ class HpsCheckService(HpsSoapGatewayService):
 
         return response
 
+    def _submit_raw_transaction(self, transaction, client_transaction_id=None):
+        response = self.do_transaction(transaction, client_transaction_id, HpsRawResponse)
+        HpsGatewayResponseValidation.check_raw_response(response, transaction.tag)
+
+        if response.response_code != '0':
+            details = [HpsCheckResponseDetails.from_dict(info.fields()) for info in response.all('CheckRspInfo')]
+            raise HpsCheckException(
+                response.gateway_txn_id,
+                details or None,
+                response.response_code,
+                response.get('RspMessage'))
+
+        return response
+
 
-class HpsGiftCardService(HpsSoapGatewayService):
+class HpsGiftCardService(HpsBulkMixin, HpsSoapGatewayService):
     def __init__(self, config=None, enable_logging=False):
         HpsSoapGatewayService.__init__(self, config, enable_logging)
 
@@ -1246,23 +1423,13 @@ class HpsGiftCardService(HpsSoapGatewayService):
         currency = currency.lower()
         HpsInputValidation.check_amount(amount)
 
-        transaction = Et.Element('GiftCardSale')
-        block1 = Et.SubElement(transaction, 'Block1')
-        Et.SubElement(block1, 'Amt').text = str(amount)
-        block1.append(_hydrate_gift_card_data(gift_card))
-
-        if currency == 'usd' or currency == 'points':
-            currency_element = Et.SubElement(block1, 'Currency')
-            if currency == 'usd':
-                currency_element.text = 'USD'
-            else:
-                currency_element.text = 'POINTS'
-
-        if gratuity is not None:
-            Et.SubElement(block1, 'GratuityAmtInfo').text = str(gratuity)
-
-        if tax is not None:
-            Et.SubElement(block1, 'TaxAmtInfo').text = str(tax)
+        transaction = serialize(
+            'GiftCardSale',
+            amount=amount,
+            gift_card=gift_card,
+            currency=currency,
+            gratuity=gratuity,
+            tax=tax)
 
         return self._submit_transaction(transaction)
 
@@ -1288,6 +1455,13 @@ class HpsGiftCardService(HpsSoapGatewayService):
         return self._submit_transaction(transaction)
 
     def _submit_transaction(self, transaction):
+        if self._raw_responses():
+            response = self.do_transaction(transaction, response_type=HpsRawResponse)
+            HpsGatewayResponseValidation.check_raw_response(response, transaction.tag)
+            HpsIssuerResponseValidation.check_response(
+                response.gateway_txn_id, response.response_code, response.response_text)
+            return response
+
         rsp = self.do_transaction(transaction)['Ver1.0']
         HpsGatewayResponseValidation.check_response(rsp, transaction.tag)
 
@@ -1329,29 +1503,29 @@ class HpsPayPlanService(HpsRestGatewayService):
 
     def add_customer(self, customer):
         response = self.do_request('post', 'customers', customer.get_json_data())
-        return self.hydrate_response(HpsPayPlanCustomer, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanCustomer), response)
 
     def edit_customer(self, customer):
         response = self.do_request('put', 'customers/' + str(customer.customer_key), customer.get_json_data())
-        return self.hydrate_response(HpsPayPlanCustomer, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanCustomer), response)
 
     def find_all_customers(self, search_fields=None):
         if search_fields is None:
             search_fields = {}
 
         response = self.do_request('post', 'searchCustomers', search_fields)
-        return self.hydrate_response(HpsPayPlanCustomerCollection, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanCustomerCollection), response)
 
     def get_customer(self, customer):
         customer_id = customer if not isinstance(customer, HpsPayPlanCustomer) else customer.customer_key
         response = self.do_request('get', 'customers/' + str(customer_id))
-        return self.hydrate_response(HpsPayPlanCustomer, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanCustomer), response)
 
     def delete_customer(self, customer, force_delete=False):
         customer_id = customer if not isinstance(customer, HpsPayPlanCustomer) else customer.customer_key
         response = self.do_request('delete', 'customers/' + str(customer_id), {'forceDelete': force_delete})
         time.sleep(1)
-        return self.hydrate_response(HpsPayPlanCustomer, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanCustomer), response)
 
     """ Payment Methods """
 
@@ -1427,29 +1601,29 @@ class HpsPayPlanService(HpsRestGatewayService):
         data['numberOfPayments'] = schedule.number_of_payments
 
         response = self.do_request('post', 'schedules', data)
-        return self.hydrate_response(HpsPayPlanSchedule, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanSchedule), response)
 
     def edit_schedule(self, schedule):
         response = self.do_request('put', 'schedules/' + str(schedule.schedule_key), schedule.get_json_data())
-        return self.hydrate_response(HpsPayPlanSchedule, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanSchedule), response)
 
     def find_all_schedules(self, search_fields=None):
         if search_fields is None:
             search_fields = {}
 
         response = self.do_request('post', 'searchSchedules', search_fields)
-        return self.hydrate_response(HpsPayPlanScheduleCollection, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanScheduleCollection), response)
 
     def get_schedule(self, schedule):
         schedule_id = schedule if not isinstance(schedule, HpsPayPlanSchedule) else schedule.schedule_key
         response = self.do_request('get', 'schedules/' + str(schedule_id))
-        return self.hydrate_response(HpsPayPlanSchedule, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanSchedule), response)
 
     def delete_schedule(self, schedule, force_delete=False):
         schedule_id = schedule if not isinstance(schedule, HpsPayPlanSchedule) else schedule.schedule_key
         response = self.do_request('delete', 'schedules/' + str(schedule_id), {'forceDelete': force_delete})
         time.sleep(1)
-        return self.hydrate_response(HpsPayPlanSchedule, response)
+        return self.hydrate_response(self._entity_type(HpsPayPlanSchedule), response)
 
 
 class HpsActivationService(HpsRestGatewayService):
@@ -1533,15 +1707,6 @@ def _hydrate_card_manual_entry(card, card_present=False, reader_present=False):
     return manual_entry
 
 
-def _hydrate_token_data(token, card_present=False, reader_present=False):
-    token_data = Et.Element('TokenData')
-    Et.SubElement(token_data, 'TokenValue').text = token
-    Et.SubElement(token_data, 'CardPresent').text = 'Y' if card_present else 'N'
-    Et.SubElement(token_data, 'ReaderPresent').text = 'Y' if reader_present else 'N'
-
-    return token_data
-
-
 def _hydrate_additional_txn_fields(details):
     """Hydrate additional transaction fields."""
 
@@ -1565,86 +1730,6 @@ def _hydrate_additional_txn_fields(details):
         return None
 
 
-def _hydrate_consumer_info(check):
-    consumer_info = Et.Element('ConsumerInfo')
-    if check.check_holder.address is not None:
-        addr1 = Et.SubElement(consumer_info, 'Address1')
-        addr1.text = check.check_holder.address.address
-
-        city = Et.SubElement(consumer_info, 'City')
-        city.text = check.check_holder.address.city
-
-        state = Et.SubElement(consumer_info, 'State')
-        state.text = check.check_holder.address.state
-
-        _zip = Et.SubElement(consumer_info, 'Zip')
-        _zip.text = check.check_holder.address.zip
-
-    if check.check_holder.check_name is not None:
-        check_name = Et.SubElement(consumer_info, 'CheckName')
-        check_name.text = check.check_holder.check_name
-
-    if check.check_holder.courtesy_card is not None:
-        courtesy_card = Et.SubElement(consumer_info, 'CourtesyCard')
-        courtesy_card.text = check.check_holder.courtesy_card
-
-    if check.check_holder.dl_number is not None:
-        dl_number = Et.SubElement(consumer_info, 'DLNumber')
-        dl_number.text = check.check_holder.dl_number
-
-    if check.check_holder.dl_state is not None:
-        dl_state = Et.SubElement(consumer_info, 'DLState')
-        dl_state.text = check.check_holder.dl_state
-
-    if check.check_holder.email is not None:
-        email = Et.SubElement(consumer_info, 'EmailAddress')
-        email.text = check.check_holder.email
-
-    if check.check_holder.first_name is not None:
-        first_name = Et.SubElement(consumer_info, 'FirstName')
-        first_name.text = check.check_holder.first_name
-
-    if check.check_holder.last_name is not None:
-        last_name = Et.SubElement(consumer_info, 'LastName')
-        last_name.text = check.check_holder.last_name
-
-    if check.check_holder.phone is not None:
-        phone_number = Et.SubElement(consumer_info, 'PhoneNumber')
-        phone_number.text = check.check_holder.phone
-
-    if check.check_holder.ssnl4 is not None or check.check_holder.dob_year is not None:
-        identity_element = Et.SubElement(consumer_info, 'IdentityInfo')
-
-        if check.check_holder.ssnl4:
-            Et.SubElement(identity_element, 'SSNL4').text = check.check_holder.ssl4
-
-        if check.check_holder.dob_year:
-            Et.SubElement(identity_element, 'DOBYear').text = check.check_holder.dob_year
-
-    return consumer_info
-
-
-def _hydrate_check_data(check):
-    account_info = Et.Element('AccountInfo')
-    if check.account_number is not None:
-        acc_number = Et.SubElement(account_info, 'AccountNumber')
-        acc_number.text = check.account_number
-    if check.check_number is not None:
-        check_number = Et.SubElement(account_info, 'CheckNumber')
-        check_number.text = check.check_number
-    if check.micr_number is not None:
-        micr_data = Et.SubElement(account_info, 'MICRData')
-        micr_data.text = check.micr_number
-    if check.routing_number is not None:
-        routing_number = Et.SubElement(account_info, 'RoutingNumber')
-        routing_number.text = check.routing_number
-    if check.account_type is not None:
-        acc_type = Et.SubElement(account_info, 'AccountType')
-        acc_type.text = str(check.account_type)
-
-    return account_info
-
-
 def _hydrate_direct_market_data(direct_market_data):
     if direct_market_data is not None and isinstance(direct_market_data, HpsDirectMarketData):
         market_data = Et.Element('DirectMktData')
@@ -1673,31 +1758,103 @@ def _hydrate_cpc_data(cpc_data):
         return None
 
 
-def _hydrate_track_data(track_data):
-    if track_data is not None and isinstance(track_data, HpsTrackData):
-        track_data_element = Et.Element('TrackData')
-        track_data_element.text = track_data.value
-        track_data_element.set('method', track_data.method)
-
-        return track_data_element
-    else:
-        return None
-
-
-def _hydrate_encryption_data(encryption_data):
-    if encryption_data is not None and isinstance(encryption_data, HpsEncryptionData):
-        enc_data_element = Et.Element('EncryptionData')
-        Et.SubElement(enc_data_element, 'Version').text = encryption_data.version
-        if encryption_data.encrypted_track_number is not None:
-            Et.SubElement(enc_data_element, 'EncryptedTrackNumber').text = str(encryption_data.encrypted_track_number)
-        if encryption_data.ktb is not None:
-            Et.SubElement(enc_data_element, 'KTB').text = encryption_data.ktb
-        if encryption_data.ksn is not None:
-            Et.SubElement(enc_data_element, 'KSN').text = encryption_data.ksn
-
-        return enc_data_element
-    else:
-        return None
+def _configured_entity_type(config, entity_type):
+    """The type `config` has responses hydrated into in place of
+    `entity_type`. Lazy entities take precedence over compact ones."""
+    if getattr(config, 'lazy_entities', False):
+        configured = lazy_type(entity_type)
+        if configured is not entity_type:
+            return configured
+    if getattr(config, 'compact_entities', False):
+        return compact_type(entity_type)
+    return entity_type
+
+
+# transactions whose responses are hydrated in a single pass, see parser.py
+_response_types = {
+    'CreditSale': HpsCharge,
+    'CreditAccountVerify': HpsAccountVerify,
+    'CreditAuth': HpsAuthorization,
+    'CreditReturn': HpsRefund,
+    'CreditReversal': HpsReversal,
+    'CreditVoid': HpsVoid,
+}
+
+# each config's envelope, with the header fields it was rendered for; an
+# entry goes with its config
+_envelopes = weakref.WeakKeyDictionary()
+_envelopes_lock = threading.Lock()
+
+
+def _envelope_fragments(config, header_fields):
+    """The serialized envelope for `header_fields`, those of `config`,
+    split into the part before the ClientTxnId, the part between it and
+    the transaction, and the part after the transaction. Rendered once
+    per config, and again when its header changes, always with the
+    standard library: lxml rejects the prefixed tags."""
+    with _envelopes_lock:
+        cached = _envelopes.get(config)
+    if cached is not None and cached[0] == header_fields:
+        return cached[1]
+
+    envelope = _stdlib_etree.Element("soap:Envelope")
+    envelope.set("xmlns:soap", "http://schemas.xmlsoap.org/soap/envelope/")
+    envelope.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+    envelope.set("xmlns:xsd", "http://www.w3.org/2001/XMLSchema")
+    body = _stdlib_etree.SubElement(envelope, "soap:Body")
+
+    request = _stdlib_etree.SubElement(body, "PosRequest")
+    request.set("xmlns", "http://Hps.Exchange.PosGateway")
+    version1 = _stdlib_etree.SubElement(request, "Ver1.0")
+
+    header = _stdlib_etree.SubElement(version1, "Header")
+    for tag, text in header_fields:
+        _stdlib_etree.SubElement(header, tag).text = text
+    _stdlib_etree.SubElement(header, "_client_txn_id_")
+    _stdlib_etree.SubElement(_stdlib_etree.SubElement(version1, "Transaction"), "_transaction_")
+
+    start, rest = _stdlib_etree.tostring(envelope).split('<_client_txn_id_ />')
+    middle, end = rest.split('<_transaction_ />')
+    fragments = (start, middle, end)
+
+    with _envelopes_lock:
+        _envelopes[config] = (header_fields, fragments)
+    return fragments
+
+
+@contextmanager
+def _deadline_scope(service, deadline):
+    # kept per thread: threads sharing a service have deadlines of their own
+    state = service._deadlines
+    previous = getattr(state, 'deadline', None)
+    state.deadline = deadline.earliest(previous) if deadline is not None else previous
+    try:
+        yield state.deadline
+    finally:
+        state.deadline = previous
+
+
+def _request_options(config, deadline, retry_policy=None):
+    options = {}
+    timeout = request_timeout(config, deadline)
+    if timeout is not None:
+        options['timeout'] = timeout
+    if deadline is not None or retry_policy is not None:
+        # retries are ours to make: urllib3's could run past the deadline
+        options['retries'] = False
+    return options
+
+
+def _check_deadline(deadline):
+    if deadline is not None and deadline.expired():
+        raise _deadline_exceeded()
+
+
+def _deadline_exceeded(inner_exception=None):
+    return HpsGatewayException(
+        HpsExceptionCodes.deadline_exceeded,
+        'The deadline for the request expired.',
+        None, None, inner_exception)
 
 
 def _get_client_txn_id(details=None):
@@ -1705,3 +1862,11 @@ def _get_client_txn_id(details=None):
     if details is not None:
         client_txn_id = details.client_transaction_id
     return client_txn_id
+
+
+def _gateway_txn_id(card_data):
+    """The transaction a refund or reversal refers to, when it is given
+    by id rather than by card or token."""
+    if isinstance(card_data, (int, long)):
+        return card_data
+    return None
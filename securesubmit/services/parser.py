@@ -0,0 +1,267 @@
+"""
+    parser.py
+
+    A single-pass parser for Portico responses. It reads the envelope with
+    the XML backend's event parser and sets the header and the fields of
+    the expected entity as the elements close, without building a dict of
+    the document first. Reports are read a row at a time, as their
+    chunks arrive.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+from collections import deque
+
+from securesubmit.entities import HpsTokenData, HpsTransaction, HpsTransactionHeader
+from securesubmit.entities.credit import (
+    HpsAuthorization,
+    HpsRefund,
+    HpsReversal,
+    HpsVoid)
+from securesubmit.infrastructure import HpsException
+from securesubmit.services import xmlbackend
+
+
+class _ResponseMap(object):
+    """How a response is hydrated into an entity type: the transaction
+    element's children mapped to attributes, taken from the entity's
+    field map, whether the header token data is kept, and values set
+    regardless of the response."""
+
+    fields = None
+    token_data = False
+    fixed = None
+
+    def __init__(self, entity_type, token_data=False, fixed=None):
+        self.fields = entity_type._field_map.attributes()
+        self.token_data = token_data
+        self.fixed = fixed or {}
+
+
+RESPONSE_MAPS = {
+    HpsTransaction: _ResponseMap(HpsTransaction),
+    HpsAuthorization: _ResponseMap(HpsAuthorization, token_data=True),
+    HpsReversal: _ResponseMap(HpsReversal),
+    HpsRefund: _ResponseMap(HpsRefund, fixed={'response_code': '00', 'response_text': ''}),
+    HpsVoid: _ResponseMap(HpsVoid, fixed={'response_code': '00', 'response_text': ''}),
+}
+
+_HEADER_FIELDS = {
+    'GatewayRspCode': 'gateway_rsp_code',
+    'GatewayRspMsg': 'gateway_rsp_msg',
+    'RspDT': 'rsp_dt',
+    'ClientTxnId': 'client_txn_id',
+}
+
+_TOKEN_FIELDS = {
+    'TokenRspCode': 'token_rsp_code',
+    'TokenRspMsg': 'token_rsp_msg',
+    'TokenValue': 'token_value',
+}
+
+_ENVELOPE_PATH = ['Envelope', 'Body', 'PosResponse', 'Ver1.0']
+
+REPORT_FEED_SIZE = 16 * 1024
+
+
+def response_map(entity_type):
+    for cls in entity_type.__mro__:
+        if cls in RESPONSE_MAPS:
+            return RESPONSE_MAPS[cls]
+    raise HpsException('No response map for {0}.'.format(entity_type.__name__))
+
+
+class HpsPosResponse(object):
+    """The parts of a PosResponse the services look at, and the entity
+    hydrated from it. `transaction_type` is the name of the element under
+    Transaction, or None when the response has no Transaction."""
+
+    header = None
+    gateway_txn_id = None
+    token_data = None
+    transaction_type = None
+    response_code = None
+    response_text = None
+    entity = None
+
+
+class _ResponseTarget(object):
+    """The parser target filling in an HpsPosResponse."""
+
+    def __init__(self, fields, entity):
+        self.fields = fields
+        self.response = HpsPosResponse()
+        self.response.header = HpsTransactionHeader()
+        self.response.entity = entity
+        self.valid = False
+        self.path = []
+        self.text = []
+        self.data = self.text.append
+
+    def start(self, tag, attributes):
+        path = self.path
+        path.append(tag[tag.rfind('}') + 1:])
+        del self.text[:]
+
+        depth = len(path)
+        if depth == 4:
+            self.valid = path == _ENVELOPE_PATH
+        elif depth == 6 and path[4] == 'Transaction':
+            self.response.transaction_type = path[5]
+        elif depth == 6 and path[4] == 'Header' and path[5] == 'TokenData':
+            self.response.token_data = HpsTokenData()
+
+    def end(self, tag):
+        path = self.path
+        depth = len(path)
+        tag = path.pop()
+        if depth < 6 or not self.valid:
+            return
+
+        value = ''.join(self.text).strip() or None
+        del self.text[:]
+
+        response = self.response
+        section = path[4]
+        if section == 'Transaction':
+            if depth == 7:
+                if tag in self.fields:
+                    setattr(response.entity, self.fields[tag], value)
+                if tag == 'RspCode':
+                    response.response_code = value
+                elif tag == 'RspText':
+                    response.response_text = value
+        elif section == 'Header':
+            if depth == 6:
+                if tag in _HEADER_FIELDS:
+                    setattr(response.header, _HEADER_FIELDS[tag], value)
+                elif tag == 'GatewayTxnId':
+                    response.gateway_txn_id = value
+            elif depth == 7 and path[5] == 'TokenData' and tag in _TOKEN_FIELDS:
+                setattr(response.token_data, _TOKEN_FIELDS[tag], value)
+
+    def close(self):
+        if not self.valid:
+            raise HpsException('Unexpected response')
+        return self.response
+
+
+def parse_response(raw_response, entity_type, backend=None):
+    """Parse `raw_response` into an HpsPosResponse whose entity is an
+    instance of `entity_type`, hydrated like `entity_type.from_dict`.
+    `backend` defaults to the SDK's XML backend."""
+    mapping = response_map(entity_type)
+    entity = entity_type()
+
+    backend = backend or xmlbackend.backend
+    response = backend.feed(raw_response, _ResponseTarget(mapping.fields, entity))
+    header = response.header
+
+    entity._header = header
+    if response.gateway_txn_id is not None:
+        entity.transaction_id = int(response.gateway_txn_id)
+    entity.client_transaction_id = header.client_txn_id
+    if response.transaction_type is None:
+        entity.response_code = header.gateway_rsp_code
+        entity.response_text = header.gateway_rsp_msg
+    if mapping.token_data and response.token_data is not None:
+        entity.token_data = response.token_data
+    for attribute, value in mapping.fixed.items():
+        setattr(entity, attribute, value)
+
+    return response
+
+
+class _ReportTarget(object):
+    """The parser target reading a report: the header and the report's
+    own fields into the dicts from_dict reads, and each of its Details
+    into a dict queued on `rows` when the element closes."""
+
+    def __init__(self):
+        self.header = {}
+        self.transaction_type = None
+        self.fields = {}
+        self.rows = deque()
+        self.row = None
+        self.valid = False
+        self.path = []
+        self.text = []
+        self.data = self.text.append
+
+    def response(self):
+        rsp = {'Header': self.header}
+        if self.transaction_type is not None:
+            rsp['Transaction'] = {self.transaction_type: self.fields}
+        return rsp
+
+    def start(self, tag, attributes):
+        path = self.path
+        path.append(tag[tag.rfind('}') + 1:])
+        del self.text[:]
+
+        depth = len(path)
+        if depth == 4:
+            self.valid = path == _ENVELOPE_PATH
+        elif depth == 6 and path[4] == 'Transaction':
+            self.transaction_type = path[5]
+        elif depth == 7 and path[4] == 'Transaction' and path[6] == 'Details':
+            self.row = {}
+
+    def end(self, tag):
+        path = self.path
+        depth = len(path)
+        tag = path.pop()
+        if depth < 6 or not self.valid:
+            return
+
+        value = ''.join(self.text).strip() or None
+        del self.text[:]
+
+        section = path[4]
+        if section == 'Transaction':
+            if depth == 7:
+                if tag == 'Details':
+                    self.rows.append(self.row)
+                    self.row = None
+                else:
+                    self.fields[tag] = value
+            elif depth == 8 and path[6] == 'Details':
+                self.row[tag] = value
+        elif section == 'Header' and depth == 6:
+            self.header[tag] = value
+
+    def close(self):
+        if not self.valid:
+            raise HpsException('Unexpected response')
+
+
+def iter_report_rows(raw_response, backend=None):
+    """Parse a report response, a string or an iterable of its chunks,
+    and yield first the response as a dict with its Header and the
+    report's fields but no Details, then the dict of each Details row.
+    Rows are yielded as the chunk holding them is parsed, and chunks are
+    parsed REPORT_FEED_SIZE bytes at a time, so only the rows of that
+    many bytes are held at once. `backend` defaults to the SDK's XML
+    backend."""
+    target = _ReportTarget()
+    parser = (backend or xmlbackend.backend).feeder(target)
+    if isinstance(raw_response, basestring):
+        raw_response = (raw_response,)
+
+    started = False
+    for chunk in raw_response:
+        # a compressed chunk can inflate to thousands of rows
+        for i in xrange(0, len(chunk), REPORT_FEED_SIZE):
+            parser.feed(chunk[i:i + REPORT_FEED_SIZE] if len(chunk) > REPORT_FEED_SIZE else chunk)
+            if target.rows:
+                if not started:
+                    started = True
+                    yield target.response()
+                while target.rows:
+                    yield target.rows.popleft()
+    parser.close()
+
+    if not started:
+        yield target.response()
+    while target.rows:
+        yield target.rows.popleft()
@@ -0,0 +1,265 @@
+"""
+    processes.py
+
+    A multi-process engine for bulk jobs. Building requests, parsing
+    responses and hydrating entities hold the GIL, so a single process
+    tops out well below what the gateway can take; the engine spreads a
+    job over worker processes instead. Requests are sharded by merchant:
+    each merchant's requests go to one worker, which keeps a service and
+    a connection pool of its own for it and runs them with submit_many.
+    Results stream back as they complete.
+
+    Workers are forked, so merchant configs and service types are handed
+    to them without being pickled; requests and results are.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import multiprocessing
+import pickle
+import Queue
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from securesubmit.infrastructure import HpsArgumentException, HpsException
+from securesubmit.services import transport
+from securesubmit.services.bulk import _request
+from securesubmit.services.gateway import HpsCreditService
+
+DEFAULT_THREADS = 4
+DEFAULT_CHUNK_SIZE = 64
+
+
+class HpsProcessResult(object):
+    """The outcome of one request run by the engine: the `index` of the
+    request in the job, its `merchant`, and the `value` it returned or
+    the `exception` it raised. Exceptions travel as their class and
+    attributes, since the SDK's exceptions can't be rebuilt from their
+    arguments."""
+
+    __slots__ = ('index', 'merchant', 'value', '_exception')
+
+    def __init__(self, index, merchant, value=None, exception=None):
+        self.index = index
+        self.merchant = merchant
+        self.value = value
+        self._exception = _portable_exception(exception) if exception is not None else None
+
+    def __reduce__(self):
+        return _rebuild_result, (self.index, self.merchant, self.value, self._exception)
+
+    @property
+    def exception(self):
+        if self._exception is None:
+            return None
+        exception_type, state = self._exception
+        exception = exception_type.__new__(exception_type)
+        # message is a descriptor of BaseException, not in __dict__
+        for name, value in state.items():
+            setattr(exception, name, value)
+        return exception
+
+    @property
+    def succeeded(self):
+        return self._exception is None
+
+    def get(self):
+        """The value, or raise the exception."""
+        if self._exception is not None:
+            raise self.exception
+        return self.value
+
+
+def _rebuild_result(index, merchant, value, exception):
+    result = HpsProcessResult(index, merchant, value)
+    result._exception = exception
+    return result
+
+
+def _portable_exception(exception):
+    state = dict(getattr(exception, '__dict__', {}))
+    state.setdefault('message', getattr(exception, 'message', str(exception)))
+    # like message, args is a descriptor; str(exception) is made of it
+    state['args'] = tuple(arg if _picklable(arg) else repr(arg) for arg in exception.args)
+    try:
+        pickle.dumps(state, 2)
+    except Exception:
+        # typically an inner exception holding a socket or a lock
+        state = dict((key, value if _picklable(value) else repr(value)) for key, value in state.items())
+    return type(exception), state
+
+
+def _picklable(value):
+    try:
+        pickle.dumps(value, 2)
+    except Exception:
+        return False
+    return True
+
+
+class HpsProcessEngine(object):
+    """Runs requests for many merchants on worker processes.
+
+    `merchants` maps a merchant id to the config of its services, or is
+    a single config for one merchant, whose id is None. A request is a
+    `(merchant, method, args)` or `(merchant, method, args, kwargs)`
+    tuple, the method being one of `service_type`'s. Each of the
+    `processes` workers, by default one per core, runs up to `threads`
+    requests at a time.
+
+    The workers start with the first job and are kept for the next until
+    close(); the engine is a context manager closing them on exit."""
+
+    _service_type = None
+    _merchants = None
+    _processes = None
+    _threads = None
+    _chunk_size = None
+    _workers = None
+    _results = None
+
+    def __init__(self, merchants, service_type=HpsCreditService, processes=None, threads=DEFAULT_THREADS,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        if not isinstance(merchants, dict):
+            merchants = {None: merchants}
+        self._merchants = merchants
+        self._service_type = service_type
+        self._processes = processes or multiprocessing.cpu_count()
+        self._threads = threads
+        self._chunk_size = chunk_size
+
+    @property
+    def processes(self):
+        return self._processes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    def run(self, requests):
+        """Run `requests` and yield their HpsProcessResults in the order
+        they complete. `sorted(results, key=lambda r: r.index)` restores
+        the order of the requests. Leaving the results unread, by closing
+        the generator or dropping it, stops the workers, so that the next
+        job doesn't get this one's results."""
+        shards = self._shard(requests)
+        self._start()
+
+        remaining = 0
+        for worker, chunks in enumerate(shards):
+            for merchant, chunk in chunks:
+                self._workers[worker][1].put((merchant, chunk))
+                remaining += len(chunk)
+
+        try:
+            while remaining:
+                result = self._next_result()
+                remaining -= 1
+                yield result
+        finally:
+            if remaining and self._workers is not None:
+                self._terminate()
+
+    def close(self):
+        if self._workers is None:
+            return
+        for process, requests in self._workers:
+            requests.put(None)
+        for process, requests in self._workers:
+            process.join()
+        self._workers = None
+        self._results = None
+
+    def _shard(self, requests):
+        """Split `requests` into chunks of one merchant's requests per
+        worker. A merchant goes to the worker with the fewest requests
+        when it is first seen, and stays there."""
+        loads = [0] * self._processes
+        assignments = {}
+        shards = [OrderedDict() for _ in xrange(self._processes)]
+
+        for index, request in enumerate(requests):
+            if not isinstance(request, tuple) or len(request) < 3:
+                raise HpsArgumentException(
+                    'A request must be a (merchant, method, args) or (merchant, method, args, kwargs) tuple.')
+            merchant = request[0]
+            if merchant not in self._merchants:
+                raise HpsArgumentException('Unknown merchant {0!r}.'.format(merchant))
+            name, args, kwargs = _request(self._service_type, request[1:])
+
+            worker = assignments.get(merchant)
+            if worker is None:
+                worker = assignments[merchant] = loads.index(min(loads))
+            loads[worker] += 1
+            shards[worker].setdefault(merchant, []).append((index, name, args, kwargs))
+
+        return [[(merchant, chunk[i:i + self._chunk_size])
+                 for merchant, chunk in shard.items()
+                 for i in xrange(0, len(chunk), self._chunk_size)]
+                for shard in shards]
+
+    def _start(self):
+        if self._workers is not None:
+            return
+        self._results = multiprocessing.Queue()
+        self._workers = []
+        for _ in xrange(self._processes):
+            requests = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_work,
+                args=(requests, self._results, self._service_type, self._merchants, self._threads))
+            process.daemon = True
+            process.start()
+            self._workers.append((process, requests))
+
+    def _next_result(self):
+        while True:
+            try:
+                return pickle.loads(self._results.get(timeout=1))
+            except Queue.Empty:
+                for process, requests in self._workers:
+                    if not process.is_alive():
+                        # its requests are lost; the others' results
+                        # would come out of order with the next job's
+                        self._terminate()
+                        raise HpsException('A worker process exited with code {0}.'.format(process.exitcode))
+
+    def _terminate(self):
+        for process, requests in self._workers:
+            process.terminate()
+            process.join()
+        self._workers = None
+        self._results = None
+
+
+def _pickled_result(index, merchant, result):
+    """The HpsProcessResult of `result`, pickled here rather than in the
+    queue's feeder thread, which would drop a result it can't pickle and
+    leave the engine waiting for it."""
+    try:
+        return pickle.dumps(HpsProcessResult(index, merchant, result.value, result.exception), 2)
+    except Exception, e:
+        return pickle.dumps(HpsProcessResult(index, merchant, exception=HpsException(
+            'The result of {0} could not be sent back: {1!r}'.format(result.request[0], result.value), e)), 2)
+
+
+def _work(requests, results, service_type, merchants, threads):
+    transport.reset_transport()
+    pool = ThreadPool(threads)
+    services = {}
+
+    for merchant, chunk in iter(requests.get, None):
+        service = services.get(merchant)
+        if service is None:
+            service = services[merchant] = service_type(merchants[merchant])
+
+        def emit(completed, total, result, merchant=merchant, chunk=chunk):
+            results.put(_pickled_result(chunk[result.index][0], merchant, result))
+
+        service.submit_many([request[1:] for request in chunk], concurrency=threads, progress=emit, pool=pool)
+
+    pool.close()
+    results.close()
+    results.join_thread()
@@ -0,0 +1,175 @@
+"""
+    raw.py
+
+    Read-only views over Portico responses, returned by the services in
+    raw mode in place of entities. A response is parsed into the XML
+    backend's element tree and nothing else; the header codes are read
+    when the view is made and any other field when it is asked for.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+from securesubmit.infrastructure import HpsException
+from securesubmit.services import xmlbackend
+
+_ENVELOPE_PATH = ('Envelope', 'Body', 'PosResponse', 'Ver1.0')
+
+
+def _local_name(tag):
+    # lxml gives comments and processing instructions a function as tag
+    if not isinstance(tag, basestring):
+        return None
+    return tag[tag.rfind('}') + 1:]
+
+
+def _child(element, name):
+    for child in element:
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _text(element):
+    return (element.text or '').strip() or None
+
+
+class HpsRawElement(object):
+    """A read-only view of an element. Fields are named by paths of local
+    names separated by '/', such as 'Data/RspCode'; the value of a field
+    is its stripped text, or None when it is empty."""
+
+    __slots__ = ('_element',)
+
+    def __init__(self, element):
+        self._element = element
+
+    @property
+    def tag(self):
+        """The local name of the element, or None for the view of a
+        missing element."""
+        return _local_name(self._element.tag) if self._element is not None else None
+
+    def _find(self, path):
+        element = self._element
+        for name in path.split('/'):
+            if element is None:
+                break
+            element = _child(element, name)
+        return element
+
+    def get(self, path, default=None):
+        element = self._find(path)
+        if element is None:
+            return default
+        return _text(element)
+
+    def __getitem__(self, path):
+        element = self._find(path)
+        if element is None:
+            raise KeyError(path)
+        return _text(element)
+
+    def __contains__(self, path):
+        return self._find(path) is not None
+
+    def element(self, path):
+        """The view of the element at `path`, or None."""
+        element = self._find(path)
+        return HpsRawElement(element) if element is not None else None
+
+    def all(self, path):
+        """The views of every element at `path`, for repeated elements
+        such as the Details of a report."""
+        parent, _, name = path.rpartition('/')
+        parent = self._find(parent) if parent else self._element
+        if parent is None:
+            return []
+        return [HpsRawElement(child) for child in parent if _local_name(child.tag) == name]
+
+    def fields(self):
+        """The children of the element without children of their own, by
+        local name."""
+        if self._element is None:
+            return {}
+        return dict((_local_name(child.tag), _text(child)) for child in self._element
+                    if _local_name(child.tag) is not None and len(child) == 0)
+
+
+class HpsRawResponse(HpsRawElement):
+    """The view of a PosResponse. As an HpsRawElement it reads the fields
+    of the element under Transaction, the same ones an entity's from_dict
+    reads; `header` views the Header. `transaction_type` is the name of
+    the element under Transaction, or None when there is none."""
+
+    __slots__ = ('_raw', '_header', '_transaction_type', '_gateway_txn_id', '_gateway_rsp_code',
+                 '_gateway_rsp_msg')
+
+    def __init__(self, raw_response, root):
+        version = root if _local_name(root.tag) == _ENVELOPE_PATH[0] else None
+        for name in _ENVELOPE_PATH[1:]:
+            if version is None:
+                break
+            version = _child(version, name)
+        if version is None:
+            raise HpsException('Unexpected response')
+
+        header = _child(version, 'Header')
+        transaction = _child(version, 'Transaction')
+        item = transaction[0] if transaction is not None and len(transaction) else None
+        HpsRawElement.__init__(self, item)
+
+        self._raw = raw_response
+        self._header = HpsRawElement(header)
+        self._transaction_type = _local_name(item.tag) if item is not None else None
+        self._gateway_txn_id = self._header.get('GatewayTxnId')
+        self._gateway_rsp_code = self._header.get('GatewayRspCode')
+        self._gateway_rsp_msg = self._header.get('GatewayRspMsg')
+
+    def __reduce__(self):
+        # element trees don't pickle; the response they were parsed from
+        # does
+        return parse_raw_response, (self._raw,)
+
+    @property
+    def raw(self):
+        """The response as it was received."""
+        return self._raw
+
+    @property
+    def header(self):
+        return self._header
+
+    @property
+    def transaction_type(self):
+        return self._transaction_type
+
+    @property
+    def gateway_txn_id(self):
+        return self._gateway_txn_id
+
+    @property
+    def gateway_rsp_code(self):
+        return self._gateway_rsp_code
+
+    @property
+    def gateway_rsp_msg(self):
+        return self._gateway_rsp_msg
+
+    @property
+    def client_txn_id(self):
+        return self._header.get('ClientTxnId')
+
+    @property
+    def response_code(self):
+        return self.get('RspCode')
+
+    @property
+    def response_text(self):
+        return self.get('RspText')
+
+
+def parse_raw_response(raw_response, backend=None):
+    """View `raw_response` as an HpsRawResponse. `backend` defaults to
+    the SDK's XML backend."""
+    backend = backend or xmlbackend.backend
+    return HpsRawResponse(raw_response, backend.tree(raw_response))
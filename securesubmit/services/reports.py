@@ -0,0 +1,169 @@
+"""
+    reports.py
+
+    Fetching the activity of a long range as a set of shorter windows,
+    requested in parallel. The gateway answers a large ReportActivity
+    slowly, when at all; split into windows, a range takes about as long
+    as its slowest window. The windows' rows are merged in time order,
+    with the rows reported by two adjacent windows kept once, and a
+    window that failed can be fetched again without the others.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import datetime
+import functools
+
+from securesubmit.entities.credit import HpsReportTransactionSummary
+from securesubmit.infrastructure import HpsArgumentException
+from securesubmit.services.bulk import _check_concurrency, _concurrency, _dispatch
+
+DEFAULT_WINDOW = datetime.timedelta(days=1)
+
+
+class HpsReportWindow(object):
+    """One window of a report, from `utc_start` to `utc_end`, and the
+    `exception` its last fetch raised, if any."""
+
+    utc_start = None
+    utc_end = None
+    exception = None
+    _rows = None
+
+    def __init__(self, utc_start, utc_end):
+        self.utc_start = utc_start
+        self.utc_end = utc_end
+
+    @property
+    def fetched(self):
+        return self._rows is not None
+
+    def __repr__(self):
+        return 'HpsReportWindow({0!r}, {1!r})'.format(self.utc_start, self.utc_end)
+
+
+class HpsActivityReport(object):
+    """The activity of a range, as the windows it was split into."""
+
+    filter_by = None
+    windows = None
+
+    def __init__(self, windows, filter_by=None):
+        self.windows = windows
+        self.filter_by = filter_by
+
+    @property
+    def complete(self):
+        return all(window.fetched for window in self.windows)
+
+    @property
+    def failures(self):
+        """The windows whose last fetch failed."""
+        return [window for window in self.windows if not window.fetched]
+
+    def summaries(self):
+        """The HpsReportTransactionSummaries of every window, in the order
+        of their transaction dates, each transaction once. Raises the
+        exception of the first window that failed, if any did."""
+        for window in self.windows:
+            if not window.fetched:
+                raise window.exception
+
+        seen = set()
+        summaries = []
+        for window in self.windows:
+            for gateway_txn_id, summary in window._rows:
+                if gateway_txn_id is None:
+                    summaries.append(summary)
+                elif gateway_txn_id not in seen:
+                    seen.add(gateway_txn_id)
+                    summaries.append(summary)
+        # the windows are in order and mostly sorted already
+        summaries.sort(key=_utc_date_key)
+        return summaries
+
+
+class HpsReportFetcher(object):
+    """Fetches activity reports through `service`, an HpsCreditService,
+    in windows of `window`, a timedelta. At most `concurrency` windows
+    are in flight, by default the config's bulk_concurrency; `pool`
+    defaults to the pool the async services share.
+
+        report = fetcher.fetch(utc_start, utc_end)
+        while not report.complete:
+            fetcher.resume(report)
+        summaries = report.summaries()
+    """
+
+    _service = None
+    _window = None
+    _concurrency = None
+    _pool = None
+
+    def __init__(self, service, window=DEFAULT_WINDOW, concurrency=None, pool=None):
+        if window <= datetime.timedelta(0):
+            raise HpsArgumentException('The window must be longer than zero.')
+        if concurrency is None:
+            concurrency = _concurrency(getattr(service, '_config', None))
+        _check_concurrency(concurrency)
+        self._service = service
+        self._window = window
+        self._concurrency = concurrency
+        self._pool = pool
+
+    def fetch(self, utc_start, utc_end=None, filter_by=None):
+        """Fetch the activity from `utc_start` to `utc_end`, by default
+        now, and return it as an HpsActivityReport. A window that fails
+        doesn't stop the others; see resume."""
+        if utc_start is None:
+            raise HpsArgumentException('A windowed report needs a start date.')
+        if utc_end is None:
+            utc_end = datetime.datetime.utcnow()
+        if utc_end < utc_start:
+            raise HpsArgumentException('The end date must not be before the start date.')
+
+        windows = []
+        start = utc_start
+        while True:
+            end = min(start + self._window, utc_end)
+            windows.append(HpsReportWindow(start, end))
+            if end >= utc_end:
+                break
+            start = end
+
+        report = HpsActivityReport(windows, filter_by)
+        self._fetch(report, windows)
+        return report
+
+    def resume(self, report):
+        """Fetch the windows of `report` that failed again, and return
+        it."""
+        self._fetch(report, report.failures)
+        return report
+
+    def _fetch(self, report, windows):
+        calls = [functools.partial(_fetch_window, window=window, filter_by=report.filter_by) for window in windows]
+        for index, rows, exception in _dispatch(self._service, calls, self._concurrency, self._pool):
+            windows[index]._rows = rows
+            windows[index].exception = exception
+
+
+def _fetch_window(service, window, filter_by):
+    """The summaries of `window`, each with the GatewayTxnId of its
+    row."""
+    rsp, rows = service._report(window.utc_start, window.utc_end)
+    entity_type = service._entity_type(HpsReportTransactionSummary)
+    current = []
+
+    def tracked():
+        # from_rows yields a row's summary before reading the next
+        for row in rows:
+            current[:] = [row.get('GatewayTxnId')]
+            yield row
+
+    return [(current[0], summary) for summary in entity_type.from_rows(rsp, tracked(), filter_by)]
+
+
+def _utc_date_key(summary):
+    date = summary.transaction_utc_date
+    return date is None, date
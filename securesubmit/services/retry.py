@@ -0,0 +1,119 @@
+"""
+    retry.py
+
+    Retry policy for gateway transactions and the ClientTxnId generator it
+    relies on to make retries safe.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import os
+import random
+import socket
+import threading
+import time
+import zlib
+
+
+class HpsClientTxnIdGenerator(object):
+    """Generates unique, roughly time-ordered ClientTxnIds without a round
+    trip. Ids are 63-bit longs made of a millisecond timestamp (41 bits), a
+    node id (16 bits) and a per-millisecond sequence (6 bits), so one
+    process can hand out 64 ids a millisecond. The node id defaults to a
+    hash of the host name and process id; the hash makes collisions
+    between processes unlikely, not impossible, so deployments running
+    many processes should give each a `node_id` of its own. A generator
+    using the default picks up the new process id after a fork, so that
+    parent and child don't hand out the same ids."""
+
+    EPOCH = 1420070400000  # 2015-01-01T00:00:00Z in milliseconds
+    NODE_BITS = 16
+    SEQUENCE_BITS = 6
+
+    _node_id = None
+    _pid = None
+    _last_timestamp = -1
+    _sequence = 0
+    _lock = None
+
+    def __init__(self, node_id=None):
+        if node_id is None:
+            self._pid = os.getpid()
+            node_id = _process_node_id(self._pid)
+        self._node_id = node_id & ((1 << self.NODE_BITS) - 1)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        if self._pid is not None and self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._node_id = _process_node_id(self._pid) & ((1 << self.NODE_BITS) - 1)
+            self._lock = threading.Lock()
+
+        with self._lock:
+            timestamp = self._now()
+            if timestamp < self._last_timestamp:
+                # the clock went backwards, keep counting from the last tick
+                timestamp = self._last_timestamp
+
+            if timestamp == self._last_timestamp:
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    while timestamp <= self._last_timestamp:
+                        timestamp = self._now()
+            else:
+                self._sequence = 0
+
+            self._last_timestamp = timestamp
+            return (((timestamp - self.EPOCH) << (self.NODE_BITS + self.SEQUENCE_BITS)) |
+                    (self._node_id << self.SEQUENCE_BITS) | self._sequence)
+
+    @staticmethod
+    def _now():
+        return int(time.time() * 1000)
+
+
+def _process_node_id(pid):
+    # the process id alone repeats across hosts
+    return zlib.crc32('{0}:{1}'.format(socket.gethostname(), pid)) & 0xFFFFFFFF
+
+
+_default_generator = HpsClientTxnIdGenerator()
+
+
+def next_client_txn_id():
+    return _default_generator.next_id()
+
+
+class HpsRetryPolicy(object):
+    """How gateway transactions are retried after a network failure.
+
+    Failures that happen before the request is written (a refused or timed
+    out connect) are always retried. When the request may already have
+    reached Portico, a retry is only attempted for transactions carrying a
+    ClientTxnId, and only after looking the id up shows no earlier gateway
+    record. With `generate_client_txn_id` every transaction sent without
+    one is given an id from the generator so it qualifies.
+
+    Waits between attempts use exponential backoff with full jitter:
+    a random delay between 0 and min(max_backoff, backoff * 2 ** attempt)."""
+
+    max_attempts = 3
+    backoff = 0.05
+    max_backoff = 1.0
+    jitter = True
+    generate_client_txn_id = True
+
+    def __init__(self, max_attempts=3, backoff=0.05, max_backoff=1.0,
+                 jitter=True, generate_client_txn_id=True):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.generate_client_txn_id = generate_client_txn_id
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number `attempt` (starting at 1)."""
+        ceiling = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            return random.uniform(0, ceiling)
+        return ceiling
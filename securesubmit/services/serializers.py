@@ -0,0 +1,491 @@
+"""
+    serializers.py
+
+    Request serializers compiled from a schema of the transaction element,
+    for the transactions sent often enough for ElementTree to show up in
+    profiles. The output is byte for byte what ElementTree would produce
+    for the same tree.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import threading
+import xml.etree.cElementTree as Et
+
+from securesubmit.entities import HpsTransactionDetails, HpsDirectMarketData
+from securesubmit.entities.credit import HpsCreditCard, HpsTrackData
+from securesubmit.infrastructure import HpsGatewayException
+from securesubmit.infrastructure.enums import HpsExceptionCodes
+
+
+class Element(object):
+    """One element of a request schema.
+
+    Keyword options:
+      text -- a string, or a function of the context returning the text
+              (None leaves the element empty)
+      attributes -- a dict of attribute names to strings or functions
+      when -- a predicate on the parent's context; the element is left
+              out when it returns False
+      source -- a function mapping the parent's context to the context of
+                this element and its children; the element is left out
+                when it returns None
+
+    The context at the top of the schema is the dict of arguments given
+    to `serialize`."""
+
+    tag = None
+    children = None
+    text = None
+    attributes = None
+    when = None
+    source = None
+
+    def __init__(self, tag, *children, **options):
+        self.tag = tag
+        self.children = children
+        self.text = options.get('text')
+        self.attributes = sorted((options.get('attributes') or {}).items())
+        self.when = options.get('when')
+        self.source = options.get('source')
+
+    @property
+    def optional(self):
+        return self.when is not None or self.source is not None
+
+    def to_element(self, context):
+        """Build the ElementTree element the schema describes, or None when
+        the element is left out."""
+        if self.when is not None and not self.when(context):
+            return None
+        if self.source is not None:
+            context = self.source(context)
+            if context is None:
+                return None
+
+        element = Et.Element(self.tag)
+        for name, value in self.attributes:
+            element.set(name, _value(value, context))
+        element.text = _value(self.text, context)
+        for child in self.children:
+            child_element = child.to_element(context)
+            if child_element is not None:
+                element.append(child_element)
+        return element
+
+
+class HpsSerializedTransaction(object):
+    """A transaction element already rendered to XML. Services pass it to
+    `do_transaction` in place of an ElementTree element."""
+
+    tag = None
+    xml = None
+    arguments = None
+
+    def __init__(self, tag, xml, arguments):
+        self.tag = tag
+        self.xml = xml
+        self.arguments = arguments
+
+
+def _value(value, context):
+    if callable(value):
+        return value(context)
+    return value
+
+
+def _escape_text(text):
+    # the same escaping ElementTree applies when writing us-ascii
+    try:
+        if '&' in text:
+            text = text.replace('&', '&amp;')
+        if '<' in text:
+            text = text.replace('<', '&lt;')
+        if '>' in text:
+            text = text.replace('>', '&gt;')
+        return text.encode('us-ascii', 'xmlcharrefreplace')
+    except (TypeError, AttributeError):
+        raise TypeError('cannot serialize %r (type %s)' % (text, type(text).__name__))
+
+
+def _escape_attribute(text):
+    try:
+        if '&' in text:
+            text = text.replace('&', '&amp;')
+        if '<' in text:
+            text = text.replace('<', '&lt;')
+        if '>' in text:
+            text = text.replace('>', '&gt;')
+        if '"' in text:
+            text = text.replace('"', '&quot;')
+        if '\n' in text:
+            text = text.replace('\n', '&#10;')
+        return text.encode('us-ascii', 'xmlcharrefreplace')
+    except (TypeError, AttributeError):
+        raise TypeError('cannot serialize %r (type %s)' % (text, type(text).__name__))
+
+
+def _merge(parts):
+    """Join adjacent strings in a list of strings and emit functions."""
+    merged = []
+    for part in parts:
+        if isinstance(part, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return merged
+
+
+def _emitter(part):
+    if isinstance(part, str):
+        return lambda context, write: write(part)
+    return part
+
+
+def _compile(element):
+    """Compile `element` to a string, when its output never changes, or
+    to a function(context, write) that writes it."""
+    children = _merge([_compile(child) for child in element.children])
+    dynamic_attributes = any(callable(value) for _, value in element.attributes)
+
+    if (not element.optional and not callable(element.text) and not dynamic_attributes and
+            all(isinstance(child, str) for child in children)):
+        start = '<' + element.tag + ''.join(
+            ' %s="%s"' % (name, _escape_attribute(value)) for name, value in element.attributes)
+        if element.text or children:
+            text = _escape_text(element.text) if element.text else ''
+            return start + '>' + text + ''.join(children) + '</' + element.tag + '>'
+        return start + ' />'
+
+    tag = element.tag
+    text = element.text
+    when = element.when
+    source = element.source
+    attributes = element.attributes
+    emitters = [_emitter(child) for child in children]
+    # a child that is always written means the element is never empty
+    always_has_children = any(not child.optional for child in element.children)
+    start = '<' + tag
+    close = '</' + tag + '>'
+
+    def emit(context, write):
+        if when is not None and not when(context):
+            return
+        if source is not None:
+            context = source(context)
+            if context is None:
+                return
+
+        write(start)
+        for name, value in attributes:
+            write(' %s="%s"' % (name, _escape_attribute(_value(value, context))))
+
+        element_text = _value(text, context)
+        if always_has_children:
+            write('>')
+            if element_text:
+                write(_escape_text(element_text))
+            for child in emitters:
+                child(context, write)
+            write(close)
+            return
+
+        content = []
+        for child in emitters:
+            child(context, content.append)
+        if element_text or content:
+            write('>')
+            if element_text:
+                write(_escape_text(element_text))
+            write(''.join(content))
+            write(close)
+        else:
+            write(' />')
+
+    return emit
+
+
+class HpsSerializer(object):
+    """A request schema compiled to a function that writes its XML."""
+
+    _schema = None
+    _emit = None
+
+    def __init__(self, schema):
+        self._schema = schema
+        compiled = _compile(schema)
+        self._emit = _emitter(compiled)
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def serialize(self, arguments):
+        buf = []
+        self._emit(arguments, buf.append)
+        return ''.join(buf)
+
+
+def _yes_no(name):
+    return lambda a: 'Y' if a[name] else 'N'
+
+
+def _card_holder_data():
+    return Element(
+        'CardHolderData',
+        Element('CardHolderFirstName', text=lambda h: h.first_name),
+        Element('CardHolderLastName', text=lambda h: h.last_name),
+        Element('CardHolderEmail', text=lambda h: h.email, when=lambda h: h.email is not None),
+        Element('CardHolderPhone', text=lambda h: h.phone, when=lambda h: h.phone is not None),
+        Element('CardHolderAddr', text=lambda h: h.address.address),
+        Element('CardHolderCity', text=lambda h: h.address.city),
+        Element('CardHolderState', text=lambda h: h.address.state),
+        Element('CardHolderZip', text=lambda h: h.address.zip),
+        source=lambda a: a['card_holder'])
+
+
+def _manual_entry(when):
+    return Element(
+        'ManualEntry',
+        Element('CardNbr', text=lambda a: a['card_data'].number),
+        Element('ExpMonth', text=lambda a: str(a['card_data'].exp_month)),
+        Element('ExpYear', text=lambda a: str(a['card_data'].exp_year)),
+        Element('CVV2', text=lambda a: str(a['card_data'].cvv),
+                when=lambda a: a['card_data'].cvv is not None),
+        Element('CardPresent', text=_yes_no('card_present')),
+        Element('ReaderPresent', text=_yes_no('reader_present')),
+        when=when)
+
+
+def _encryption_data():
+    return Element(
+        'EncryptionData',
+        Element('Version', text=lambda e: e.version),
+        Element('EncryptedTrackNumber', text=lambda e: str(e.encrypted_track_number),
+                when=lambda e: e.encrypted_track_number is not None),
+        Element('KTB', text=lambda e: e.ktb, when=lambda e: e.ktb is not None),
+        Element('KSN', text=lambda e: e.ksn, when=lambda e: e.ksn is not None),
+        source=lambda a: a['card_data'].encryption_data,
+        when=lambda a: isinstance(a['card_data'], (HpsCreditCard, HpsTrackData)))
+
+
+def _card_data():
+    """CardData for a card, track data or a token, with a TokenRequest."""
+    return Element(
+        'CardData',
+        _manual_entry(lambda a: isinstance(a['card_data'], HpsCreditCard)),
+        Element('TrackData', text=lambda a: a['card_data'].value,
+                attributes={'method': lambda a: str(a['card_data'].method)},
+                when=lambda a: isinstance(a['card_data'], HpsTrackData)),
+        Element('TokenData',
+                Element('TokenValue', text=lambda a: a['card_data']),
+                Element('CardPresent', text=_yes_no('card_present')),
+                Element('ReaderPresent', text=_yes_no('reader_present')),
+                when=lambda a: not isinstance(a['card_data'], (HpsCreditCard, HpsTrackData))),
+        _encryption_data(),
+        Element('TokenRequest', text=_yes_no('request_multi_use_token')))
+
+
+def _card_or_transaction():
+    """CardData for a card or a token, or the GatewayTxnId of an earlier
+    transaction."""
+    return [
+        Element('CardData',
+                _manual_entry(None),
+                when=lambda a: isinstance(a['card_data'], HpsCreditCard)),
+        Element('CardData',
+                Element('TokenData', Element('TokenValue', text=lambda a: a['card_data'])),
+                when=lambda a: isinstance(a['card_data'], basestring)),
+        Element('GatewayTxnId', text=lambda a: str(a['card_data']),
+                when=lambda a: not isinstance(a['card_data'], (HpsCreditCard, basestring)))]
+
+
+def _additional_txn_fields():
+    return Element(
+        'AdditionalTxnFields',
+        Element('Description', text=lambda d: d.memo, when=lambda d: d.memo is not None),
+        Element('CustomerID', text=lambda d: d.customer_id, when=lambda d: d.customer_id is not None),
+        Element('InvoiceNbr', text=lambda d: d.invoice_number, when=lambda d: d.invoice_number is not None),
+        when=lambda a: isinstance(a['details'], HpsTransactionDetails),
+        source=lambda a: a['details'])
+
+
+def _direct_market_data():
+    return Element(
+        'DirectMktData',
+        Element('DirectMktInvoiceNbr', text=lambda d: d.invoice_number),
+        Element('DirectMktShipDay', text=lambda d: str(d.ship_day)),
+        Element('DirectMktShipMonth', text=lambda d: str(d.ship_month)),
+        when=lambda a: isinstance(a['direct_market_data'], HpsDirectMarketData),
+        source=lambda a: a['direct_market_data'])
+
+
+def _gift_card_data():
+    return Element(
+        'CardData',
+        Element('TrackData', text=lambda g: g.track_data, when=lambda g: g.track_data is not None),
+        Element('CardNbr', text=lambda g: g.card_number,
+                when=lambda g: g.track_data is None and g.card_number is not None),
+        Element('EncryptionData',
+                Element('EncryptedTrackNumber', text=lambda e: e.encrypted_track_number),
+                Element('KSN', text=lambda e: e.ksn),
+                Element('KTB', text=lambda e: e.ktb),
+                Element('Version', text=lambda e: e.version),
+                source=lambda g: g.encryption_data),
+        source=lambda a: a['gift_card'])
+
+
+def _optional(tag, name, text=None):
+    if text is None:
+        text = lambda a: str(a[name])
+    return Element(tag, text=text, when=lambda a: a[name] is not None)
+
+
+def _credit_sale():
+    return Element(
+        'CreditSale',
+        Element('Block1',
+                Element('AllowDup', text='Y'),
+                Element('AllowPartialAuth', text=_yes_no('allow_partial_auth')),
+                Element('Amt', text=lambda a: str(a['amount'])),
+                _card_holder_data(),
+                _card_data(),
+                Element('CPCReq', text='Y', when=lambda a: a['cpc_req'] is True),
+                _additional_txn_fields(),
+                _optional('TxnDescriptor', 'descriptor', lambda a: a['descriptor']),
+                _direct_market_data()))
+
+
+def _credit_auth():
+    return Element(
+        'CreditAuth',
+        Element('Block1',
+                Element('AllowDup', text='Y'),
+                Element('AllowPartialAuth', text=_yes_no('allow_partial_auth')),
+                Element('Amt', text=lambda a: str(a['amount'])),
+                _card_holder_data(),
+                _card_data(),
+                Element('CPCReq', text='Y', when=lambda a: a['cpc_req'] is True),
+                _additional_txn_fields(),
+                _optional('TxnDescriptor', 'descriptor', lambda a: a['descriptor'])))
+
+
+def _credit_account_verify():
+    return Element(
+        'CreditAccountVerify',
+        Element('Block1',
+                _card_holder_data(),
+                _card_data()))
+
+
+def _credit_return():
+    return Element(
+        'CreditReturn',
+        Element('Block1',
+                Element('AllowDup', text='Y'),
+                Element('Amt', text=lambda a: str(a['amount'])),
+                _card_holder_data(),
+                *(_card_or_transaction() + [_additional_txn_fields()])))
+
+
+def _credit_reversal():
+    return Element(
+        'CreditReversal',
+        Element('Block1',
+                Element('Amt', text=lambda a: str(a['amount'])),
+                *(_card_or_transaction() + [_additional_txn_fields()])))
+
+
+def _gift_card_sale():
+    return Element(
+        'GiftCardSale',
+        Element('Block1',
+                Element('Amt', text=lambda a: str(a['amount'])),
+                _gift_card_data(),
+                Element('Currency', text=lambda a: 'USD' if a['currency'] == 'usd' else 'POINTS',
+                        when=lambda a: a['currency'] in ('usd', 'points')),
+                _optional('GratuityAmtInfo', 'gratuity'),
+                _optional('TaxAmtInfo', 'tax')))
+
+
+def _check_sale():
+    consumer_info = Element(
+        'ConsumerInfo',
+        Element('Address1', text=lambda h: h.address.address, when=lambda h: h.address is not None),
+        Element('City', text=lambda h: h.address.city, when=lambda h: h.address is not None),
+        Element('State', text=lambda h: h.address.state, when=lambda h: h.address is not None),
+        Element('Zip', text=lambda h: h.address.zip, when=lambda h: h.address is not None),
+        Element('CheckName', text=lambda h: h.check_name, when=lambda h: h.check_name is not None),
+        Element('CourtesyCard', text=lambda h: h.courtesy_card, when=lambda h: h.courtesy_card is not None),
+        Element('DLNumber', text=lambda h: h.dl_number, when=lambda h: h.dl_number is not None),
+        Element('DLState', text=lambda h: h.dl_state, when=lambda h: h.dl_state is not None),
+        Element('EmailAddress', text=lambda h: h.email, when=lambda h: h.email is not None),
+        Element('FirstName', text=lambda h: h.first_name, when=lambda h: h.first_name is not None),
+        Element('LastName', text=lambda h: h.last_name, when=lambda h: h.last_name is not None),
+        Element('PhoneNumber', text=lambda h: h.phone, when=lambda h: h.phone is not None),
+        Element('IdentityInfo',
+                Element('SSNL4', text=lambda h: h.ssnl4, when=lambda h: h.ssnl4 is not None),
+                Element('DOBYear', text=lambda h: h.dob_year, when=lambda h: h.dob_year is not None),
+                when=lambda h: h.ssnl4 is not None or h.dob_year is not None),
+        source=lambda a: a['check'].check_holder)
+
+    account_info = Element(
+        'AccountInfo',
+        Element('AccountNumber', text=lambda c: c.account_number, when=lambda c: c.account_number is not None),
+        Element('CheckNumber', text=lambda c: c.check_number, when=lambda c: c.check_number is not None),
+        Element('MICRData', text=lambda c: c.micr_number, when=lambda c: c.micr_number is not None),
+        Element('RoutingNumber', text=lambda c: c.routing_number, when=lambda c: c.routing_number is not None),
+        Element('AccountType', text=lambda c: str(c.account_type), when=lambda c: c.account_type is not None),
+        source=lambda a: a['check'])
+
+    return Element(
+        'CheckSale',
+        Element('Block1',
+                Element('Amt', text=lambda a: str(a['amount'])),
+                account_info,
+                Element('CheckAction', text=lambda a: a['action']),
+                Element('SECCode', text=lambda a: str(a['check'].sec_code)),
+                Element('VerifyInfo', Element('CheckVerify', text='Y'),
+                        when=lambda a: a['check'].check_verify is True),
+                Element('CheckType', text=lambda a: str(a['check'].check_type),
+                        when=lambda a: a['check'].check_type is not None),
+                Element('DataEntryMode', text=lambda a: str(a['check'].data_entry_mode),
+                        when=lambda a: a['check'].data_entry_mode is not None),
+                consumer_info))
+
+
+SCHEMAS = {
+    'CreditSale': _credit_sale,
+    'CreditAuth': _credit_auth,
+    'CreditAccountVerify': _credit_account_verify,
+    'CreditReturn': _credit_return,
+    'CreditReversal': _credit_reversal,
+    'GiftCardSale': _gift_card_sale,
+    'CheckSale': _check_sale,
+}
+
+_serializers = {}
+_serializers_lock = threading.Lock()
+
+
+def get_serializer(tag):
+    """The compiled serializer for transaction `tag`, compiled on first use."""
+    serializer = _serializers.get(tag)
+    if serializer is None:
+        with _serializers_lock:
+            serializer = _serializers.get(tag)
+            if serializer is None:
+                serializer = HpsSerializer(SCHEMAS[tag]())
+                _serializers[tag] = serializer
+    return serializer
+
+
+def serialize(tag, **arguments):
+    try:
+        xml = get_serializer(tag).serialize(arguments)
+    except Exception, e:
+        # an argument of the wrong type fails here rather than where an
+        # ElementTree request would, in do_transaction, and the same way
+        raise HpsGatewayException(
+            HpsExceptionCodes.unknown_gateway_error, 'Unable to process transaction', None, None, e)
+    return HpsSerializedTransaction(tag, xml, arguments)
@@ -0,0 +1,173 @@
+"""
+    tls.py
+
+    The SSL context shared by every transport. The CA bundle is loaded
+    once, and connections resume the TLS session of an earlier connection
+    to the same host when the server allows it, so that reconnecting
+    after an idle timeout costs an abbreviated handshake instead of a
+    full one.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import os
+import socket
+import ssl
+import threading
+import weakref
+
+import certifi
+import OpenSSL.SSL
+from urllib3.contrib.pyopenssl import PyOpenSSLContext, WrappedSocket
+from urllib3.util import wait_for_read
+from urllib3.util.ssl_ import DEFAULT_CIPHERS, OP_NO_COMPRESSION, OP_NO_SSLv2, OP_NO_SSLv3
+
+# pyOpenSSL has no public way to tell a resumed handshake; without its
+# private bindings every handshake is counted as a full one
+try:
+    from OpenSSL._util import lib as _lib
+    _SSL_session_reused = _lib.SSL_session_reused
+except (ImportError, AttributeError):
+    _SSL_session_reused = None
+
+
+class _SessionSocket(WrappedSocket):
+    """Keeps the session of its connection when it is closed: under TLS
+    1.3 the session tickets arrive after the handshake, with the first
+    response. OpenSSL marks the session of a connection freed without a
+    shutdown as not resumable, so the connection is marked as shut down
+    first; no close_notify is sent, as urllib3 never sends one."""
+
+    _context = None
+    _key = None
+
+    def close(self):
+        if not self._closed:
+            self._context._keep_session(self._key, self.connection)
+            if self._makefile_refs < 1:
+                self.connection.set_shutdown(OpenSSL.SSL.SENT_SHUTDOWN | OpenSSL.SSL.RECEIVED_SHUTDOWN)
+        return WrappedSocket.close(self)
+
+
+class HpsTlsContext(PyOpenSSLContext):
+    """A client SSL context that verifies servers against `ca_certs`, by
+    default certifi's bundle, and resumes sessions per host. Counts full
+    and resumed handshakes."""
+
+    _sessions = None
+    _connections = None
+    _lock = None
+    _full = 0
+    _resumed = 0
+
+    def __init__(self, ca_certs=None):
+        PyOpenSSLContext.__init__(self, ssl.PROTOCOL_SSLv23)
+        self.options |= OP_NO_SSLv2 | OP_NO_SSLv3 | OP_NO_COMPRESSION
+        self.set_ciphers(DEFAULT_CIPHERS)
+        self.verify_mode = ssl.CERT_REQUIRED
+        self.load_verify_locations(ca_certs or certifi.where())
+
+        self._sessions = {}
+        self._connections = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def handshakes(self):
+        """Returns (full, resumed): the number of handshakes of each kind
+        made with this context."""
+        with self._lock:
+            return self._full, self._resumed
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True, suppress_ragged_eofs=True,
+                    server_hostname=None):
+        key = _session_key(sock, server_hostname)
+        connection = OpenSSL.SSL.Connection(self._ctx, sock)
+        if server_hostname is not None:
+            connection.set_tlsext_host_name(server_hostname)
+        connection.set_connect_state()
+
+        session = self._session(key)
+        if session is not None:
+            connection.set_session(session)
+
+        while True:
+            try:
+                connection.do_handshake()
+            except OpenSSL.SSL.WantReadError:
+                if not wait_for_read(sock, sock.gettimeout()):
+                    raise socket.timeout('select timed out')
+                continue
+            except OpenSSL.SSL.Error, e:
+                raise ssl.SSLError('bad handshake: %r' % e)
+            break
+
+        resumed = _session_reused(connection)
+        with self._lock:
+            if resumed:
+                self._resumed += 1
+            else:
+                self._full += 1
+            self._connections[key] = connection
+
+        wrapped = _SessionSocket(connection, sock, suppress_ragged_eofs)
+        wrapped._context = self
+        wrapped._key = key
+        return wrapped
+
+    def _session(self, key):
+        """The most recent session with the host: that of its latest
+        connection if it is still open, else the one kept last."""
+        with self._lock:
+            connection = self._connections.get(key)
+        if connection is not None:
+            self._keep_session(key, connection)
+        with self._lock:
+            return self._sessions.get(key)
+
+    def _keep_session(self, key, connection):
+        try:
+            session = connection.get_session()
+        except OpenSSL.SSL.Error:
+            return
+        if session is not None:
+            with self._lock:
+                self._sessions[key] = session
+
+
+def _session_key(sock, server_hostname):
+    # urllib3 gives no server_hostname for an IP address, so the peer's
+    # address tells hosts apart
+    address, port = sock.getpeername()[:2]
+    return server_hostname, address, port
+
+
+def _session_reused(connection):
+    handle = getattr(connection, '_ssl', None)
+    if _SSL_session_reused is None or handle is None:
+        return False
+    return bool(_SSL_session_reused(handle))
+
+
+_context = None
+_context_pid = None
+_context_lock = threading.Lock()
+
+
+def get_ssl_context():
+    """The context every transport connects with, created on first use
+    and again in a forked child, which must not share its parent's
+    sessions or OpenSSL state."""
+    global _context, _context_pid, _context_lock
+    if _context_pid is not None and _context_pid != os.getpid():
+        _context_lock = threading.Lock()
+        _context = None
+
+    with _context_lock:
+        if _context is None:
+            _context = HpsTlsContext()
+            _context_pid = os.getpid()
+        return _context
+
+
+def handshake_counts():
+    """Returns (full, resumed) for the shared context in this process."""
+    return get_ssl_context().handshakes()
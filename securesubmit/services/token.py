@@ -6,16 +6,12 @@
     :copyright: (c) Heartland Payment Systems. All rights reserved.
 """
 
-import urllib3.contrib.pyopenssl
-import certifi
 import jsonpickle
 import base64
 
 from securesubmit.infrastructure import HpsException, HpsArgumentException
 from securesubmit.serialization import HpsToken, HpsCardToken, HpsSwipeToken, HpsTrackDataToken
-
-urllib3.contrib.pyopenssl.inject_into_urllib3()
-http = urllib3.PoolManager(cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+from securesubmit.services.transport import get_transport
 
 class HpsTokenService(object):
     """The Public API for which you are requesting a token."""
@@ -57,7 +53,7 @@ class HpsTokenService(object):
             #                          headers=headers,
             #                          auth=(self._public_api_key, None))
 
-            response = http.request('post', self._url, headers=headers, body=data)
+            response = get_transport().request('post', self._url, headers=headers, body=data)
 
             token = HpsToken()
             if len(response.data) > 0:
@@ -67,6 +63,15 @@ class HpsTokenService(object):
         except Exception, e:
             raise HpsException(e.message)
 
+    def warm_up(self, connections=1):
+        """Open `connections` keep-alive connections to the token API
+        before the first token is requested, and return an
+        HpsWarmUpReport of the handshakes."""
+        try:
+            return get_transport().warm_up(self._url, connections)
+        except Exception, e:
+            raise HpsException(str(e), e)
+
     def get_token(self, card):
         return self._request_token(HpsCardToken(card))
 
@@ -0,0 +1,490 @@
+"""
+    transport.py
+
+    The HTTP transport shared by the SOAP, REST and token services.
+
+    Transports connect with the SSL context of securesubmit.services.tls,
+    shared by all of them, unless they are given one of their own.
+
+    Transports are fork-safe: a transport used in a process other than the
+    one that made its pools drops them, without closing the connections
+    the parent still owns, and opens its own.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import os
+import socket
+import threading
+import time
+import urlparse
+
+import urllib3
+import urllib3.contrib.pyopenssl
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import (
+    HTTPError,
+    MaxRetryError,
+    TimeoutError,
+    ConnectTimeoutError,
+    NewConnectionError)
+
+from securesubmit.services.tls import get_ssl_context
+
+urllib3.contrib.pyopenssl.inject_into_urllib3()
+
+
+# what services opting into compressed responses accept
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# decompressed bytes handed to a parser at a time
+CHUNK_SIZE = 64 * 1024
+
+
+class HpsPoolSettings(object):
+    """Connection pool settings for a transport.
+
+    `maxsize` is the number of connections kept per host. With `auto_size`
+    the pool grows to the highest number of concurrent requests seen for a
+    host, up to `max_auto_size`. When `block` is set, callers wait for a
+    free connection instead of opening a throw-away one. Pools that sat
+    unused for more than `idle_timeout` seconds have their connections
+    closed before the next request."""
+
+    maxsize = 10
+    block = False
+    keep_alive = True
+    idle_timeout = 60
+    auto_size = True
+    max_auto_size = 100
+
+    def __init__(self, maxsize=10, block=False, keep_alive=True,
+                 idle_timeout=60, auto_size=True, max_auto_size=100):
+        self.maxsize = maxsize
+        self.block = block
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self.auto_size = auto_size
+        self.max_auto_size = max_auto_size
+
+    @classmethod
+    def from_config(cls, config=None):
+        if config is None:
+            return cls()
+
+        return cls(
+            getattr(config, 'pool_maxsize', cls.maxsize),
+            getattr(config, 'pool_block', cls.block),
+            getattr(config, 'pool_keep_alive', cls.keep_alive),
+            getattr(config, 'pool_idle_timeout', cls.idle_timeout),
+            getattr(config, 'pool_auto_size', cls.auto_size),
+            getattr(config, 'pool_max_auto_size', cls.max_auto_size))
+
+    def key(self):
+        return (self.maxsize, self.block, self.keep_alive,
+                self.idle_timeout, self.auto_size, self.max_auto_size)
+
+
+class HpsDeadline(object):
+    """A point in time by which a call, including any requests it triggers
+    on its own (such as automatic reversals), has to be finished."""
+
+    _expires_at = None
+
+    def __init__(self, seconds):
+        self._expires_at = time.time() + seconds
+
+    def remaining(self):
+        return max(0.0, self._expires_at - time.time())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def earliest(self, other):
+        if other is None or self._expires_at <= other._expires_at:
+            return self
+        return other
+
+    def timeout(self, connect_timeout=None, read_timeout=None):
+        """A urllib3 Timeout for the next request, with each phase capped
+        by the time left."""
+        remaining = self.remaining()
+        return urllib3.Timeout(
+            total=remaining,
+            connect=remaining if connect_timeout is None else min(connect_timeout, remaining),
+            read=remaining if read_timeout is None else min(read_timeout, remaining))
+
+
+def request_timeout(config=None, deadline=None):
+    """The urllib3 timeout for a request made with `config` under
+    `deadline`; either may be None."""
+    connect_timeout = getattr(config, 'connect_timeout', None)
+    read_timeout = getattr(config, 'read_timeout', None)
+
+    if deadline is not None:
+        return deadline.timeout(connect_timeout, read_timeout)
+    if connect_timeout is None and read_timeout is None:
+        return None
+    return urllib3.Timeout(connect=connect_timeout, read=read_timeout)
+
+
+def _cause(error):
+    if isinstance(error, MaxRetryError):
+        return error.reason
+    return error
+
+
+def is_timeout(error):
+    error = _cause(error)
+    return isinstance(error, TimeoutError) and not isinstance(error, NewConnectionError)
+
+
+def is_network_error(error):
+    return isinstance(_cause(error), (HTTPError, socket.error))
+
+
+def is_connect_error(error):
+    """True when the request failed before anything was written, so the
+    gateway cannot have seen it."""
+    return isinstance(_cause(error), (NewConnectionError, ConnectTimeoutError))
+
+
+class HpsWarmUpReport(object):
+    """What warming up the pool of a host did: how many connections were
+    already open and reused, and how long connecting each of the others
+    took, DNS, TCP and TLS included."""
+
+    url = None
+    reused = 0
+    handshake_times = None
+
+    def __init__(self, url, reused=0, handshake_times=None):
+        self.url = url
+        self.reused = reused
+        self.handshake_times = handshake_times if handshake_times is not None else []
+
+    @property
+    def opened(self):
+        return len(self.handshake_times)
+
+    @property
+    def connections(self):
+        return self.reused + self.opened
+
+    @property
+    def slowest(self):
+        return max(self.handshake_times) if self.handshake_times else None
+
+    def __repr__(self):
+        return '<HpsWarmUpReport {0}: {1} opened, {2} reused, slowest {3}>'.format(
+            self.url, self.opened, self.reused,
+            '{0:.3f}s'.format(self.slowest) if self.handshake_times else '-')
+
+
+class _HostStats(object):
+    in_flight = 0
+    peak = 0
+    maxsize = 0
+    last_used = None
+    received_bytes = 0
+    decoded_bytes = 0
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.last_used = time.time()
+
+
+class HpsHttpTransport(object):
+    """Wraps a urllib3 PoolManager. One transport is shared by every
+    service created with the same pool settings, so services that target
+    the same host reuse the same connections. `ssl_context` defaults to
+    the shared one."""
+
+    _settings = None
+    _ssl_context = None
+    _manager = None
+    _hosts = None
+    _lock = None
+    _pid = None
+
+    def __init__(self, settings=None, ssl_context=None):
+        self._settings = settings if settings is not None else HpsPoolSettings()
+        self._ssl_context = ssl_context
+        self.reset()
+
+    @property
+    def settings(self):
+        return self._settings
+
+    def _create_manager(self):
+        socket_options = list(HTTPConnection.default_socket_options)
+        if self._settings.keep_alive:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+        return urllib3.PoolManager(
+            maxsize=self._settings.maxsize,
+            block=self._settings.block,
+            socket_options=socket_options,
+            cert_reqs='CERT_REQUIRED',
+            ssl_context=self._ssl_context or get_ssl_context())
+
+    def request(self, method, url, headers=None, body=None, **kwargs):
+        headers = dict(headers) if headers is not None else {}
+        if not self._settings.keep_alive:
+            headers['Connection'] = 'close'
+
+        if self._pid != os.getpid():
+            self.reset()
+
+        host = self._before_request(url)
+        response = None
+        try:
+            response = self._manager.request(method, url, headers=headers, body=body, **kwargs)
+            return response
+        finally:
+            self._after_request(host)
+            if response is not None and kwargs.get('preload_content', True):
+                self._count_bytes(host, response.tell(), len(response.data))
+
+    def stream(self, url, response, chunk_size=CHUNK_SIZE):
+        """Yield the body of `response`, a response to a request for `url`
+        made with preload_content=False, in decoded chunks as it arrives,
+        and release its connection at the end."""
+        decoded = 0
+        finished = False
+        try:
+            for chunk in response.stream(chunk_size, decode_content=True):
+                decoded += len(chunk)
+                yield chunk
+            finished = True
+        finally:
+            self._count_bytes(_host_key(url), response.tell(), decoded)
+            if not finished:
+                # the rest of the body is still on the connection
+                response.close()
+            response.release_conn()
+
+    def byte_counts(self, url):
+        """Returns (received, decoded) for the host of `url`: the bytes of
+        response bodies as they came over the wire, compressed or not, and
+        once decoded."""
+        with self._lock:
+            stats = self._hosts.get(_host_key(url))
+            if stats is None:
+                return 0, 0
+            return stats.received_bytes, stats.decoded_bytes
+
+    def warm_up(self, url, connections=1, timeout=None):
+        """Open `connections` keep-alive connections to the host of `url`
+        and leave them in its pool, growing the pool as far as auto-sizing
+        allows. Connections already open count towards the number. The
+        new ones connect in parallel; verifying the certificate is part of
+        connecting. Returns an HpsWarmUpReport, or raises the first error
+        once the connections that did open are pooled. `timeout` is a
+        urllib3 Timeout whose connect timeout bounds each connection."""
+        if self._pid != os.getpid():
+            self.reset()
+
+        host = _host_key(url)
+        grow_by = 0
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                stats = _HostStats(self._settings.maxsize)
+                self._hosts[host] = stats
+            if self._settings.auto_size and connections > stats.maxsize:
+                grow_by = max(0, min(connections, self._settings.max_auto_size) - stats.maxsize)
+                stats.maxsize += grow_by
+            connections = min(connections, stats.maxsize)
+        if grow_by > 0:
+            self._grow_pool(host, grow_by)
+
+        pool = self._pool(host)
+        taken = [pool._get_conn() for _ in range(connections)]
+        fresh = [connection for connection in taken if connection.sock is None]
+        outcomes = {}
+
+        def connect(connection):
+            started = time.time()
+            try:
+                if timeout is not None:
+                    connection.timeout = timeout.connect_timeout
+                connection.connect()
+                outcomes[connection] = (time.time() - started, None)
+            except Exception, e:
+                outcomes[connection] = (None, e)
+
+        threads = [threading.Thread(target=connect, args=(connection,)) for connection in fresh]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report = HpsWarmUpReport(url, len(taken) - len(fresh))
+        error = None
+        for connection in taken:
+            elapsed, e = outcomes.get(connection, (None, None))
+            if e is not None:
+                connection.close()
+                error = error or e
+            elif elapsed is not None:
+                report.handshake_times.append(elapsed)
+            pool._put_conn(connection)
+
+        with self._lock:
+            stats.last_used = time.time()
+        if error is not None:
+            raise error
+        return report
+
+    def stats(self, url):
+        """Returns (in_flight, peak, maxsize) for the host of `url`."""
+        with self._lock:
+            stats = self._hosts.get(_host_key(url))
+            if stats is None:
+                return 0, 0, self._settings.maxsize
+            return stats.in_flight, stats.peak, stats.maxsize
+
+    def reap_idle(self):
+        """Close the connections of every pool that has been idle for longer
+        than the idle timeout."""
+        with self._lock:
+            hosts = [host for host, stats in self._hosts.items() if self._is_idle(stats)]
+        for host in hosts:
+            self._close_idle_connections(host)
+
+    def clear(self):
+        with self._lock:
+            self._hosts = {}
+            self._manager.clear()
+
+    def reset(self):
+        """Replace the pools with empty ones, leaving the connections of
+        the old ones open: after a fork they belong to the parent, whose
+        threads may also have held the lock when it forked."""
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._manager = self._create_manager()
+        self._pid = os.getpid()
+
+    def _before_request(self, url):
+        host = _host_key(url)
+        grow_by = 0
+        reap = False
+
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                stats = _HostStats(self._settings.maxsize)
+                self._hosts[host] = stats
+            elif stats.in_flight == 0 and self._is_idle(stats):
+                reap = True
+
+            stats.in_flight += 1
+            stats.peak = max(stats.peak, stats.in_flight)
+            if (self._settings.auto_size and stats.in_flight > stats.maxsize and
+                    stats.maxsize < self._settings.max_auto_size):
+                grow_by = min(stats.in_flight, self._settings.max_auto_size) - stats.maxsize
+                stats.maxsize += grow_by
+
+        if reap:
+            self._close_idle_connections(host)
+        if grow_by > 0:
+            self._grow_pool(host, grow_by)
+
+        return host
+
+    def _after_request(self, host):
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is not None:
+                stats.in_flight -= 1
+                stats.last_used = time.time()
+
+    def _count_bytes(self, host, received, decoded):
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is not None:
+                stats.received_bytes += received
+                stats.decoded_bytes += decoded
+
+    def _is_idle(self, stats):
+        idle_timeout = self._settings.idle_timeout
+        return idle_timeout is not None and time.time() - stats.last_used > idle_timeout
+
+    def _pool(self, host):
+        scheme, hostname, port = host
+        return self._manager.connection_from_host(hostname, port, scheme)
+
+    def _grow_pool(self, host, grow_by):
+        """urllib3 pools are fixed size, so widen the queue of the live pool.
+        The manager's pool arguments are left alone: they are part of the
+        pool key, and changing them would orphan the pool being grown."""
+        pool = self._pool(host)
+        queue = pool.pool
+        if queue is None:
+            return
+
+        # under the queue's lock, as put and get are: a connection handed
+        # back in between would otherwise fill the queue before we do
+        with queue.mutex:
+            queue.maxsize += grow_by
+            for _ in range(grow_by):
+                queue._put(None)
+            queue.unfinished_tasks += grow_by
+            queue.not_empty.notify(grow_by)
+
+    def _close_idle_connections(self, host):
+        pool = self._pool(host)
+        queue = pool.pool
+        if queue is None:
+            return
+
+        # the connections are swapped for empty slots in one step, under
+        # the queue's lock, so the queue never has room for another
+        with queue.mutex:
+            connections = [queue._get() for _ in range(queue._qsize())]
+            for _ in connections:
+                queue._put(None)
+
+        for connection in connections:
+            if connection is not None:
+                connection.close()
+
+
+def _host_key(url):
+    parsed = urlparse.urlparse(url)
+    scheme = parsed.scheme or 'https'
+    port = parsed.port or (443 if scheme == 'https' else 80)
+    return scheme, parsed.hostname, port
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+_transports_pid = os.getpid()
+
+
+def reset_transport():
+    """Replace the pools of every transport with empty ones. Transports
+    do so on their own on the first request after a fork; pre-fork
+    servers can call this from their post-fork hook to do it up front."""
+    global _transports_lock, _transports_pid
+    _transports_lock = threading.Lock()
+    _transports_pid = os.getpid()
+    for transport in _transports.values():
+        transport.reset()
+
+
+def get_transport(config=None):
+    """The transport for `config`'s pool settings, created on first use."""
+    if _transports_pid != os.getpid():
+        # the lock may have been held by a thread of the parent
+        reset_transport()
+
+    settings = HpsPoolSettings.from_config(config)
+    with _transports_lock:
+        transport = _transports.get(settings.key())
+        if transport is None:
+            transport = HpsHttpTransport(settings)
+            _transports[settings.key()] = transport
+        return transport
@@ -0,0 +1,193 @@
+"""
+    xmlbackend.py
+
+    The XML implementation requests are built and responses are parsed
+    with: lxml when it is installed, the standard library otherwise. The
+    choice is made once, when this module is first imported.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import xml.etree.cElementTree as _stdlib_etree
+import xml.parsers.expat
+from collections import OrderedDict
+
+import xmltodict
+
+try:
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_etree = None
+
+PORTICO_NAMESPACES = {"http://Hps.Exchange.PosGateway": None,
+                      "http://schemas.xmlsoap.org/soap/envelope/": None}
+
+
+class HpsXmlBackend(object):
+    """One XML implementation.
+
+    `etree` is the ElementTree-compatible module requests are built with.
+    `parse` reads a response into the dicts xmltodict builds for it, with
+    the Portico namespaces dropped from the names. `feed` drives a parser
+    target -- an object with start(tag, attributes), end(tag), data(text)
+    and close(), as for ElementTree's XMLParser -- and returns what its
+    close() returns. The local name of a tag given to a target is the part
+    after its last '}'. `feeder` makes an incremental parser driving a
+    target, with feed(chunk) and close(). `tree` reads a response into an
+    element tree of `etree` and returns its root.
+
+    A response is a string, or an iterable of the chunks of one, such as
+    a decompressing stream, which is parsed as the chunks arrive."""
+
+    name = None
+    etree = None
+
+    def parse(self, raw_response):
+        return self.feed(raw_response, _DictTarget(PORTICO_NAMESPACES))
+
+    def feed(self, raw_response, target):
+        parser = self.feeder(target)
+        if isinstance(raw_response, basestring):
+            raw_response = (raw_response,)
+        for chunk in raw_response:
+            parser.feed(chunk)
+        return parser.close()
+
+    def feeder(self, target):
+        raise NotImplementedError
+
+    def tree(self, raw_response):
+        raise NotImplementedError
+
+
+class HpsStdlibXmlBackend(HpsXmlBackend):
+    name = 'stdlib'
+    etree = _stdlib_etree
+
+    def parse(self, raw_response):
+        if not isinstance(raw_response, basestring):
+            return HpsXmlBackend.parse(self, raw_response)
+        return xmltodict.parse(raw_response, process_namespaces=True, namespaces=PORTICO_NAMESPACES)
+
+    def feeder(self, target):
+        return _ExpatFeeder(target)
+
+    def tree(self, raw_response):
+        if isinstance(raw_response, basestring):
+            if isinstance(raw_response, unicode):
+                raw_response = raw_response.encode('utf-8')
+            return _stdlib_etree.fromstring(raw_response)
+        parser = _stdlib_etree.XMLParser()
+        for chunk in raw_response:
+            parser.feed(chunk)
+        return parser.close()
+
+
+class HpsLxmlBackend(HpsXmlBackend):
+    name = 'lxml'
+    etree = _lxml_etree
+
+    def feeder(self, target):
+        return _lxml_etree.XMLParser(target=target, resolve_entities=False)
+
+    def tree(self, raw_response):
+        return self._parse(raw_response, _lxml_etree.XMLParser(resolve_entities=False))
+
+    def _parse(self, raw_response, parser):
+        if isinstance(raw_response, basestring):
+            if isinstance(raw_response, unicode):
+                raw_response = raw_response.encode('utf-8')
+            return _lxml_etree.fromstring(raw_response, parser)
+        for chunk in raw_response:
+            parser.feed(chunk)
+        return parser.close()
+
+
+class _ExpatFeeder(object):
+    def __init__(self, target):
+        self._target = target
+        self._parser = xml.parsers.expat.ParserCreate(namespace_separator='}')
+        self._parser.StartElementHandler = target.start
+        self._parser.EndElementHandler = target.end
+        self._parser.CharacterDataHandler = target.data
+        if hasattr(target, 'start_ns'):
+            self._parser.StartNamespaceDeclHandler = target.start_ns
+        self._parser.buffer_text = True
+
+    def feed(self, chunk):
+        self._parser.Parse(chunk, False)
+
+    def close(self):
+        self._parser.Parse('', True)
+        return self._target.close()
+
+
+class _DictTarget(object):
+    """A parser target building what xmltodict.parse builds with
+    process_namespaces, so that backends without xmltodict's expat
+    handler give the services the same dicts."""
+
+    def __init__(self, namespaces):
+        self.namespaces = namespaces
+        self.declarations = OrderedDict()
+        self.stack = []
+        self.item = None
+        self.text = []
+
+    def _name(self, full_name):
+        i = full_name.rfind('}')
+        if i == -1:
+            return full_name
+        namespace = full_name[1:i] if full_name.startswith('{') else full_name[:i]
+        short_namespace = self.namespaces.get(namespace, namespace)
+        if not short_namespace:
+            return full_name[i + 1:]
+        return short_namespace + ':' + full_name[i + 1:]
+
+    def start_ns(self, prefix, uri):
+        self.declarations[prefix or ''] = uri
+
+    def start(self, tag, attributes):
+        attributes = OrderedDict(attributes)
+        if attributes and self.declarations:
+            attributes['xmlns'] = self.declarations
+            self.declarations = OrderedDict()
+
+        self.stack.append((self.item, self.text))
+        self.item = OrderedDict(('@' + self._name(key), value)
+                                for key, value in attributes.items()) or None
+        self.text = []
+
+    def data(self, text):
+        self.text.append(text)
+
+    def end(self, tag):
+        text = ''.join(self.text).strip() or None
+        item = self.item
+        self.item, self.text = self.stack.pop()
+
+        if item is not None and text:
+            self._push(item, '#text', text)
+        self.item = self._push(self.item, self._name(tag), item if item is not None else text)
+
+    def _push(self, item, key, value):
+        if item is None:
+            item = OrderedDict()
+        if key not in item:
+            item[key] = value
+        elif isinstance(item[key], list):
+            item[key].append(value)
+        else:
+            item[key] = [item[key], value]
+        return item
+
+    def close(self):
+        return self.item
+
+
+BACKENDS = OrderedDict([('stdlib', HpsStdlibXmlBackend())])
+if _lxml_etree is not None:
+    BACKENDS['lxml'] = HpsLxmlBackend()
+
+backend = BACKENDS.get('lxml', BACKENDS['stdlib'])
+etree = backend.etree
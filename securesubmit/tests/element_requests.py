@@ -0,0 +1,158 @@
+"""
+    element_requests.py
+
+    The transaction elements built with the XML backend's ElementTree, the
+    way the services built them before their serializers were compiled. The serializer tests
+    compare against these and the benchmarks time them.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+from securesubmit.entities.credit import HpsCreditCard, HpsTrackData
+from securesubmit.services.gateway import (
+    HpsSoapGatewayService,
+    _hydrate_additional_txn_fields,
+    _hydrate_card_holder_data,
+    _hydrate_card_manual_entry,
+    _hydrate_direct_market_data,
+    _hydrate_gift_card_data)
+from securesubmit.services.xmlbackend import etree as Et
+
+
+def _card_data(block1, card_data, request_multi_use_token, card_present, reader_present):
+    card_data_element = Et.SubElement(block1, 'CardData')
+    if isinstance(card_data, HpsCreditCard):
+        card_data_element.append(_hydrate_card_manual_entry(card_data, card_present, reader_present))
+        if card_data.encryption_data is not None:
+            card_data_element.append(HpsSoapGatewayService.hydrate_encryption_data(card_data.encryption_data))
+    elif isinstance(card_data, HpsTrackData):
+        card_data_element.append(HpsSoapGatewayService.hydrate_track_data(card_data))
+        if card_data.encryption_data is not None:
+            card_data_element.append(HpsSoapGatewayService.hydrate_encryption_data(card_data.encryption_data))
+    else:
+        card_data_element.append(HpsSoapGatewayService.hydrate_token_data(card_data, card_present, reader_present))
+    return card_data_element
+
+
+def _card_or_transaction(block1, card_data):
+    if isinstance(card_data, HpsCreditCard):
+        card_data_element = Et.SubElement(block1, 'CardData')
+        card_data_element.append(_hydrate_card_manual_entry(card_data))
+    elif isinstance(card_data, (basestring, str)):
+        card_data_element = Et.SubElement(block1, 'CardData')
+        token_data = Et.SubElement(card_data_element, 'TokenData')
+        Et.SubElement(token_data, 'TokenValue').text = card_data
+    else:
+        Et.SubElement(block1, 'GatewayTxnId').text = str(card_data)
+
+
+def credit_sale(amount, card_data, card_holder=None, request_multi_use_token=False,
+                descriptor=None, allow_partial_auth=False, details=None,
+                direct_market_data=None, cpc_req=False, card_present=False,
+                reader_present=False):
+    transaction = Et.Element('CreditSale')
+    block1 = Et.SubElement(transaction, 'Block1')
+    Et.SubElement(block1, 'AllowDup').text = 'Y'
+    Et.SubElement(block1, 'AllowPartialAuth').text = 'Y' if allow_partial_auth else 'N'
+    Et.SubElement(block1, 'Amt').text = str(amount)
+    if card_holder is not None:
+        block1.append(_hydrate_card_holder_data(card_holder))
+    card_data_element = _card_data(block1, card_data, request_multi_use_token, card_present, reader_present)
+    if cpc_req is True:
+        Et.SubElement(block1, 'CPCReq').text = 'Y'
+    Et.SubElement(card_data_element, 'TokenRequest').text = 'Y' if request_multi_use_token else 'N'
+    if details is not None:
+        block1.append(_hydrate_additional_txn_fields(details))
+    if descriptor is not None:
+        Et.SubElement(block1, "TxnDescriptor").text = descriptor
+    if direct_market_data is not None:
+        block1.append(_hydrate_direct_market_data(direct_market_data))
+    return transaction
+
+
+def credit_auth(amount, card_data, card_holder=None, request_multi_use_token=False,
+                descriptor=None, allow_partial_auth=False, details=None,
+                cpc_req=False, card_present=False, reader_present=False):
+    transaction = Et.Element('CreditAuth')
+    block1 = Et.SubElement(transaction, 'Block1')
+    Et.SubElement(block1, 'AllowDup').text = 'Y'
+    Et.SubElement(block1, 'AllowPartialAuth').text = 'Y' if allow_partial_auth else 'N'
+    Et.SubElement(block1, 'Amt').text = str(amount)
+    if card_holder is not None:
+        block1.append(_hydrate_card_holder_data(card_holder))
+    card_data_element = _card_data(block1, card_data, request_multi_use_token, card_present, reader_present)
+    if cpc_req is True:
+        Et.SubElement(block1, 'CPCReq').text = 'Y'
+    Et.SubElement(card_data_element, 'TokenRequest').text = 'Y' if request_multi_use_token else 'N'
+    if details is not None:
+        block1.append(_hydrate_additional_txn_fields(details))
+    if descriptor is not None:
+        Et.SubElement(block1, "TxnDescriptor").text = descriptor
+    return transaction
+
+
+def credit_account_verify(card_data, card_holder=None, request_multi_use_token=False,
+                          card_present=False, reader_present=False):
+    transaction = Et.Element('CreditAccountVerify')
+    block1 = Et.SubElement(transaction, 'Block1')
+    if card_holder is not None:
+        block1.append(_hydrate_card_holder_data(card_holder))
+    card_data_element = _card_data(block1, card_data, request_multi_use_token, card_present, reader_present)
+    Et.SubElement(card_data_element, 'TokenRequest').text = 'Y' if request_multi_use_token else 'N'
+    return transaction
+
+
+def credit_return(amount, card_data, card_holder=None, details=None):
+    transaction = Et.Element('CreditReturn')
+    block1 = Et.SubElement(transaction, 'Block1')
+    Et.SubElement(block1, 'AllowDup').text = "Y"
+    Et.SubElement(block1, 'Amt').text = str(amount)
+    if card_holder is not None:
+        block1.append(_hydrate_card_holder_data(card_holder))
+    _card_or_transaction(block1, card_data)
+    if details is not None:
+        block1.append(_hydrate_additional_txn_fields(details))
+    return transaction
+
+
+def credit_reversal(amount, card_data, details=None):
+    transaction = Et.Element('CreditReversal')
+    block1 = Et.SubElement(transaction, 'Block1')
+    Et.SubElement(block1, 'Amt').text = str(amount)
+    _card_or_transaction(block1, card_data)
+    if details is not None:
+        block1.append(_hydrate_additional_txn_fields(details))
+    return transaction
+
+
+def gift_card_sale(amount, gift_card, currency='usd', gratuity=None, tax=None):
+    transaction = Et.Element('GiftCardSale')
+    block1 = Et.SubElement(transaction, 'Block1')
+    Et.SubElement(block1, 'Amt').text = str(amount)
+    block1.append(_hydrate_gift_card_data(gift_card))
+    if currency == 'usd' or currency == 'points':
+        Et.SubElement(block1, 'Currency').text = 'USD' if currency == 'usd' else 'POINTS'
+    if gratuity is not None:
+        Et.SubElement(block1, 'GratuityAmtInfo').text = str(gratuity)
+    if tax is not None:
+        Et.SubElement(block1, 'TaxAmtInfo').text = str(tax)
+    return transaction
+
+
+def check_sale(action, check, amount):
+    transaction = Et.Element('CheckSale')
+    block1 = Et.SubElement(transaction, 'Block1')
+    Et.SubElement(block1, 'Amt').text = str(amount)
+    block1.append(HpsSoapGatewayService.hydrate_check_data(check))
+    Et.SubElement(block1, 'CheckAction').text = action
+    Et.SubElement(block1, 'SECCode').text = str(check.sec_code)
+    if check.check_verify is True:
+        verify_element = Et.SubElement(block1, 'VerifyInfo')
+        Et.SubElement(verify_element, 'CheckVerify').text = 'Y' if check.check_verify else 'N'
+    if check.check_type is not None:
+        Et.SubElement(block1, 'CheckType').text = str(check.check_type)
+    if check.data_entry_mode is not None:
+        Et.SubElement(block1, 'DataEntryMode').text = str(check.data_entry_mode)
+    if check.check_holder is not None:
+        block1.append(HpsSoapGatewayService.hydrate_consumer_info(check))
+    return transaction
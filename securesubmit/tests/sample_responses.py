@@ -0,0 +1,76 @@
+"""
+    sample_responses.py
+
+    Portico responses for the entities hydrated from dicts, shared by the
+    hydration tests and benchmark.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+from securesubmit.tests.stub_gateway import pos_response
+
+TOKEN_DATA = ('<TokenData><TokenRspCode>0</TokenRspCode><TokenRspMsg>Success</TokenRspMsg>'
+              '<TokenValue>supt_abc</TokenValue></TokenData>')
+
+CREDIT_SALE = pos_response(
+    'CreditSale',
+    '<RspCode>00</RspCode><RspText>APPROVAL</RspText><AuthCode>12345A</AuthCode>'
+    '<AVSRsltCode>0</AVSRsltCode><AVSRsltText>AVS Not Requested.</AVSRsltText>'
+    '<CVVRsltCode>M</CVVRsltCode><CVVRsltText>Match.</CVVRsltText><RefNbr>123</RefNbr>'
+    '<CardType>Visa</CardType><AuthAmt>10.00</AuthAmt><CPCInd>B</CPCInd>'
+    '<TxnDescriptor>desc</TxnDescriptor>',
+    client_txn_id='42', header_extra=TOKEN_DATA)
+
+CREDIT_REVERSAL = pos_response(
+    'CreditReversal',
+    '<RspCode>00</RspCode><RspText>APPROVAL</RspText><AVSRsltCode>0</AVSRsltCode>'
+    '<CVVRsltCode>M</CVVRsltCode><RefNbr>124</RefNbr>')
+
+DEBIT_SALE = pos_response(
+    'DebitSale',
+    '<RspCode>00</RspCode><RspText>APPROVAL</RspText><AuthCode>43210B</AuthCode>'
+    '<AvailableBalance>90.00</AvailableBalance><CardType>Visa</CardType><AuthAmt>10.00</AuthAmt>')
+
+REPORT_TXN_DETAIL = pos_response(
+    'ReportTxnDetail',
+    '<GatewayTxnId>1000</GatewayTxnId><OriginalGatewayTxnId>999</OriginalGatewayTxnId>'
+    '<ServiceName>CreditSale</ServiceName>'
+    '<Data><RspCode>00</RspCode><RspText>APPROVAL</RspText><AuthCode>12345A</AuthCode>'
+    '<AuthAmt>10.00</AuthAmt><SettlementAmt>10.00</SettlementAmt><MaskedCardNbr>411111******1111</MaskedCardNbr>'
+    '<AVSRsltCode>0</AVSRsltCode><AVSRsltText>AVS Not Requested.</AVSRsltText>'
+    '<CVVRsltCode>M</CVVRsltCode><CVVRsltText>Match.</CVVRsltText><CardType>Visa</CardType>'
+    '<RefNbr>125</RefNbr><TxnStatus>A</TxnStatus><TokenizationMsg>Success</TokenizationMsg>'
+    '<AdditionalTxnFields><Description>memo</Description><InvoiceNbr>INV-1</InvoiceNbr>'
+    '<CustomerID>42</CustomerID></AdditionalTxnFields></Data>')
+
+
+def _report_detail(gateway_txn_id, service_name='CreditSale', issuer_rsp_code='00'):
+    return ('<Details><GatewayTxnId>{0}</GatewayTxnId><ServiceName>{1}</ServiceName>'
+            '<GatewayRspCode>0</GatewayRspCode><GatewayRspMsg>Success</GatewayRspMsg>'
+            '<IssuerRspCode>{2}</IssuerRspCode><IssuerRspText>APPROVAL</IssuerRspText>'
+            '<Amt>10.00</Amt><SettlementAmt>10.00</SettlementAmt><MaskedCardNbr>411111******1111</MaskedCardNbr>'
+            '<TxnUtcDT>2016-01-01T12:00:00.123Z</TxnUtcDT></Details>').format(
+        gateway_txn_id, service_name, issuer_rsp_code)
+
+
+REPORT_ACTIVITY = pos_response(
+    'ReportActivity',
+    ''.join(_report_detail(1000 + i, 'CreditSale' if i % 2 else 'CreditVoid') for i in range(50)))
+
+GIFT_CARD_SALE = pos_response(
+    'GiftCardSale',
+    '<RspCode>0</RspCode><RspText>Success</RspText><AuthCode>G1</AuthCode>'
+    '<BalanceAmt>90.00</BalanceAmt><SplitTenderCardAmt>10.00</SplitTenderCardAmt>'
+    '<SplitTenderBalanceDueAmt>0.00</SplitTenderBalanceDueAmt>')
+
+GIFT_CARD_ALIAS = pos_response(
+    'GiftCardAlias',
+    '<RspCode>0</RspCode><RspText>Success</RspText>'
+    '<CardData><CardNbr>5022440000000000098</CardNbr></CardData>')
+
+CHECK_SALE = pos_response(
+    'CheckSale',
+    '<RspCode>0</RspCode><RspMessage>Transaction Approved</RspMessage><AuthCode>C1</AuthCode>'
+    '<CheckRspInfo><Type>Message</Type><Code>0</Code><Message>Approved</Message></CheckRspInfo>'
+    '<CheckRspInfo><Type>Error</Type><Code>12</Code><FieldNumber>3</FieldNumber>'
+    '<FieldName>Amt</FieldName></CheckRspInfo>')
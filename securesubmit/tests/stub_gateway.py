@@ -0,0 +1,221 @@
+"""
+    stub_gateway.py
+
+    A local stand-in for the Portico endpoint, used by the tests that
+    exercise the SDK plumbing without reaching the certification gateway.
+
+    :copyright: (c) Heartland Payment Systems. All rights reserved.
+"""
+
+import gzip
+import os
+import re
+import ssl
+import tempfile
+import threading
+import BaseHTTPServer
+import StringIO
+import SocketServer
+
+from securesubmit.services import HpsServicesConfig
+
+
+_transaction_pattern = re.compile(r'<Transaction><([A-Za-z0-9]+)')
+_client_txn_id_pattern = re.compile(r'<ClientTxnId>([^<]*)</ClientTxnId>')
+
+
+def pos_response(transaction_type, body='', gateway_txn_id=1000,
+                 gateway_rsp_code='0', gateway_rsp_msg='Success',
+                 client_txn_id=None, header_extra=''):
+    header = ('<Header>'
+              '<LicenseId>20855</LicenseId>'
+              '<SiteId>20856</SiteId>'
+              '<DeviceId>1519321</DeviceId>'
+              '<GatewayTxnId>{0}</GatewayTxnId>'
+              '<GatewayRspCode>{1}</GatewayRspCode>'
+              '<GatewayRspMsg>{2}</GatewayRspMsg>'
+              '<RspDT>2016-01-01T12:00:00.000000</RspDT>').format(gateway_txn_id, gateway_rsp_code, gateway_rsp_msg)
+    if client_txn_id is not None:
+        header += '<ClientTxnId>{0}</ClientTxnId>'.format(client_txn_id)
+    header += header_extra + '</Header>'
+
+    transaction = ''
+    if transaction_type is not None:
+        transaction = '<Transaction><{0}>{1}</{0}></Transaction>'.format(transaction_type, body)
+
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+            '<soap:Body>'
+            '<PosResponse rootUrl="https://localhost/Hps.Exchange.PosGateway" '
+            'xmlns="http://Hps.Exchange.PosGateway">'
+            '<Ver1.0>{0}{1}</Ver1.0>'
+            '</PosResponse>'
+            '</soap:Body>'
+            '</soap:Envelope>').format(header, transaction)
+
+
+def approval(transaction_type, request_body, gateway_txn_id=1000):
+    """Default handler: approve every transaction that is sent."""
+    client_txn_id = None
+    match = _client_txn_id_pattern.search(request_body)
+    if match is not None:
+        client_txn_id = match.group(1)
+
+    return pos_response(
+        transaction_type,
+        '<RspCode>00</RspCode><RspText>APPROVAL</RspText><AuthCode>12345A</AuthCode>'
+        '<AVSRsltCode>0</AVSRsltCode><CVVRsltCode>M</CVVRsltCode><CardType>Visa</CardType>'
+        '<AuthAmt>10.00</AuthAmt>',
+        gateway_txn_id=gateway_txn_id,
+        client_txn_id=client_txn_id)
+
+
+def _gzip(body):
+    buffer = StringIO.StringIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+        compressed.write(body)
+    return buffer.getvalue()
+
+
+class _StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        request_body = self.rfile.read(length)
+        self.server.requests.append(request_body)
+        self.server.headers.append(self.headers)
+
+        match = _transaction_pattern.search(request_body)
+        transaction_type = match.group(1) if match is not None else None
+
+        status, response_body = 200, self.server.handler(transaction_type, request_body)
+        if response_body is None:
+            # hang up without answering, like a connection dropped mid-request
+            self.close_connection = 1
+            return
+        if isinstance(response_body, tuple):
+            status, response_body = response_body
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        if self.server.compress and 'gzip' in (self.headers.getheader('accept-encoding') or ''):
+            response_body = _gzip(response_body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _self_signed_certificate():
+    """Write a key and a certificate for localhost to a PEM file and
+    return its path."""
+    from OpenSSL import crypto
+
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, 2048)
+    certificate = crypto.X509()
+    certificate.get_subject().CN = 'localhost'
+    certificate.set_serial_number(1)
+    certificate.gmtime_adj_notBefore(-60)
+    certificate.gmtime_adj_notAfter(24 * 60 * 60)
+    certificate.set_issuer(certificate.get_subject())
+    certificate.set_pubkey(key)
+    certificate.add_extensions([crypto.X509Extension(b'subjectAltName', False, b'DNS:localhost')])
+    certificate.sign(key, 'sha256')
+
+    handle, path = tempfile.mkstemp(suffix='.pem')
+    with os.fdopen(handle, 'w') as pem:
+        pem.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
+        pem.write(crypto.dump_certificate(crypto.FILETYPE_PEM, certificate))
+    return path
+
+
+class StubGateway(object):
+    """Serves canned Portico responses on a local port. `handler` receives
+    the transaction element name and the raw request body and returns the
+    response body, a `(status, body)` tuple, or None to drop the connection.
+
+    With `tls`, it serves HTTPS for localhost with a self-signed
+    certificate, which `ca_certs` names. With `compress`, it gzips the
+    responses to requests that accept it."""
+
+    ca_certs = None
+
+    def __init__(self, handler=approval, tls=False, compress=False):
+        self._server = _ThreadedHTTPServer(('127.0.0.1', 0), _StubRequestHandler)
+        self._server.handler = handler
+        self._server.requests = []
+        self._server.headers = []
+        self._server.compress = compress
+        self._thread = None
+
+        if tls:
+            self.ca_certs = _self_signed_certificate()
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.load_cert_chain(self.ca_certs)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+
+    @property
+    def url(self):
+        if self.ca_certs is not None:
+            return 'https://localhost:{0}/Hps.Exchange.PosGateway/PosGatewayService.asmx'.format(
+                self._server.server_address[1])
+        return 'http://127.0.0.1:{0}/Hps.Exchange.PosGateway/PosGatewayService.asmx'.format(
+            self._server.server_address[1])
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    @property
+    def headers(self):
+        """The headers of the requests received, in order."""
+        return self._server.headers
+
+    @property
+    def handler(self):
+        return self._server.handler
+
+    @handler.setter
+    def handler(self, value):
+        self._server.handler = value
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self.ca_certs is not None:
+            os.remove(self.ca_certs)
+
+
+def stub_config():
+    config = HpsServicesConfig()
+    config.secret_api_key = 'skapi_cert_MTyMAQBiHVEAewvIzXVFcmUd2UcyBge_eCpaASUp0A'
+    return config
+
+
+def stubbed(service_type, gateway):
+    """Build a subclass of `service_type` that talks to `gateway`."""
+    class _Stubbed(service_type):
+        def __init__(self, *args, **kwargs):
+            service_type.__init__(self, *args, **kwargs)
+            self._url = gateway.url
+
+    _Stubbed.__name__ = 'Stubbed' + service_type.__name__
+    return _Stubbed
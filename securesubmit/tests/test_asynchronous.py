@@ -0,0 +1,76 @@
+import unittest
+
+from securesubmit.services.asynchronous import HpsAsyncCreditService, HpsAsyncGiftCardService, get_default_pool
+from securesubmit.services.gateway import (
+    HpsCreditService,
+    HpsGiftCardService,
+    HpsCreditException,
+    HpsCharge,
+    HpsGiftCardSale)
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard, TestGiftCard
+from securesubmit.tests.test_transport import in_child
+
+
+class AsyncServiceTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def _credit_service(self):
+        service = HpsAsyncCreditService(stub_config())
+        service._service_type = stubbed(HpsCreditService, self.gateway)
+        return service
+
+    def test_charge_returns_async_result(self):
+        result = self._credit_service().charge(10, 'usd', TestCreditCard.valid_visa)
+        charge = result.get(10)
+
+        self.assertIsInstance(charge, HpsCharge)
+        self.assertEqual('00', charge.response_code)
+        self.assertEqual(1000, charge.transaction_id)
+
+    def test_many_charges_in_flight(self):
+        service = self._credit_service()
+        results = [service.charge(10, 'usd', TestCreditCard.valid_visa) for _ in range(25)]
+
+        for result in results:
+            self.assertEqual('00', result.get(10).response_code)
+
+    def test_exception_is_raised_from_result(self):
+        self.gateway.handler = lambda tag, body: pos_response(
+            tag, '<RspCode>05</RspCode><RspText>DECLINE</RspText>')
+        try:
+            result = self._credit_service().charge(10, 'usd', TestCreditCard.valid_visa)
+            with self.assertRaises(HpsCreditException):
+                result.get(10)
+        finally:
+            self.gateway.handler = approval
+
+    def test_gift_card_sale(self):
+        service = HpsAsyncGiftCardService(stub_config())
+        service._service_type = stubbed(HpsGiftCardService, self.gateway)
+
+        sale = service.sale(TestGiftCard.valid_gift_card_manual, 10).get(10)
+        self.assertIsInstance(sale, HpsGiftCardSale)
+        self.assertEqual('00', sale.response_code)
+
+    def test_private_members_are_not_proxied(self):
+        with self.assertRaises(AttributeError):
+            self._credit_service()._submit_transaction
+
+    def test_default_pool_is_rebuilt_after_fork(self):
+        pool = get_default_pool()
+
+        def child():
+            charge = self._credit_service().charge(10, 'usd', TestCreditCard.valid_visa).get(10)
+            return get_default_pool() is pool, charge.response_code
+
+        self.assertEqual((False, '00'), in_child(child))
+        self.assertIs(pool, get_default_pool())
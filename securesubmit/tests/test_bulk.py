@@ -0,0 +1,188 @@
+import re
+import threading
+import time
+import unittest
+
+from multiprocessing.pool import ThreadPool
+
+from securesubmit.infrastructure import HpsArgumentException, HpsCreditException, HpsException
+from securesubmit.services.asynchronous import HpsAsyncCreditService
+from securesubmit.services.bulk import HpsBulkResult
+from securesubmit.services.gateway import HpsCheckService, HpsCreditService, HpsGiftCardService
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCheck, TestCreditCard, TestGiftCard
+
+_amount_pattern = re.compile(r'<Amt>([^<]*)</Amt>')
+_txn_id_pattern = re.compile(r'<TxnId>([^<]*)</TxnId>')
+
+
+class _ConcurrencyCounter(object):
+    """A handler approving every request after a short pause, recording
+    how many requests it served at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.highest = 0
+
+    def __call__(self, tag, body):
+        with self.lock:
+            self.active += 1
+            self.highest = max(self.highest, self.active)
+        try:
+            time.sleep(0.02)
+            amount = _amount_pattern.search(body).group(1)
+            rsp_code = '05' if amount == '13' else '00'
+            return pos_response(tag, '<RspCode>{0}</RspCode><RspText>{1}</RspText><AuthAmt>{1}</AuthAmt>'.format(
+                rsp_code, amount))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class SubmitManyTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _service(self, service_type=HpsCreditService, concurrency=None):
+        config = stub_config()
+        config.bulk_concurrency = concurrency
+        return stubbed(service_type, self.gateway)(config)
+
+    def test_results_in_order_with_exceptions(self):
+        counter = _ConcurrencyCounter()
+        self.gateway.handler = counter
+        requests = [('charge', (amount, 'usd', TestCreditCard.valid_visa)) for amount in range(10, 20)]
+
+        results = self._service(concurrency=4).submit_many(requests)
+
+        self.assertEqual(10, len(results))
+        for index, result in enumerate(results):
+            self.assertIsInstance(result, HpsBulkResult)
+            self.assertEqual(index, result.index)
+            self.assertIs(requests[index][0], result.request[0])
+            if index == 3:
+                self.assertFalse(result.succeeded)
+                self.assertIsInstance(result.exception, HpsCreditException)
+                self.assertRaises(HpsCreditException, result.get)
+            else:
+                self.assertTrue(result.succeeded)
+                self.assertEqual(str(10 + index), result.get().authorized_amount)
+        self.assertLessEqual(counter.highest, 4)
+        self.assertGreater(counter.highest, 1)
+
+    def test_concurrency_argument(self):
+        counter = _ConcurrencyCounter()
+        self.gateway.handler = counter
+        requests = [('charge', (10, 'usd', TestCreditCard.valid_visa))] * 6
+
+        results = self._service(concurrency=8).submit_many(requests, concurrency=1)
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertEqual(1, counter.highest)
+
+    def test_progress(self):
+        calls = []
+        requests = [('charge', (10, 'usd', TestCreditCard.valid_visa), {'description': str(i)}) for i in range(5)]
+
+        results = self._service().submit_many(
+            requests, progress=lambda completed, total, result: calls.append(
+                (completed, total, result, threading.current_thread())))
+
+        self.assertEqual([(i, 5) for i in range(1, 6)], [call[:2] for call in calls])
+        self.assertEqual(sorted(results), sorted(call[2] for call in calls))
+        self.assertTrue(all(call[3] is threading.current_thread() for call in calls))
+
+    def test_gift_card_and_check(self):
+        self.gateway.handler = lambda tag, body: sample_responses.GIFT_CARD_SALE
+        results = self._service(HpsGiftCardService).submit_many(
+            [('sale', (TestGiftCard.valid_gift_card_manual, 10))] * 3)
+        self.assertEqual(['90.00'] * 3, [result.get().balance_amount for result in results])
+
+        self.gateway.handler = lambda tag, body: sample_responses.CHECK_SALE
+        results = self._service(HpsCheckService).submit_many([('sale', (TestCheck.approve, 10))] * 3)
+        self.assertEqual(['C1'] * 3, [result.get().authorization_code for result in results])
+
+    def test_invalid_requests(self):
+        service = self._service()
+        for request in (('charge',), ['charge', ()], ('_submit_transaction', ()), ('submit_many', ([],)),
+                        ('get_many', ([],)), ('missing', ())):
+            self.assertRaises(HpsArgumentException, service.submit_many, [request])
+        self.assertRaises(HpsArgumentException, service.submit_many, [], concurrency=-1)
+        self.assertRaises(HpsArgumentException, service.submit_many, [], concurrency=0)
+        self.assertEqual([], service.submit_many([]))
+
+    def test_base_exception_is_a_result(self):
+        class Service(stubbed(HpsCreditService, self.gateway)):
+            def interrupted(self):
+                raise KeyboardInterrupt()
+
+        results = Service(stub_config()).submit_many([('interrupted', ())] * 3, concurrency=2)
+        self.assertTrue(all(isinstance(result.exception, KeyboardInterrupt) for result in results))
+
+    def test_terminated_pool(self):
+        pool = ThreadPool(2)
+        self.gateway.handler = lambda tag, body: (time.sleep(0.5), approval(tag, body))[1]
+        threading.Timer(0.1, pool.terminate).start()
+
+        started = time.time()
+        with self.assertRaises(HpsException):
+            self._service().submit_many([('charge', (10, 'usd', TestCreditCard.valid_visa))] * 4, pool=pool)
+        self.assertLess(time.time() - started, 5)
+
+    def test_not_offered_asynchronously(self):
+        with self.assertRaises(AttributeError):
+            HpsAsyncCreditService(stub_config()).submit_many
+        with self.assertRaises(AttributeError):
+            HpsAsyncCreditService(stub_config()).get_many
+
+
+class GetManyTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _details(self, tag, body):
+        transaction_id = _txn_id_pattern.search(body).group(1)
+        if transaction_id == '13':
+            return pos_response(tag, gateway_rsp_code='3', gateway_rsp_msg='Transaction not found')
+        return sample_responses.REPORT_TXN_DETAIL.replace('<RefNbr>125</RefNbr>',
+                                                          '<RefNbr>{0}</RefNbr>'.format(transaction_id))
+
+    def test_mapping_by_id(self):
+        self.gateway.handler = self._details
+        service = stubbed(HpsCreditService, self.gateway)(stub_config())
+        requests = len(self.gateway.requests)
+
+        results = service.get_many([5, 13, 7, 5, 0, 7], concurrency=3)
+
+        self.assertEqual([5, 13, 7, 0], results.keys())
+        self.assertEqual(requests + 3, len(self.gateway.requests))
+        self.assertEqual(('5', '7'), (results[5].get().reference_number, results[7].get().reference_number))
+        self.assertEqual('memo', results[5].value.memo)
+        self.assertIsInstance(results[0].exception, HpsArgumentException)
+        self.assertFalse(results[13].succeeded)
+        self.assertEqual({}, service.get_many([]))
+
+    def test_concurrency(self):
+        counter = _ConcurrencyCounter()
+        self.gateway.handler = lambda tag, body: (counter(tag, '<Amt>10</Amt>'), self._details(tag, body))[1]
+
+        results = stubbed(HpsCreditService, self.gateway)(stub_config()).get_many(range(1, 9), concurrency=4)
+        self.assertTrue(all(result.succeeded for result in results.values()))
+        self.assertEqual(4, counter.highest)
@@ -0,0 +1,215 @@
+import json
+import os
+import re
+import shutil
+import stat
+import tempfile
+import unittest
+
+from securesubmit.entities.compact import HpsSlottedReportTransactionDetails
+from securesubmit.entities.lazy import HpsLazyReportTransactionDetails
+from securesubmit.services.cache import HpsDetailCache
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.services.raw import HpsRawResponse
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+
+_txn_id_pattern = re.compile(r'<(?:TxnId|GatewayTxnId)>([^<]*)</')
+
+
+def _details(status='A'):
+    def handler(tag, body):
+        if tag != 'ReportTxnDetail':
+            return approval(tag, body)
+        transaction_id = _txn_id_pattern.search(body).group(1)
+        return sample_responses.REPORT_TXN_DETAIL.replace('<RefNbr>125</RefNbr>', '<RefNbr>{0}</RefNbr>'.format(
+            transaction_id)).replace('<TxnStatus>A</TxnStatus>', '<TxnStatus>{0}</TxnStatus>'.format(status))
+    return handler
+
+
+class DetailCacheTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.gateway.handler = _details()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.gateway.handler = approval
+
+    def _service(self, cache, **settings):
+        config = stub_config()
+        config.detail_cache = cache
+        for name, value in settings.items():
+            setattr(config, name, value)
+        return stubbed(HpsCreditService, self.gateway)(config)
+
+    def _stored(self):
+        """The names of the files on disk, and the merchant directories
+        holding them."""
+        return sorted((name, directory) for directory in os.listdir(self.directory)
+                      for name in os.listdir(os.path.join(self.directory, directory)))
+
+    def _gets(self, service, *transaction_ids):
+        """The reference numbers of the details of `transaction_ids`, and
+        the requests the gateway got for them."""
+        requests = len(self.gateway.requests)
+        numbers = [service.get(transaction_id).reference_number for transaction_id in transaction_ids]
+        return numbers, len(self.gateway.requests) - requests
+
+    def test_memory_hits_and_misses(self):
+        cache = HpsDetailCache()
+        service = self._service(cache)
+
+        self.assertEqual((['5', '5', '6', '5'], 2), self._gets(service, 5, 5, 6, 5))
+        stats = cache.stats()
+        self.assertEqual((2, 0, 2), (stats.memory_hits, stats.disk_hits, stats.misses))
+        self.assertEqual(0.5, stats.hit_ratio)
+
+        # another service with the same config shares the cache
+        self.assertEqual((['6'], 0), self._gets(self._service(cache), 6))
+
+    def test_callers_get_copies(self):
+        for settings in ({}, {'compact_entities': True}, {'lazy_entities': True}):
+            service = self._service(HpsDetailCache(), **settings)
+            fetched = service.get(5)
+            fetched.memo = 'changed'
+            cached = service.get(5)
+            self.assertEqual('memo', cached.memo)
+            cached.memo = 'changed again'
+            self.assertEqual('memo', service.get(5).memo)
+            self.assertIsNot(cached, service.get(5))
+            # what the cache holds is decoded already, never as it is read
+            self.assertNotIn('_lazy_stages', getattr(cached, '__dict__', {}))
+
+    def test_expiry_and_eviction(self):
+        self.assertEqual((['5', '5'], 2), self._gets(self._service(HpsDetailCache(ttl=0)), 5, 5))
+
+        service = self._service(HpsDetailCache(max_entries=2))
+        self.assertEqual((['5', '6', '5', '7'], 3), self._gets(service, 5, 6, 5, 7))
+        self.assertEqual((['5', '7', '6'], 1), self._gets(service, 5, 7, 6))
+
+    def test_settled_details_on_disk(self):
+        self.assertEqual((['5'], 1), self._gets(self._service(HpsDetailCache(directory=self.directory)), 5))
+        self.assertEqual([], self._stored())
+
+        self.gateway.handler = _details('C')
+        self.assertEqual((['6'], 1), self._gets(self._service(HpsDetailCache(directory=self.directory)), 6))
+        [(name, merchant)] = self._stored()
+        self.assertEqual('6.json', name)
+        with open(os.path.join(self.directory, merchant, name)) as stored:
+            self.assertEqual('memo', json.load(stored)['fields']['memo'])
+
+        cache = HpsDetailCache(directory=self.directory)
+        service = self._service(cache)
+        self.assertEqual((['6', '6'], 0), self._gets(service, 6, 6))
+        stats = cache.stats()
+        self.assertEqual((1, 1, 0), (stats.memory_hits, stats.disk_hits, stats.misses))
+        details = service.get(6)
+        self.assertEqual(('memo', 'Success', '12345A'),
+                         (details.memo, details._header.gateway_rsp_msg, details.authorization_code))
+
+    def test_merchants_are_kept_apart(self):
+        self.gateway.handler = _details('C')
+        cache = HpsDetailCache(directory=self.directory)
+        self._gets(self._service(cache), 5)
+
+        other = self._service(cache, secret_api_key='skapi_cert_another_merchant')
+        self.assertEqual((['5'], 1), self._gets(other, 5))
+        self.assertEqual(2, len(set(merchant for _, merchant in self._stored())))
+        self.assertTrue(all('skapi' not in merchant for _, merchant in self._stored()))
+
+    def test_directories_are_private(self):
+        self.gateway.handler = _details('C')
+        directory = os.path.join(self.directory, 'details')
+        self._gets(self._service(HpsDetailCache(directory=directory)), 5)
+
+        for path in [directory] + [os.path.join(directory, name) for name in os.listdir(directory)]:
+            self.assertEqual(0700, stat.S_IMODE(os.stat(path).st_mode))
+
+    def test_compact_and_lazy_details_on_disk(self):
+        self.gateway.handler = _details('C')
+        for name, entity_type in (('compact_entities', HpsSlottedReportTransactionDetails),
+                                  ('lazy_entities', HpsLazyReportTransactionDetails)):
+            self._gets(self._service(HpsDetailCache(directory=self.directory), **{name: True}), 8)
+            details = self._service(HpsDetailCache(directory=self.directory)).get(8)
+            self.assertIsInstance(details, entity_type)
+            self.assertEqual(('8', 'memo', '12345A'),
+                             (details.reference_number, details.memo, details.authorization_code))
+            [(name, merchant)] = self._stored()
+            os.remove(os.path.join(self.directory, merchant, name))
+
+    def test_damaged_file_is_a_miss(self):
+        self.gateway.handler = _details('C')
+        cache = HpsDetailCache(directory=self.directory)
+        self._gets(self._service(cache), 5)
+        [(name, merchant)] = self._stored()
+
+        for content in ('{"type": "HpsRe', '{"type": "HpsTokenData", "header": null, "fields": {}}'):
+            with open(os.path.join(self.directory, merchant, name), 'wb') as stored:
+                stored.write(content)
+            self.assertEqual((['5'], 1), self._gets(self._service(HpsDetailCache(directory=self.directory)), 5))
+
+    def test_invalidated_by_changes(self):
+        self.gateway.handler = _details('C')
+        cache = HpsDetailCache(directory=self.directory)
+        service = self._service(cache)
+
+        for change in (lambda: service.void(5),
+                       lambda: service.edit(5, 12),
+                       lambda: service.reverse(5, 10, 'usd'),
+                       lambda: service.refund(10, 'usd', 5),
+                       lambda: service.additional_auth(2, 5)):
+            self._gets(service, 5)
+            change()
+            self.assertEqual([], self._stored())
+            self.assertEqual((['5'], 1), self._gets(service, 5))
+            cache.invalidate(5)
+
+        # capture gets the details again once it has changed them
+        self._gets(service, 5)
+        requests = len(self.gateway.requests)
+        self.assertEqual('5', service.capture(5).reference_number)
+        self.assertEqual(requests + 2, len(self.gateway.requests))
+        self.assertEqual((['5'], 0), self._gets(service, 5))
+
+    def test_invalidated_after_failure(self):
+        cache = HpsDetailCache()
+        service = self._service(cache)
+        self._gets(service, 5)
+
+        self.gateway.handler = lambda tag, body: pos_response(tag, gateway_rsp_code='5', gateway_rsp_msg='Error')
+        self.assertRaises(Exception, service.void, 5)
+        self.gateway.handler = _details()
+        self.assertEqual((['5'], 1), self._gets(service, 5))
+
+    def test_raw_responses_skip_the_cache(self):
+        cache = HpsDetailCache()
+        self._gets(self._service(cache), 5)
+
+        service = self._service(cache, raw_responses=True)
+        requests = len(self.gateway.requests)
+        self.assertIsInstance(service.get(5), HpsRawResponse)
+        self.assertIsInstance(service.get(6), HpsRawResponse)
+        self.assertEqual(requests + 2, len(self.gateway.requests))
+        self.assertEqual((['5'], 0), self._gets(self._service(cache), 5))
+        self.assertIsNone(cache.get(6))
+
+    def test_get_many(self):
+        cache = HpsDetailCache()
+        service = self._service(cache)
+        self._gets(service, 5)
+
+        requests = len(self.gateway.requests)
+        results = service.get_many([5, 6, 7])
+        self.assertEqual(['5', '6', '7'], [result.get().reference_number for result in results.values()])
+        self.assertEqual(requests + 2, len(self.gateway.requests))
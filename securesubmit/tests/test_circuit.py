@@ -0,0 +1,111 @@
+import time
+import unittest
+
+from securesubmit.infrastructure import HpsCircuitOpenException
+from securesubmit.infrastructure.enums import HpsCircuitState
+from securesubmit.services.circuit import (
+    HpsCircuitBreaker,
+    HpsCircuitBreakerPolicy,
+    get_circuit_breaker,
+    reset_circuit_breakers)
+from securesubmit.services.gateway import HpsCreditService, HpsExceptionCodes
+from securesubmit.tests.stub_gateway import StubGateway, approval, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = HpsCircuitBreaker(HpsCircuitBreakerPolicy(failure_threshold=3))
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(HpsCircuitState.closed, breaker.state)
+
+        breaker.before_call()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(HpsCircuitState.closed, breaker.state)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(HpsCircuitState.open, breaker.state)
+        with self.assertRaises(HpsCircuitOpenException) as context:
+            breaker.before_call()
+        self.assertEqual(HpsExceptionCodes.circuit_open, context.exception.code)
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = HpsCircuitBreaker(HpsCircuitBreakerPolicy(failure_threshold=2, slow_call_threshold=0.5))
+        breaker.record_success(0.1)
+        breaker.record_success(1.0)
+        breaker.record_success(1.0)
+        self.assertEqual(HpsCircuitState.open, breaker.state)
+
+    def test_half_open_probe(self):
+        breaker = HpsCircuitBreaker(HpsCircuitBreakerPolicy(failure_threshold=1, reset_timeout=0.05))
+        breaker.record_failure()
+        self.assertRaises(HpsCircuitOpenException, breaker.before_call)
+
+        time.sleep(0.06)
+        self.assertEqual(HpsCircuitState.half_open, breaker.state)
+        breaker.before_call()
+        self.assertRaises(HpsCircuitOpenException, breaker.before_call)
+
+        breaker.record_failure()
+        self.assertEqual(HpsCircuitState.open, breaker.state)
+
+        time.sleep(0.06)
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(HpsCircuitState.closed, breaker.state)
+        breaker.before_call()
+
+    def test_breakers_are_shared_per_endpoint(self):
+        policy = HpsCircuitBreakerPolicy()
+        self.assertIs(get_circuit_breaker('https://a/', policy),
+                      get_circuit_breaker('https://a/', HpsCircuitBreakerPolicy()))
+        self.assertIsNot(get_circuit_breaker('https://a/', policy),
+                         get_circuit_breaker('https://b/', policy))
+
+
+class CircuitBreakerServiceTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        del self.gateway.requests[:]
+        reset_circuit_breakers()
+        self.config = stub_config()
+        self.config.circuit_breaker = HpsCircuitBreakerPolicy(failure_threshold=2, reset_timeout=60)
+
+    def tearDown(self):
+        self.gateway.handler = approval
+        reset_circuit_breakers()
+
+    def test_failing_endpoint_fails_fast_for_every_service(self):
+        self.gateway.handler = lambda tag, body: (503, 'Service Unavailable')
+        first = stubbed(HpsCreditService, self.gateway)(self.config)
+        for _ in range(2):
+            self.assertRaises(Exception, first.charge, 10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(2, len(self.gateway.requests))
+
+        self.gateway.handler = approval
+        second = stubbed(HpsCreditService, self.gateway)(self.config)
+        with self.assertRaises(HpsCircuitOpenException) as context:
+            second.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(self.gateway.url, context.exception.endpoint)
+        self.assertGreater(context.exception.retry_after, 0)
+        self.assertEqual(2, len(self.gateway.requests))
+
+    def test_successful_calls_keep_circuit_closed(self):
+        service = stubbed(HpsCreditService, self.gateway)(self.config)
+        for _ in range(3):
+            self.assertEqual('00', service.charge(10, 'usd', TestCreditCard.valid_visa).response_code)
+        self.assertEqual(HpsCircuitState.closed,
+                         get_circuit_breaker(self.gateway.url, self.config.circuit_breaker).state)
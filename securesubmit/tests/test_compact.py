@@ -0,0 +1,140 @@
+import copy
+import datetime
+import gc
+import pickle
+import unittest
+
+from securesubmit.entities.compact import (
+    HpsSlottedPayPlanCustomer,
+    HpsSlottedPayPlanCustomerCollection,
+    HpsSlottedPayPlanSchedule,
+    HpsSlottedReportTransactionDetails,
+    HpsSlottedReportTransactionSummary,
+    HpsSlottedTransactionHeader,
+    SLOTTED_TYPES,
+    compact_type)
+from securesubmit.entities.credit import HpsReportTransactionDetails, HpsReportTransactionSummary
+from securesubmit.entities.payplan import HpsPayPlanCustomer, HpsPayPlanCustomerCollection, HpsPayPlanSchedule
+from securesubmit.services import xmlbackend
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, stub_config, stubbed
+
+_customers = {
+    'offset': 0, 'limit': 2, 'total': 2,
+    'results': [
+        {'customerKey': '1', 'customerIdentifier': 'a', 'firstName': 'Bill', 'lastName': 'Johnson',
+         'schedules': [{'scheduleKey': '10', 'scheduleStarted': 'true'}]},
+        {'customerKey': '2', 'customerIdentifier': 'b', 'firstName': 'Jane', 'city': 'Jeffersonville'},
+    ]}
+
+
+def _rsp(raw_response):
+    return xmlbackend.backend.parse(raw_response)['Envelope']['Body']['PosResponse']['Ver1.0']
+
+
+def _has_dict(entity):
+    """Whether `entity` allocated an instance dict. Reading __dict__
+    would create one, so look at what the collector sees instead."""
+    return any(isinstance(referent, dict) for referent in gc.get_referents(entity))
+
+
+def _state(entity):
+    return dict((name, getattr(entity, name)) for name in dir(entity)
+                if not name.startswith('__') and not callable(getattr(entity, name)))
+
+
+class SlottedEntityTests(unittest.TestCase):
+    def test_same_attributes_and_defaults(self):
+        for entity_type, slotted_type in SLOTTED_TYPES.items():
+            self.assertTrue(issubclass(slotted_type, entity_type))
+            regular, slotted = entity_type(), slotted_type()
+            self.assertFalse(_has_dict(slotted))
+            for name, value in _state(regular).items():
+                if name not in ('_field_map', '_detail_field_map', '_header_type', '_result_type'):
+                    self.assertEqual(value, getattr(slotted, name), name)
+
+    def test_report_summary(self):
+        rsp = _rsp(sample_responses.REPORT_ACTIVITY)
+        regular = HpsReportTransactionSummary.from_dict(rsp, None)
+        slotted = HpsSlottedReportTransactionSummary.from_dict(rsp, None)
+
+        self.assertEqual(len(regular), len(slotted))
+        # the rows share one header, and dir() gives it a __dict__
+        for transaction in slotted:
+            self.assertIsInstance(transaction, HpsReportTransactionSummary)
+            self.assertIsInstance(transaction._header, HpsSlottedTransactionHeader)
+            self.assertIs(slotted[0]._header, transaction._header)
+            self.assertFalse(_has_dict(transaction))
+            self.assertFalse(_has_dict(transaction._header))
+        for expected, transaction in zip(regular, slotted):
+            self.assertEqual(_state(expected._header), _state(transaction._header))
+            self.assertEqual(
+                dict((k, v) for k, v in _state(expected).items() if k != '_header'),
+                dict((k, v) for k, v in _state(transaction).items() if k != '_header'))
+        self.assertEqual(datetime.datetime(2016, 1, 1, 12, 0, 0, 123000), slotted[0].transaction_utc_date)
+
+    def test_report_details(self):
+        details = HpsSlottedReportTransactionDetails.from_dict(_rsp(sample_responses.REPORT_TXN_DETAIL))
+        self.assertFalse(_has_dict(details))
+        self.assertEqual(('memo', 'INV-1', '42'), (details.memo, details.invoice_number, details.customer_id))
+        self.assertEqual('Success', details.token_data.token_rsp_msg)
+
+    def test_customer_collection(self):
+        regular = HpsPayPlanCustomerCollection.from_dict(_customers)
+        slotted = HpsSlottedPayPlanCustomerCollection.from_dict(_customers)
+
+        self.assertEqual((0, 2, 2), (slotted.offset, slotted.limit, slotted.total))
+        for expected, customer in zip(regular.results, slotted.results):
+            self.assertIsInstance(customer, HpsSlottedPayPlanCustomer)
+            self.assertFalse(_has_dict(customer))
+            self.assertEqual(expected.get_json_data(), customer.get_json_data())
+        self.assertEqual('10', slotted.results[0].schedules[0].schedule_key)
+
+    def test_schedule_json_data(self):
+        rsp = {'scheduleKey': '10', 'scheduleIdentifier': 'weekly', 'scheduleStarted': False}
+        self.assertEqual(HpsPayPlanSchedule.from_dict(rsp).get_json_data(),
+                         HpsSlottedPayPlanSchedule.from_dict(rsp).get_json_data())
+
+    def test_undeclared_attribute(self):
+        customer = HpsSlottedPayPlanCustomer()
+        customer.nickname = 'Bill'
+        self.assertEqual('Bill', customer.nickname)
+
+    def test_pickle_and_copy(self):
+        customer = HpsSlottedPayPlanCustomer.from_dict(_customers['results'][1])
+        customer.nickname = 'Jane'
+        for clone in (pickle.loads(pickle.dumps(customer, 2)), pickle.loads(pickle.dumps(customer)),
+                      copy.copy(customer), copy.deepcopy(customer)):
+            self.assertIsInstance(clone, HpsSlottedPayPlanCustomer)
+            self.assertEqual(('2', 'Jane', 'Jeffersonville', 'Jane'), (
+                clone.customer_key, clone.first_name, clone.city, clone.nickname))
+
+    def test_compact_type(self):
+        self.assertIs(HpsSlottedPayPlanCustomer, compact_type(HpsPayPlanCustomer))
+        self.assertIs(HpsSlottedReportTransactionDetails, compact_type(HpsReportTransactionDetails))
+        self.assertIs(int, compact_type(int))
+
+
+class CompactServiceTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway(lambda tag, body: sample_responses.REPORT_ACTIVITY).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def _service(self, compact_entities):
+        config = stub_config()
+        config.compact_entities = compact_entities
+        return stubbed(HpsCreditService, self.gateway)(config)
+
+    def test_list(self):
+        regular = self._service(False).list()
+        self.assertIs(HpsReportTransactionSummary, type(regular[0]))
+
+        slotted = self._service(True).list()
+        self.assertEqual(len(regular), len(slotted))
+        self.assertIs(HpsSlottedReportTransactionSummary, type(slotted[0]))
+        self.assertEqual(regular[0].amount, slotted[0].amount)
@@ -0,0 +1,78 @@
+import unittest
+
+from securesubmit.services import HpsPayPlanServiceConfig
+from securesubmit.services.gateway import HpsCreditService, HpsRestGatewayService
+from securesubmit.services.raw import HpsRawResponse
+from securesubmit.services.transport import HpsHttpTransport, get_transport
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, approval, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+class CompressedResponseTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway(compress=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _service(self, compress=True, **settings):
+        config = stub_config()
+        config.compress_responses = compress
+        for name, value in settings.items():
+            setattr(config, name, value)
+        return stubbed(HpsCreditService, self.gateway)(config)
+
+    def test_report_is_streamed_into_the_parser(self):
+        self.gateway.handler = lambda tag, body: sample_responses.REPORT_ACTIVITY
+        service = self._service()
+        received, decoded = get_transport(service._config).byte_counts(self.gateway.url)
+
+        self.assertEqual(50, len(service.list()))
+        self.assertEqual('gzip, deflate', self.gateway.headers[-1].getheader('accept-encoding'))
+
+        now_received, now_decoded = get_transport(service._config).byte_counts(self.gateway.url)
+        self.assertEqual(len(sample_responses.REPORT_ACTIVITY), now_decoded - decoded)
+        self.assertLess((now_received - received) * 5, now_decoded - decoded)
+
+    def test_entity_and_raw_paths(self):
+        self.assertEqual('12345A', self._service().charge(10, 'usd', TestCreditCard.valid_visa).authorization_code)
+
+        charge = self._service(raw_responses=True).charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertIsInstance(charge, HpsRawResponse)
+        self.assertEqual('12345A', charge['AuthCode'])
+
+    def test_not_asked_for_by_default(self):
+        self.assertEqual('00', self._service(False).charge(10, 'usd', TestCreditCard.valid_visa).response_code)
+        self.assertNotIn('gzip', self.gateway.headers[-1].getheader('accept-encoding') or '')
+
+    def test_abandoned_stream_does_not_poison_the_pool(self):
+        self.gateway.handler = lambda tag, body: sample_responses.REPORT_ACTIVITY.replace('</Details>', '</Detail>')
+        service = self._service()
+        self.assertRaises(Exception, service.list)
+
+        self.gateway.handler = approval
+        self.assertEqual('00', service.charge(10, 'usd', TestCreditCard.valid_visa).response_code)
+
+    def test_transport_counts_uncompressed_bytes(self):
+        transport = HpsHttpTransport()
+        response = transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+        self.assertEqual((len(response.data), len(response.data)), transport.byte_counts(self.gateway.url))
+
+    def test_rest_service(self):
+        self.gateway.handler = lambda tag, body: '{"customers": []}'
+        config = HpsPayPlanServiceConfig()
+        config.secret_api_key = 'skapi_cert_MTyMAQBiHVEAewvIzXVFcmUd2UcyBge_eCpaASUp0A'
+        config.compress_responses = True
+        service = HpsRestGatewayService(config)
+        service._url = self.gateway.url
+
+        self.assertEqual('{"customers": []}', service.do_request('POST', '', {}))
+        self.assertEqual('gzip, deflate', self.gateway.headers[-1].getheader('accept-encoding'))
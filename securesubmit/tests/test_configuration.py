@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from securesubmit.infrastructure import HpsConfigurationLoader
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.tests.stub_gateway import stub_config
+
+_settings = """[Settings]
+secretApiKey = {0}
+licenseId = 1
+siteId = 2
+deviceId = 3
+userName = user
+password = pass
+siteTrace = trace
+developerId = 000000
+versionNbr = 0000
+URL = https://localhost/
+"""
+
+
+class ConfigurationLoaderTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'config.cfg')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, secret_api_key, mtime=None):
+        with open(self.filename, 'w') as config_file:
+            config_file.write(_settings.format(secret_api_key))
+        if mtime is not None:
+            os.utime(self.filename, (mtime, mtime))
+
+    def test_file_is_parsed_once(self):
+        self._write('skapi_cert_one')
+        loader = HpsConfigurationLoader(self.filename, check_interval=0)
+
+        configuration = loader.get()
+        self.assertEqual('skapi_cert_one', configuration.secret_api_key)
+        self.assertIs(configuration, loader.get())
+
+    def test_changed_file_is_reloaded(self):
+        self._write('skapi_cert_one', mtime=1000000000)
+        loader = HpsConfigurationLoader(self.filename, check_interval=0)
+        self.assertEqual('skapi_cert_one', loader.get().secret_api_key)
+
+        self._write('skapi_cert_two', mtime=1000000100)
+        self.assertEqual('skapi_cert_two', loader.get().secret_api_key)
+
+    def test_check_interval_and_invalidate(self):
+        self._write('skapi_cert_one', mtime=1000000000)
+        loader = HpsConfigurationLoader(self.filename, check_interval=60)
+        first = loader.get()
+
+        self._write('skapi_cert_two', mtime=1000000100)
+        self.assertIs(first, loader.get())
+
+        loader.invalidate()
+        self.assertEqual('skapi_cert_two', loader.get().secret_api_key)
+
+    def test_missing_file_gives_defaults(self):
+        loader = HpsConfigurationLoader(self.filename, check_interval=0)
+        self.assertIsNone(loader.get().secret_api_key)
+        self.assertEqual(-1, loader.get().license_id)
+
+    def test_explicit_config_skips_the_file(self):
+        service = HpsCreditService(stub_config())
+        self.assertIsNone(service._base_config)
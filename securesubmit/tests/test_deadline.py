@@ -0,0 +1,130 @@
+import threading
+import time
+import unittest
+
+from securesubmit.services.gateway import (
+    HpsCreditService,
+    HpsCreditException,
+    HpsGatewayException,
+    HpsExceptionCodes)
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+class DeadlineTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.service = stubbed(HpsCreditService, self.gateway)(stub_config())
+        del self.gateway.requests[:]
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def test_call_within_deadline(self):
+        with self.service.deadline(5):
+            response = self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual('00', response.response_code)
+
+    def test_slow_gateway_exceeds_deadline(self):
+        def slow(tag, body):
+            time.sleep(1)
+            return approval(tag, body)
+        self.gateway.handler = slow
+
+        started = time.time()
+        with self.assertRaises(HpsGatewayException) as context:
+            with self.service.deadline(0.2):
+                self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+
+        self.assertEqual(HpsExceptionCodes.deadline_exceeded, context.exception.code)
+        self.assertLess(time.time() - started, 0.9)
+
+    def test_expired_deadline_sends_nothing(self):
+        with self.assertRaises(HpsGatewayException) as context:
+            with self.service.deadline(0):
+                self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+
+        self.assertEqual(HpsExceptionCodes.deadline_exceeded, context.exception.code)
+        self.assertEqual(0, len(self.gateway.requests))
+
+    def test_reversal_shares_the_remaining_budget(self):
+        def issuer_timeout(tag, body):
+            if tag == 'CreditSale':
+                time.sleep(0.2)
+                return pos_response(tag, '<RspCode>91</RspCode><RspText>ISSUER TIMEOUT</RspText>')
+            time.sleep(1)
+            return pos_response(tag)
+        self.gateway.handler = issuer_timeout
+
+        started = time.time()
+        with self.assertRaises(HpsCreditException) as context:
+            with self.service.deadline(0.5):
+                self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+
+        self.assertEqual(HpsExceptionCodes.issuer_timeout_reversal_error, context.exception.code)
+        self.assertLess(time.time() - started, 0.9)
+        self.assertIn('<CreditReversal>', self.gateway.requests[-1])
+
+    def test_gateway_timeout_reverses_the_charge(self):
+        def gateway_timeout(tag, body):
+            if tag == 'CreditReversal':
+                return pos_response(tag)
+            return pos_response(tag, gateway_rsp_code='30', gateway_rsp_msg='Timeout')
+        self.gateway.handler = gateway_timeout
+
+        with self.assertRaises(HpsGatewayException):
+            with self.service.deadline(5):
+                self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(2, len(self.gateway.requests))
+        self.assertIn('<CreditReversal>', self.gateway.requests[-1])
+
+        # nothing is reversed for a call with no amount
+        with self.assertRaises(HpsGatewayException):
+            with self.service.deadline(5):
+                self.service.capture(5)
+        self.assertEqual(3, len(self.gateway.requests))
+
+    def test_nested_deadline_cannot_extend_budget(self):
+        with self.service.deadline(1) as outer:
+            with self.service.deadline(10) as inner:
+                self.assertIs(outer, inner)
+        self.assertIsNone(self.service._deadline)
+
+    def test_deadline_belongs_to_its_thread(self):
+        entered = threading.Event()
+        leave = threading.Event()
+
+        def hold():
+            with self.service.deadline(0):
+                entered.set()
+                leave.wait(5)
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait(5)
+        try:
+            self.assertIsNone(self.service._deadline)
+            self.assertEqual('00', self.service.charge(10, 'usd', TestCreditCard.valid_visa).response_code)
+        finally:
+            leave.set()
+            holder.join()
+
+    def test_submit_many_runs_under_the_deadline(self):
+        def slow(tag, body):
+            time.sleep(1)
+            return approval(tag, body)
+        self.gateway.handler = slow
+
+        started = time.time()
+        with self.service.deadline(0.2):
+            results = self.service.submit_many([('charge', (10, 'usd', TestCreditCard.valid_visa))] * 2)
+        self.assertEqual([HpsExceptionCodes.deadline_exceeded] * 2, [result.exception.code for result in results])
+        self.assertLess(time.time() - started, 0.9)
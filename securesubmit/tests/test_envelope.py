@@ -0,0 +1,117 @@
+import gc
+import unittest
+import weakref
+import xml.etree.cElementTree as Et
+
+from securesubmit.services import gateway, xmlbackend
+from securesubmit.services.gateway import HpsCreditService, HpsTransactionDetails
+from securesubmit.tests.stub_gateway import StubGateway, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+def _reference_envelope(config, transaction, client_transaction_id=None):
+    """The request as it was built before the envelope was cached."""
+    envelope = Et.Element("soap:Envelope")
+    envelope.set("xmlns:soap", "http://schemas.xmlsoap.org/soap/envelope/")
+    envelope.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+    envelope.set("xmlns:xsd", "http://www.w3.org/2001/XMLSchema")
+    body = Et.SubElement(envelope, "soap:Body")
+    request = Et.SubElement(body, "PosRequest")
+    request.set("xmlns", "http://Hps.Exchange.PosGateway")
+    version1 = Et.SubElement(request, "Ver1.0")
+
+    header = Et.SubElement(version1, "Header")
+    if config.secret_api_key:
+        Et.SubElement(header, "SecretAPIKey").text = config.secret_api_key.strip()
+    else:
+        Et.SubElement(header, 'SiteId').text = str(config.site_id)
+        Et.SubElement(header, 'DeviceId').text = str(config.device_id)
+        Et.SubElement(header, 'LicenseId').text = str(config.license_id)
+        Et.SubElement(header, 'UserName').text = config.username
+        Et.SubElement(header, 'Password').text = config.password
+    if config.developer_id:
+        Et.SubElement(header, 'DeveloperID').text = config.developer_id
+    if config.version_number:
+        Et.SubElement(header, 'VersionNbr').text = config.version_number
+    if client_transaction_id is not None:
+        Et.SubElement(header, 'ClientTxnId').text = client_transaction_id
+
+    Et.SubElement(version1, "Transaction").append(Et.fromstring(xmlbackend.etree.tostring(transaction)))
+    return Et.tostring(envelope).encode('utf-8')
+
+
+class EnvelopeTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        del self.gateway.requests[:]
+
+    def _transaction(self):
+        etree = xmlbackend.etree
+        transaction = etree.Element('CreditSale')
+        block1 = etree.SubElement(transaction, 'Block1')
+        etree.SubElement(block1, 'Amt').text = '10'
+        etree.SubElement(block1, 'CardHolderData').text = u'J\xfcrgen & <Sons>'
+        return transaction
+
+    def test_secret_api_key_envelope_is_unchanged(self):
+        config = stub_config()
+        config.developer_id = '002914'
+        config.version_number = '1510'
+        service = stubbed(HpsCreditService, self.gateway)(config)
+
+        for client_transaction_id in (None, '12345', '12346'):
+            service.do_transaction(self._transaction(), client_transaction_id)
+            self.assertEqual(_reference_envelope(config, self._transaction(), client_transaction_id),
+                             self.gateway.requests[-1])
+
+    def test_credential_envelope_is_unchanged(self):
+        config = stub_config()
+        config.secret_api_key = None
+        config.site_id = 1
+        config.device_id = 2
+        config.license_id = 3
+        config.username = 'user'
+        config.password = 'p&ss'
+        service = stubbed(HpsCreditService, self.gateway)(config)
+
+        service.do_transaction(self._transaction(), '777')
+        self.assertEqual(_reference_envelope(config, self._transaction(), '777'),
+                         self.gateway.requests[-1])
+
+    def test_header_follows_config_changes(self):
+        config = stub_config()
+        service = stubbed(HpsCreditService, self.gateway)(config)
+        details = HpsTransactionDetails()
+        details.client_transaction_id = '42'
+
+        service.charge(10, 'usd', TestCreditCard.valid_visa, details=details)
+        config.developer_id = '123456'
+        service.charge(10, 'usd', TestCreditCard.valid_visa, details=details)
+
+        self.assertNotIn('<DeveloperID>', self.gateway.requests[0])
+        self.assertIn('<DeveloperID>123456</DeveloperID><ClientTxnId>42</ClientTxnId></Header>',
+                      self.gateway.requests[1])
+
+    def test_one_envelope_per_config(self):
+        configs = [stub_config() for _ in range(3)]
+        configs[1].secret_api_key = 'skapi_cert_another_merchant'
+        for config in configs:
+            stubbed(HpsCreditService, self.gateway)(config).charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertIn('<SecretAPIKey>skapi_cert_another_merchant</SecretAPIKey>', self.gateway.requests[1])
+        self.assertTrue(all(config in gateway._envelopes for config in configs))
+
+        # the cache keeps no config alive, and drops a config's envelope
+        # with it
+        references = [weakref.ref(config) for config in configs]
+        del configs[:], config
+        gc.collect()
+        self.assertEqual([None] * 3, [reference() for reference in references])
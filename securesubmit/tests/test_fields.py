@@ -0,0 +1,150 @@
+import datetime
+import unittest
+
+from securesubmit.entities import HpsTransaction
+from securesubmit.entities.check import HpsCheckResponse
+from securesubmit.entities.credit import HpsCharge, HpsReportTransactionDetails, HpsReportTransactionSummary, \
+    HpsReversal
+from securesubmit.entities.debit import HpsDebitAuthorization
+from securesubmit.entities.fields import HpsField, HpsFieldMap
+from securesubmit.entities.gift import HpsGiftCardAlias, HpsGiftCardSale
+from securesubmit.infrastructure.enums import HpsTransactionType
+from securesubmit.services import xmlbackend
+from securesubmit.tests import sample_responses
+
+
+class _Entity(object):
+    code = 'class'
+    text = 'class'
+    amount = None
+
+
+def _rsp(raw_response):
+    return xmlbackend.backend.parse(raw_response)['Envelope']['Body']['PosResponse']['Ver1.0']
+
+
+class FieldMapTests(unittest.TestCase):
+    def test_missing_keys(self):
+        field_map = HpsFieldMap(HpsField('Code', 'code'), HpsField('Text', 'text', default=None))
+
+        entity = _Entity()
+        field_map.hydrate(entity, {'Other': '1'})
+        self.assertEqual('class', entity.code)
+        self.assertIsNone(entity.text)
+
+        field_map.hydrate(entity, {'Code': '00', 'Text': 'APPROVAL'})
+        self.assertEqual(('00', 'APPROVAL'), (entity.code, entity.text))
+
+    def test_converter_and_nested_path(self):
+        field_map = HpsFieldMap(
+            HpsField(('Data', 'Amt'), 'amount', float),
+            HpsField(('Data', 'Fields', 'Code'), 'code'),
+            HpsField('Code', 'code'))
+
+        entity = _Entity()
+        field_map.hydrate(entity, {'Code': 'top', 'Data': {'Amt': '10.50', 'Fields': {'Code': 'nested'}}})
+        self.assertEqual(10.5, entity.amount)
+        self.assertEqual('nested', entity.code)
+
+    def test_source_that_is_not_a_dict(self):
+        field_map = HpsFieldMap(HpsField(('Data', 'Code'), 'code', default='none'), HpsField('Text', 'text'))
+
+        for source in (None, u'text', {'Data': None}):
+            entity = _Entity()
+            field_map.hydrate(entity, source)
+            self.assertEqual(('none', 'class'), (entity.code, entity.text))
+
+    def test_extend(self):
+        base = HpsFieldMap(HpsField('Code', 'code'))
+        extended = base.extend(HpsField('Code', 'text'), HpsField('Amt', 'amount', int))
+
+        entity = _Entity()
+        base.hydrate(entity, {'Code': '00', 'Amt': '5'})
+        self.assertEqual(('00', 'class', None), (entity.code, entity.text, entity.amount))
+
+        extended.hydrate(entity, {'Code': '05', 'Amt': '5'})
+        self.assertEqual(('05', '05', 5), (entity.code, entity.text, entity.amount))
+        self.assertEqual({'Code': 'text'}, extended.attributes())
+
+
+class EntityHydrationTests(unittest.TestCase):
+    def test_charge(self):
+        charge = HpsCharge.from_dict(_rsp(sample_responses.CREDIT_SALE))
+        self.assertEqual(1000, charge.transaction_id)
+        self.assertEqual('42', charge.client_transaction_id)
+        self.assertEqual(('00', 'APPROVAL', '123'), (charge.response_code, charge.response_text,
+                                                     charge.reference_number))
+        self.assertEqual(('12345A', '10.00', 'Visa', 'desc', 'B'), (
+            charge.authorization_code, charge.authorized_amount, charge.card_type, charge.descriptor,
+            charge.cpc_indicator))
+        self.assertEqual(('0', 'AVS Not Requested.', 'M', 'Match.'), (
+            charge.avs_result_code, charge.avs_result_text, charge.cvv_result_code, charge.cvv_result_text))
+        self.assertEqual('supt_abc', charge.token_data.token_value)
+
+    def test_empty_transaction(self):
+        charge = HpsCharge.from_dict(_rsp(sample_responses.pos_response('CreditSale')))
+        self.assertIsNone(charge.response_code)
+        self.assertIsNone(charge.authorization_code)
+
+    def test_reversal_and_debit(self):
+        reversal = HpsReversal.from_dict(_rsp(sample_responses.CREDIT_REVERSAL))
+        self.assertEqual(('0', 'M', '124'), (reversal.avs_result_code, reversal.cvv_result_code,
+                                             reversal.reference_number))
+        self.assertIsNone(reversal.cvv_result_text)
+
+        debit = HpsDebitAuthorization.from_dict(_rsp(sample_responses.DEBIT_SALE))
+        self.assertEqual(('43210B', '90.00', '10.00'), (debit.authorization_code, debit.available_balance,
+                                                        debit.authorized_amount))
+
+    def test_report_transaction_details(self):
+        details = HpsReportTransactionDetails.from_dict(_rsp(sample_responses.REPORT_TXN_DETAIL))
+        self.assertEqual('999', details.original_transaction_id)
+        self.assertEqual(HpsTransactionType.Charge, details.transaction_type)
+        self.assertEqual(('10.00', '411111******1111', 'A', '125'), (
+            details.settlement_amount, details.masked_card_number, details.transaction_status,
+            details.reference_number))
+        self.assertEqual(('memo', 'INV-1', '42'), (details.memo, details.invoice_number, details.customer_id))
+        self.assertEqual('Success', details.token_data.token_rsp_msg)
+        self.assertIsNone(details.exceptions)
+
+    def test_report_transaction_summary(self):
+        rsp = _rsp(sample_responses.REPORT_ACTIVITY)
+        transactions = HpsReportTransactionSummary.from_dict(rsp, None)
+        self.assertEqual(50, len(transactions))
+        self.assertEqual(HpsTransactionType.Void, transactions[0].transaction_type)
+        self.assertEqual(HpsTransactionType.Charge, transactions[1].transaction_type)
+        self.assertEqual(datetime.datetime(2016, 1, 1, 12, 0, 0, 123000), transactions[0].transaction_utc_date)
+        self.assertEqual(('00', '10.00', None), (transactions[0].response_code, transactions[0].amount,
+                                                 transactions[0].original_transaction_id))
+
+        voids = HpsReportTransactionSummary.from_dict(rsp, HpsTransactionType.Void)
+        self.assertEqual(25, len(voids))
+
+    def test_gift_card_entities(self):
+        sale = HpsGiftCardSale.from_dict(_rsp(sample_responses.GIFT_CARD_SALE))
+        self.assertEqual(('0', 'G1', '90.00', '10.00', '0.00'), (
+            sale.response_code, sale.authorization_code, sale.balance_amount,
+            sale.split_tender_card_amount, sale.split_tender_balance_due))
+        self.assertIsNone(sale.points_balance_amount)
+
+        alias = HpsGiftCardAlias.from_dict(_rsp(sample_responses.GIFT_CARD_ALIAS))
+        self.assertEqual('5022440000000000098', alias.gift_card.card_number)
+        self.assertIsNone(alias.gift_card.pin)
+
+    def test_check_response(self):
+        check = HpsCheckResponse.from_dict(_rsp(sample_responses.CHECK_SALE))
+        self.assertEqual(('0', 'Transaction Approved', 'C1'), (
+            check.response_code, check.response_text, check.authorization_code))
+        self.assertEqual([('Message', '0', None), ('Error', '12', 'Amt')],
+                         [(d.message_type, d.code, d.field_name) for d in check.details])
+
+        single = sample_responses.CHECK_SALE.replace('<CheckRspInfo><Type>Error', '<Other><Type>Error')
+        single = single.replace('</FieldName></CheckRspInfo>', '</FieldName></Other>')
+        self.assertEqual(1, len(HpsCheckResponse.from_dict(_rsp(single)).details))
+
+    def test_service_names(self):
+        for transaction_type in HpsTransactionType:
+            service_name = HpsTransaction._transaction_type_to_service_name(transaction_type)
+            self.assertIs(transaction_type, HpsTransaction._service_name_to_transaction_type(service_name))
+        self.assertEqual('', HpsTransaction._transaction_type_to_service_name(None))
+        self.assertIsNone(HpsTransaction._service_name_to_transaction_type('Unknown'))
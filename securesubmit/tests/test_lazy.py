@@ -0,0 +1,210 @@
+import copy
+import pickle
+import re
+import unittest
+
+from securesubmit.entities.compact import HpsSlottedReportTransactionDetails
+from securesubmit.entities.credit import HpsCharge, HpsReportTransactionDetails, HpsReportTransactionSummary
+from securesubmit.entities.fields import HpsField, HpsFieldMap, HpsLazyFieldMap
+from securesubmit.entities.lazy import (
+    HpsDeferredReportTransactionDetails,
+    HpsLazyCharge,
+    HpsLazyReportTransactionDetails,
+    HpsLazyReportTransactionSummary,
+    LAZY_TYPES,
+    lazy_type)
+from securesubmit.infrastructure import HpsGatewayException
+from securesubmit.infrastructure.enums import HpsTransactionType
+from securesubmit.services import xmlbackend
+from securesubmit.services.gateway import HpsCreditService, _configured_entity_type
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+
+
+def _rsp(raw_response):
+    return xmlbackend.backend.parse(raw_response)['Envelope']['Body']['PosResponse']['Ver1.0']
+
+
+def _state(entity):
+    state = {}
+    for name in dir(entity):
+        value = getattr(entity, name)
+        if name.startswith('__') or callable(value) or name in ('_lazy_stages', '_field_map', '_detail_field_map'):
+            continue
+        if name in ('_header', 'token_data', 'exceptions') and value is not None:
+            value = _state(value)
+        state[name] = value
+    return state
+
+
+class _Entity(object):
+    code = 'class'
+    text = 'class'
+
+
+class LazyFieldMapTests(unittest.TestCase):
+    def test_prior_values(self):
+        field_map = HpsFieldMap(HpsField('Code', 'code'), HpsField('Text', 'text', default=None))
+        entity_type = type('_LazyEntity', (_Entity,), HpsLazyFieldMap(field_map).descriptors(_Entity))
+        lazy_map = HpsLazyFieldMap(field_map)
+
+        entity = entity_type()
+        entity.code = 'set'
+        entity.text = 'set'
+        lazy_map.hydrate(entity, {'Other': '1'})
+        self.assertEqual(('set', None), (entity.code, entity.text))
+
+        entity = entity_type()
+        lazy_map.hydrate(entity, {'Code': '00'})
+        lazy_map.hydrate(entity, {'Text': 'APPROVAL'})
+        self.assertEqual(('00', 'APPROVAL'), (entity.code, entity.text))
+        self.assertEqual('class', entity_type.code)
+
+
+class LazyEntityTests(unittest.TestCase):
+    def test_matches_eager_hydration(self):
+        for entity_type, raw_response in ((HpsCharge, sample_responses.CREDIT_SALE),
+                                          (HpsCharge, sample_responses.pos_response('CreditSale')),
+                                          (HpsReportTransactionDetails, sample_responses.REPORT_TXN_DETAIL)):
+            expected = entity_type.from_dict(_rsp(raw_response))
+            entity = lazy_type(entity_type).from_dict(_rsp(raw_response))
+            self.assertIsInstance(entity, entity_type)
+            self.assertEqual(_state(expected), _state(entity))
+
+    def test_report_summary(self):
+        rsp = _rsp(sample_responses.REPORT_ACTIVITY)
+        for filter_by in (None, HpsTransactionType.Void):
+            expected = HpsReportTransactionSummary.from_dict(rsp, filter_by)
+            transactions = HpsLazyReportTransactionSummary.from_dict(rsp, filter_by)
+            self.assertEqual([_state(t) for t in expected], [_state(t) for t in transactions])
+
+    def test_decoded_on_first_access(self):
+        charge = HpsLazyCharge.from_dict(_rsp(sample_responses.CREDIT_SALE))
+        self.assertNotIn('authorization_code', vars(charge))
+        self.assertEqual(1000, charge.transaction_id)
+
+        self.assertEqual('12345A', charge.authorization_code)
+        self.assertEqual('12345A', vars(charge)['authorization_code'])
+        self.assertNotIn('avs_result_code', vars(charge))
+
+        charge.avs_result_code = 'Y'
+        self.assertEqual('Y', charge.avs_result_code)
+
+    def test_converter_raises_on_access(self):
+        raw_response = sample_responses.REPORT_TXN_DETAIL.replace('<TxnStatus>', '<ReqUtcDT>bad</ReqUtcDT><TxnStatus>')
+        details = HpsLazyReportTransactionDetails.from_dict(_rsp(raw_response))
+        self.assertEqual('memo', details.memo)
+        with self.assertRaises(ValueError):
+            details.transaction_utc_date
+
+    def test_pickle_and_copy(self):
+        expected = _state(HpsCharge.from_dict(_rsp(sample_responses.CREDIT_SALE)))
+        charge = HpsLazyCharge.from_dict(_rsp(sample_responses.CREDIT_SALE))
+        for clone in (pickle.loads(pickle.dumps(charge, 2)), copy.copy(charge), copy.deepcopy(charge)):
+            self.assertIsInstance(clone, HpsLazyCharge)
+            self.assertNotIn('_lazy_stages', vars(clone))
+            self.assertEqual(expected, _state(clone))
+
+    def test_lazy_types(self):
+        for entity_type, lazy in LAZY_TYPES.items():
+            self.assertIs(lazy, lazy_type(entity_type))
+            self.assertTrue(issubclass(lazy, entity_type))
+        self.assertIs(int, lazy_type(int))
+
+    def test_configured_entity_type(self):
+        config = stub_config()
+        self.assertIs(HpsReportTransactionDetails, _configured_entity_type(config, HpsReportTransactionDetails))
+        config.compact_entities = True
+        self.assertIs(HpsSlottedReportTransactionDetails,
+                      _configured_entity_type(config, HpsReportTransactionDetails))
+        config.lazy_entities = True
+        self.assertIs(HpsLazyReportTransactionDetails,
+                      _configured_entity_type(config, HpsReportTransactionDetails))
+
+
+class LazyServiceTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway(lambda tag, body: sample_responses.REPORT_TXN_DETAIL).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def test_get(self):
+        config = stub_config()
+        config.lazy_entities = True
+        details = stubbed(HpsCreditService, self.gateway)(config).get(999)
+        self.assertIs(HpsLazyReportTransactionDetails, type(details))
+        self.assertEqual(('999', '10.00'), (details.original_transaction_id, details.settlement_amount))
+
+
+class DeferredCaptureTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.gateway.handler = lambda tag, body: (sample_responses.REPORT_TXN_DETAIL if tag == 'ReportTxnDetail'
+                                                  else pos_response(tag, gateway_txn_id=2000, client_txn_id='7'))
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _service(self, defer=True, **settings):
+        config = stub_config()
+        config.defer_capture_details = defer
+        for name, value in settings.items():
+            setattr(config, name, value)
+        return stubbed(HpsCreditService, self.gateway)(config)
+
+    def _requests(self):
+        return [re.search(r'<Transaction><(\w+)', body).group(1) for body in self.gateway.requests]
+
+    def test_details_fetched_on_first_read(self):
+        requests = len(self.gateway.requests)
+        details = self._service().capture(999)
+
+        self.assertIsInstance(details, HpsReportTransactionDetails)
+        self.assertFalse(details.details_fetched)
+        self.assertEqual((999, '7', '00', ''), (details.transaction_id, details.client_transaction_id,
+                                                 details.response_code, details.response_text))
+        self.assertEqual('0', details._header.gateway_rsp_code)
+        self.assertEqual(['CreditAddToBatch'], self._requests()[requests:])
+
+        details.memo = 'mine'
+        self.assertEqual(('12345A', '411111******1111'), (details.authorization_code, details.masked_card_number))
+        self.assertEqual(('mine', 'INV-1', 'Success'), (details.memo, details.invoice_number,
+                                                        details.token_data.token_rsp_msg))
+        self.assertTrue(details.details_fetched)
+        self.assertEqual(['CreditAddToBatch', 'ReportTxnDetail'], self._requests()[requests:])
+
+    def test_same_details_as_eager_capture(self):
+        eager = self._service(False).capture(999)
+        deferred = self._service().capture(999)
+        for name in ('authorization_code', 'authorized_amount', 'settlement_amount', 'original_transaction_id',
+                     'transaction_type', 'transaction_utc_date', 'transaction_status', 'customer_id'):
+            self.assertEqual(getattr(eager, name), getattr(deferred, name), name)
+
+        lazy = self._service(lazy_entities=True).capture(999)
+        self.assertEqual(eager.reference_number, lazy.reference_number)
+
+    def test_pickle(self):
+        details = pickle.loads(pickle.dumps(self._service().capture(999), 2))
+        self.assertIs(HpsDeferredReportTransactionDetails, type(details))
+        self.assertTrue(details.details_fetched)
+        self.assertEqual('memo', details.memo)
+
+    def test_fetch_failure_raises_on_read(self):
+        details = self._service().capture(999)
+        self.gateway.handler = lambda tag, body: pos_response(tag, gateway_rsp_code='5', gateway_rsp_msg='Error')
+        with self.assertRaises(HpsGatewayException):
+            details.memo
+        self.assertFalse(details.details_fetched)
+
+        self.setUp()
+        self.assertEqual('memo', details.memo)
@@ -0,0 +1,137 @@
+import unittest
+
+import xmltodict
+
+from securesubmit.entities import HpsTransaction
+from securesubmit.entities.credit import (
+    HpsAccountVerify,
+    HpsAuthorization,
+    HpsCharge,
+    HpsRefund,
+    HpsReversal,
+    HpsVoid)
+from securesubmit.infrastructure import HpsException
+from securesubmit.services.gateway import HpsCreditService, HpsGatewayException, HpsExceptionCodes
+from securesubmit.services.parser import parse_response
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+_namespaces = {"http://Hps.Exchange.PosGateway": None,
+               "http://schemas.xmlsoap.org/soap/envelope/": None}
+
+_token_data = ('<TokenData><TokenRspCode>0</TokenRspCode><TokenRspMsg>Success</TokenRspMsg>'
+               '<TokenValue>supt_abc</TokenValue></TokenData>')
+
+_approval = ('<RspCode>00</RspCode><RspText>APPROVAL</RspText><AuthCode>12345A</AuthCode>'
+             '<AVSRsltCode>0</AVSRsltCode><AVSRsltText>AVS Not Requested.</AVSRsltText>'
+             '<CVVRsltCode>M</CVVRsltCode><CVVRsltText>Match.</CVVRsltText><RefNbr>123</RefNbr>'
+             '<CardType>Visa</CardType><AuthAmt>10.00</AuthAmt><CPCInd> B </CPCInd>'
+             '<TxnDescriptor></TxnDescriptor>')
+
+
+def _state(entity):
+    state = {}
+    for name in dir(entity):
+        value = getattr(entity, name)
+        if name.startswith('__') or callable(value):
+            continue
+        if name in ('_header', 'token_data') and value is not None:
+            value = _state(value)
+        state[name] = value
+    return state
+
+
+def _from_dict(raw_response, entity_type):
+    rsp = xmltodict.parse(raw_response, process_namespaces=True, namespaces=_namespaces)
+    return entity_type.from_dict(rsp['Envelope']['Body']['PosResponse']['Ver1.0'])
+
+
+class ParserTests(unittest.TestCase):
+    def assertSameEntity(self, raw_response, entity_type):
+        parsed = parse_response(raw_response, entity_type).entity
+        self.assertIs(entity_type, type(parsed))
+        self.assertEqual(_state(_from_dict(raw_response, entity_type)), _state(parsed))
+
+    def test_matches_from_dict(self):
+        responses = [
+            pos_response('CreditSale', _approval, client_txn_id='42', header_extra=_token_data),
+            pos_response('CreditSale', _approval),
+            pos_response('CreditSale', '<RspCode>05</RspCode><RspText>DECLINE</RspText>'),
+        ]
+        for raw_response in responses:
+            for entity_type in (HpsTransaction, HpsAuthorization, HpsCharge, HpsAccountVerify,
+                                HpsReversal, HpsRefund, HpsVoid):
+                self.assertSameEntity(raw_response, entity_type)
+
+    def test_response_without_transaction(self):
+        raw_response = pos_response(None, gateway_rsp_code='-2', gateway_rsp_msg='Authentication Error')
+        self.assertSameEntity(raw_response, HpsTransaction)
+
+        response = parse_response(raw_response, HpsCharge)
+        self.assertIsNone(response.transaction_type)
+        self.assertEqual('-2', response.header.gateway_rsp_code)
+        self.assertEqual('-2', response.entity.response_code)
+
+    def test_response_fields(self):
+        response = parse_response(
+            pos_response('CreditSale', _approval, gateway_txn_id=77, header_extra=_token_data), HpsCharge)
+
+        self.assertEqual('CreditSale', response.transaction_type)
+        self.assertEqual('77', response.gateway_txn_id)
+        self.assertEqual('00', response.response_code)
+        self.assertEqual('APPROVAL', response.response_text)
+        self.assertEqual(77, response.entity.transaction_id)
+        self.assertEqual('supt_abc', response.entity.token_data.token_value)
+        self.assertEqual('B', response.entity.cpc_indicator)
+        self.assertIsNone(response.entity.descriptor)
+
+    def test_empty_transaction(self):
+        response = parse_response(pos_response('CreditSale', ''), HpsCharge)
+        self.assertEqual('CreditSale', response.transaction_type)
+        self.assertIsNone(response.entity.response_code)
+
+    def test_other_namespace_prefix(self):
+        raw_response = pos_response('CreditSale', _approval).replace('soap:', 'S:').replace('xmlns:soap', 'xmlns:S')
+        self.assertEqual('12345A', parse_response(raw_response, HpsCharge).entity.authorization_code)
+
+    def test_unexpected_document(self):
+        self.assertRaises(HpsException, parse_response, '<html><body>Bad Gateway</body></html>', HpsCharge)
+
+
+class ParsedResponseServiceTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.service = stubbed(HpsCreditService, self.gateway)(stub_config())
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def test_charge_and_void(self):
+        charge = self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertIsInstance(charge, HpsCharge)
+        self.assertEqual('12345A', charge.authorization_code)
+
+        void = self.service.void(charge.transaction_id)
+        self.assertIsInstance(void, HpsVoid)
+        self.assertEqual('00', void.response_code)
+
+    def test_gateway_error(self):
+        self.gateway.handler = lambda tag, body: pos_response(None, gateway_rsp_code='1', gateway_rsp_msg='Error')
+        with self.assertRaises(HpsGatewayException) as context:
+            self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(HpsExceptionCodes.unknown_gateway_error, context.exception.code)
+
+    def test_unexpected_transaction_type(self):
+        self.gateway.handler = lambda tag, body: pos_response('CreditAuth', _approval)
+        with self.assertRaises(HpsGatewayException) as context:
+            self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(HpsExceptionCodes.unexpected_gateway_response, context.exception.code)
@@ -0,0 +1,146 @@
+import os
+import pickle
+import unittest
+
+from securesubmit.infrastructure import HpsArgumentException, HpsCreditException, HpsException
+from securesubmit.infrastructure.enums import HpsExceptionCodes
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.services.processes import HpsProcessEngine, HpsProcessResult
+from securesubmit.services.raw import parse_raw_response
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+def _merchant_config(name):
+    config = stub_config()
+    config.secret_api_key = 'skapi_cert_' + name
+    return config
+
+
+class ProcessEngineTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+        class Service(stubbed(HpsCreditService, cls.gateway)):
+            def whoami(self):
+                return os.getpid(), self._config.secret_api_key
+
+            def crash(self):
+                os._exit(3)
+
+            def unpicklable(self):
+                return lambda: None
+
+        cls.service_type = Service
+        cls.merchants = dict((name, _merchant_config(name)) for name in ('a', 'b', 'c', 'd'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _engine(self, processes=2):
+        return HpsProcessEngine(self.merchants, service_type=self.service_type, processes=processes, threads=2,
+                                chunk_size=3)
+
+    def test_results_and_exceptions(self):
+        self.gateway.handler = lambda tag, body: (
+            pos_response(tag, '<RspCode>05</RspCode><RspText>DECLINE</RspText>') if '<Amt>13</Amt>' in body
+            else approval(tag, body))
+        requests = [('abcd'[i % 4], 'charge', (10 + i, 'usd', TestCreditCard.valid_visa)) for i in range(12)]
+
+        with self._engine() as engine:
+            results = sorted(engine.run(requests), key=lambda result: result.index)
+
+        self.assertEqual(range(12), [result.index for result in results])
+        self.assertEqual([request[0] for request in requests], [result.merchant for result in results])
+        for result in results:
+            if result.index == 3:
+                self.assertFalse(result.succeeded)
+                self.assertIsInstance(result.exception, HpsCreditException)
+                self.assertEqual(HpsExceptionCodes.card_declined, result.exception.code)
+                self.assertRaises(HpsCreditException, result.get)
+            else:
+                self.assertEqual('12345A', result.get().authorization_code)
+
+    def test_sharded_by_merchant(self):
+        requests = [('abcd'[i % 4], 'whoami', ()) for i in range(40)]
+
+        with self._engine() as engine:
+            results = list(engine.run(requests))
+            self.assertEqual(40, len(list(engine.run(requests))))
+
+        workers = {}
+        for result in results:
+            pid, api_key = result.get()
+            self.assertEqual('skapi_cert_' + result.merchant, api_key)
+            workers.setdefault(result.merchant, set()).add(pid)
+        self.assertTrue(all(len(pids) == 1 for pids in workers.values()))
+        self.assertEqual(2, len(set.union(*workers.values())))
+        self.assertNotIn(os.getpid(), set.union(*workers.values()))
+
+    def test_single_merchant(self):
+        with HpsProcessEngine(stub_config(), service_type=self.service_type, processes=1) as engine:
+            results = list(engine.run([(None, 'charge', (10, 'usd', TestCreditCard.valid_visa))]))
+        self.assertEqual([None], [result.merchant for result in results])
+        self.assertTrue(results[0].succeeded)
+
+    def test_worker_exit(self):
+        with self._engine() as engine:
+            with self.assertRaises(HpsException):
+                list(engine.run([('a', 'crash', ())]))
+            self.assertIsNone(engine._workers)
+            self.assertEqual(1, len(list(engine.run([('b', 'whoami', ())]))))
+
+    def test_unpicklable_value(self):
+        with self._engine() as engine:
+            results = sorted(engine.run([('a', 'unpicklable', ()), ('b', 'whoami', ())]),
+                             key=lambda result: result.index)
+        self.assertIsInstance(results[0].exception, HpsException)
+        self.assertIn('unpicklable', results[0].exception.message)
+        self.assertTrue(results[1].succeeded)
+
+    def test_abandoned_run(self):
+        with self._engine() as engine:
+            results = engine.run([('abcd'[i % 4], 'whoami', ()) for i in range(12)])
+            next(results)
+            results.close()
+            self.assertIsNone(engine._workers)
+
+            results = list(engine.run([('b', 'whoami', ()), ('c', 'whoami', ())]))
+            self.assertEqual([0, 1], sorted(result.index for result in results))
+            self.assertEqual(['b', 'c'], sorted(result.merchant for result in results))
+
+    def test_invalid_requests(self):
+        engine = self._engine()
+        for request in (('a', 'charge'), ['a', 'charge', ()], ('z', 'charge', ()), ('a', '_submit_transaction', ()),
+                        ('a', 'missing', ())):
+            self.assertRaises(HpsArgumentException, list, engine.run([request]))
+        self.assertIsNone(engine._workers)
+
+
+class ProcessResultTests(unittest.TestCase):
+    def test_pickled_exception(self):
+        inner = Exception('socket')
+        inner.socket = lambda: None
+        exception = HpsCreditException(None, '05', 'DECLINE', '05', 'DECLINE', inner_exception=inner)
+
+        result = pickle.loads(pickle.dumps(HpsProcessResult(1, 'a', exception=exception), 2))
+        self.assertEqual((1, 'a'), (result.index, result.merchant))
+        self.assertIsInstance(result.exception, HpsCreditException)
+        self.assertEqual(('05', 'DECLINE'), (result.exception.code, result.exception.message))
+        self.assertEqual('DECLINE', result.exception.details.issuer_response_text)
+        self.assertIsInstance(result.exception.inner_exception, str)
+        self.assertEqual(str(exception), str(result.exception))
+
+        result = pickle.loads(pickle.dumps(HpsProcessResult(1, 'a', exception=ValueError('bad', inner)), 2))
+        self.assertEqual(('bad', repr(inner)), result.exception.args)
+
+    def test_pickled_raw_response(self):
+        result = pickle.loads(pickle.dumps(HpsProcessResult(0, None, parse_raw_response(
+            sample_responses.CREDIT_SALE)), 2))
+        self.assertEqual('12345A', result.get()['AuthCode'])
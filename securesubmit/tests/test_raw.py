@@ -0,0 +1,147 @@
+import unittest
+
+from securesubmit.infrastructure import HpsCheckException, HpsCreditException, HpsException, HpsGatewayException
+from securesubmit.infrastructure.enums import HpsExceptionCodes
+from securesubmit.services import xmlbackend
+from securesubmit.services.gateway import HpsCheckService, HpsCreditService, HpsGiftCardService
+from securesubmit.services.raw import HpsRawResponse, parse_raw_response
+from securesubmit.tests import sample_responses
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCheck, TestCreditCard, TestGiftCard
+
+
+class _RawResponseConformance(object):
+    backend = None
+
+    def _parse(self, raw_response):
+        return parse_raw_response(raw_response, self.backend)
+
+    def test_header_and_fields(self):
+        response = self._parse(sample_responses.CREDIT_SALE)
+        self.assertEqual(('CreditSale', '1000', '0', 'Success', '42'), (
+            response.transaction_type, response.gateway_txn_id, response.gateway_rsp_code,
+            response.gateway_rsp_msg, response.client_txn_id))
+        self.assertEqual(('00', 'APPROVAL'), (response.response_code, response.response_text))
+        self.assertEqual('12345A', response['AuthCode'])
+        self.assertEqual('supt_abc', response.header.get('TokenData/TokenValue'))
+        self.assertIs(sample_responses.CREDIT_SALE, response.raw)
+
+        self.assertIsNone(response.get('Missing'))
+        self.assertEqual('-', response.get('Missing/Child', '-'))
+        self.assertNotIn('Missing', response)
+        with self.assertRaises(KeyError):
+            response['Missing']
+
+    def test_nested_and_repeated_elements(self):
+        details = self._parse(sample_responses.REPORT_TXN_DETAIL)
+        self.assertEqual('00', details.get('Data/RspCode'))
+        self.assertEqual('memo', details.element('Data').get('AdditionalTxnFields/Description'))
+        self.assertIsNone(details.element('Other'))
+
+        report = self._parse(sample_responses.REPORT_ACTIVITY)
+        rows = report.all('Details')
+        self.assertEqual(50, len(rows))
+        self.assertEqual(('1000', 'CreditVoid'), (rows[0]['GatewayTxnId'], rows[0]['ServiceName']))
+        self.assertEqual('10.00', rows[1].fields()['Amt'])
+        self.assertEqual([], report.all('Data/Details'))
+
+        check = self._parse(sample_responses.CHECK_SALE)
+        self.assertEqual([{'Type': 'Message', 'Code': '0', 'Message': 'Approved'},
+                          {'Type': 'Error', 'Code': '12', 'FieldNumber': '3', 'FieldName': 'Amt'}],
+                         [info.fields() for info in check.all('CheckRspInfo')])
+
+    def test_response_without_transaction(self):
+        response = self._parse(pos_response(None, gateway_rsp_code='1', gateway_rsp_msg='Error'))
+        self.assertIsNone(response.transaction_type)
+        self.assertIsNone(response.response_code)
+        self.assertEqual({}, response.fields())
+        self.assertEqual(('1', 'Error'), (response.gateway_rsp_code, response.gateway_rsp_msg))
+
+    def test_unexpected_document(self):
+        with self.assertRaises(HpsException):
+            self._parse('<html><body>Service Unavailable</body></html>')
+
+    def test_read_only(self):
+        response = self._parse(sample_responses.CREDIT_SALE)
+        with self.assertRaises(AttributeError):
+            response.response_code = '05'
+        with self.assertRaises(AttributeError):
+            response.auth_code = '1'
+
+
+class StdlibRawResponseTests(_RawResponseConformance, unittest.TestCase):
+    backend = xmlbackend.BACKENDS['stdlib']
+
+
+@unittest.skipUnless('lxml' in xmlbackend.BACKENDS, 'lxml is not installed')
+class LxmlRawResponseTests(_RawResponseConformance, unittest.TestCase):
+    backend = xmlbackend.BACKENDS.get('lxml')
+
+
+class RawModeServiceTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _service(self, service_type):
+        config = stub_config()
+        config.raw_responses = True
+        return stubbed(service_type, self.gateway)(config)
+
+    def test_credit(self):
+        service = self._service(HpsCreditService)
+        charge = service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertIsInstance(charge, HpsRawResponse)
+        self.assertEqual(('CreditSale', '00', '12345A'), (charge.transaction_type, charge.response_code,
+                                                          charge['AuthCode']))
+
+        self.gateway.handler = lambda tag, body: sample_responses.REPORT_ACTIVITY
+        self.assertEqual(50, len(service.list().all('Details')))
+
+    def test_credit_validation(self):
+        service = self._service(HpsCreditService)
+        self.gateway.handler = lambda tag, body: pos_response(
+            'CreditSale', '<RspCode>05</RspCode><RspText>DECLINE</RspText>')
+        with self.assertRaises(HpsCreditException) as context:
+            service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(HpsExceptionCodes.card_declined, context.exception.code)
+
+        self.gateway.handler = lambda tag, body: pos_response(None, gateway_rsp_code='1', gateway_rsp_msg='Error')
+        with self.assertRaises(HpsGatewayException) as context:
+            service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(HpsExceptionCodes.unknown_gateway_error, context.exception.code)
+
+        self.gateway.handler = lambda tag, body: pos_response('CreditAuth', '<RspCode>00</RspCode>')
+        with self.assertRaises(HpsGatewayException) as context:
+            service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(HpsExceptionCodes.unexpected_gateway_response, context.exception.code)
+
+    def test_gift_card(self):
+        service = self._service(HpsGiftCardService)
+        self.gateway.handler = lambda tag, body: sample_responses.GIFT_CARD_SALE
+        sale = service.sale(TestGiftCard.valid_gift_card_manual, 10)
+        self.assertEqual(('0', '90.00'), (sale.response_code, sale['BalanceAmt']))
+
+        self.gateway.handler = lambda tag, body: pos_response('GiftCardSale', '<RspCode>13</RspCode>')
+        with self.assertRaises(HpsCreditException):
+            service.sale(TestGiftCard.valid_gift_card_manual, 10)
+
+    def test_check(self):
+        service = self._service(HpsCheckService)
+        self.gateway.handler = lambda tag, body: sample_responses.CHECK_SALE
+        sale = service.sale(TestCheck.approve, 10)
+        self.assertEqual(('0', 'C1'), (sale.response_code, sale['AuthCode']))
+
+        self.gateway.handler = lambda tag, body: sample_responses.CHECK_SALE.replace(
+            '<RspCode>0</RspCode>', '<RspCode>1</RspCode>')
+        with self.assertRaises(HpsCheckException) as context:
+            service.sale(TestCheck.approve, 10)
+        self.assertEqual(('1', 'Transaction Approved'), (context.exception.code, context.exception.message))
+        self.assertEqual(['0', '12'], [details.code for details in context.exception.details])
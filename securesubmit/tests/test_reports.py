@@ -0,0 +1,231 @@
+import datetime
+import re
+import threading
+import time
+import unittest
+
+import xmltodict
+
+from securesubmit.entities.compact import HpsSlottedReportTransactionSummary
+from securesubmit.entities.credit import HpsReportTransactionSummary
+from securesubmit.entities.lazy import HpsLazyReportTransactionSummary
+from securesubmit.infrastructure import HpsArgumentException, HpsAuthenticationException, HpsGatewayException
+from securesubmit.infrastructure.enums import HpsTransactionType
+from securesubmit.services import xmlbackend
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.services.parser import iter_report_rows
+from securesubmit.services.reports import HpsReportFetcher
+from securesubmit.tests import sample_responses
+from securesubmit.tests.sample_responses import _report_detail
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+
+_namespaces = {"http://Hps.Exchange.PosGateway": None,
+               "http://schemas.xmlsoap.org/soap/envelope/": None}
+
+_range_pattern = re.compile(r'<RptStartUtcDT>([^<]*)</RptStartUtcDT><RptEndUtcDT>([^<]*)</RptEndUtcDT>')
+_epoch = datetime.datetime(2016, 1, 1)
+
+
+def _summary(transaction):
+    return (transaction.transaction_id, transaction.original_transaction_id, transaction.masked_card_number,
+            transaction.response_code, transaction.response_text, transaction.amount,
+            transaction.settlement_amount, transaction.transaction_utc_date, transaction.transaction_type,
+            transaction.exceptions is None, transaction._header.gateway_rsp_code)
+
+
+class ReportRowsTests(unittest.TestCase):
+    def test_rows_match_the_dict_parse(self):
+        rsp = xmltodict.parse(sample_responses.REPORT_ACTIVITY, process_namespaces=True,
+                              namespaces=_namespaces)['Envelope']['Body']['PosResponse']['Ver1.0']
+        for backend in xmlbackend.BACKENDS.values():
+            rows = iter_report_rows(sample_responses.REPORT_ACTIVITY, backend)
+            header = next(rows)
+            self.assertEqual(dict(rsp['Header']), header['Header'])
+            self.assertEqual({'ReportActivity': {}}, header['Transaction'])
+            self.assertEqual([dict(row) for row in rsp['Transaction']['ReportActivity']['Details']], list(rows))
+
+    def test_rows_are_yielded_as_chunks_arrive(self):
+        body = sample_responses.REPORT_ACTIVITY
+        read = []
+
+        def chunks():
+            for i in xrange(0, len(body), 256):
+                read.append(i)
+                yield body[i:i + 256]
+
+        for backend in xmlbackend.BACKENDS.values():
+            del read[:]
+            rows = iter_report_rows(chunks(), backend)
+            next(rows)
+            self.assertEqual('1000', next(rows)['GatewayTxnId'])
+            self.assertLess(len(read), 5)
+            self.assertEqual(49, len(list(rows)))
+            self.assertEqual(len(range(0, len(body), 256)), len(read))
+
+    def test_unexpected_response(self):
+        rows = iter_report_rows('<Envelope><Body/></Envelope>')
+        self.assertRaises(Exception, list, rows)
+
+
+class IterListTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway(compress=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.gateway.handler = lambda tag, body: sample_responses.REPORT_ACTIVITY
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _service(self, **settings):
+        config = stub_config()
+        for name, value in settings.items():
+            setattr(config, name, value)
+        return stubbed(HpsCreditService, self.gateway)(config)
+
+    def test_same_summaries_as_list(self):
+        for settings in ({}, {'compress_responses': True}):
+            service = self._service(**settings)
+            for filter_by in (None, HpsTransactionType.Charge):
+                expected = [_summary(transaction) for transaction in service.list(filter_by=filter_by)]
+                summaries = list(service.iter_list(filter_by=filter_by))
+                self.assertEqual(expected, [_summary(transaction) for transaction in summaries])
+                self.assertTrue(all(summary._header is summaries[0]._header for summary in summaries))
+        self.assertEqual(25, len(expected))
+
+    def test_issuer_exceptions(self):
+        self.gateway.handler = lambda tag, body: pos_response(
+            'ReportActivity', _report_detail(1000) + _report_detail(1001, issuer_rsp_code='05'))
+        summaries = list(self._service().iter_list())
+        self.assertIsNone(summaries[0].exceptions)
+        self.assertIsNotNone(summaries[1].exceptions.card_exeption)
+
+    def test_single_and_no_rows(self):
+        self.gateway.handler = lambda tag, body: pos_response('ReportActivity', _report_detail(1000))
+        summaries = list(self._service().iter_list())
+        self.assertEqual(1, len(summaries))
+        self.assertEqual('411111******1111', summaries[0].masked_card_number)
+
+        self.gateway.handler = lambda tag, body: pos_response('ReportActivity')
+        self.assertEqual([], list(self._service().iter_list()))
+
+    def test_gateway_error_before_any_row(self):
+        self.gateway.handler = lambda tag, body: pos_response(
+            'ReportActivity', _report_detail(1000), gateway_rsp_code='-2', gateway_rsp_msg='Authentication Error')
+        summaries = self._service().iter_list()
+        self.assertRaises(HpsAuthenticationException, next, summaries)
+
+    def test_malformed_response(self):
+        self.gateway.handler = lambda tag, body: sample_responses.REPORT_ACTIVITY.replace('</Details>', '</Detail>')
+        self.assertRaises(HpsGatewayException, list, self._service(compress_responses=True).iter_list())
+
+    def test_compact_and_lazy_entities(self):
+        expected = [_summary(transaction) for transaction in self._service().iter_list()]
+        for settings, entity_type in (({'compact_entities': True}, HpsSlottedReportTransactionSummary),
+                                      ({'lazy_entities': True}, HpsLazyReportTransactionSummary)):
+            summaries = list(self._service(**settings).iter_list())
+            self.assertTrue(all(type(summary) is entity_type for summary in summaries))
+            self.assertTrue(all(isinstance(summary, HpsReportTransactionSummary) for summary in summaries))
+            self.assertEqual(expected, [_summary(summary) for summary in summaries])
+
+
+def _hourly_activity(hours, failing=(), delay=0):
+    """A handler reporting a transaction every hour from _epoch, those at
+    both ends of the range included, and failing once for each range
+    starting at one of `failing`."""
+    failing = set(failing)
+    lock = threading.Lock()
+
+    def handler(tag, body):
+        start, end = [datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+                      for value in _range_pattern.search(body).groups()]
+        time.sleep(delay)
+        with lock:
+            if start in failing:
+                failing.remove(start)
+                return pos_response('ReportActivity', gateway_rsp_code='30', gateway_rsp_msg='Timeout')
+        details = []
+        # the gateway lists the newest first
+        for hour in reversed(xrange(hours)):
+            date = _epoch + datetime.timedelta(hours=hour)
+            if start <= date <= end:
+                details.append(_report_detail(1000 + hour).replace(
+                    '2016-01-01T12:00:00.123Z', date.strftime('%Y-%m-%dT%H:%M:%S.000Z')))
+        return pos_response('ReportActivity', ''.join(details))
+
+    return handler
+
+
+class ReportFetcherTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _fetcher(self, **kwargs):
+        return HpsReportFetcher(stubbed(HpsCreditService, self.gateway)(stub_config()), **kwargs)
+
+    def test_merged_in_date_order_without_duplicates(self):
+        self.gateway.handler = _hourly_activity(72)
+        report = self._fetcher(window=datetime.timedelta(hours=12)).fetch(
+            _epoch, _epoch + datetime.timedelta(hours=71))
+
+        self.assertEqual(6, len(report.windows))
+        self.assertTrue(report.complete)
+        summaries = report.summaries()
+        self.assertEqual([_epoch + datetime.timedelta(hours=hour) for hour in range(72)],
+                         [summary.transaction_utc_date for summary in summaries])
+
+    def test_resume_after_failure(self):
+        failing = [_epoch + datetime.timedelta(hours=12), _epoch + datetime.timedelta(hours=36)]
+        self.gateway.handler = _hourly_activity(48, failing)
+        fetcher = self._fetcher(window=datetime.timedelta(hours=12))
+        report = fetcher.fetch(_epoch, _epoch + datetime.timedelta(hours=47))
+
+        self.assertFalse(report.complete)
+        self.assertEqual(failing, [window.utc_start for window in report.failures])
+        self.assertIsInstance(report.failures[0].exception, HpsGatewayException)
+        self.assertRaises(HpsGatewayException, report.summaries)
+
+        requests = len(self.gateway.requests)
+        self.assertIs(report, fetcher.resume(report))
+        self.assertEqual(requests + 2, len(self.gateway.requests))
+        self.assertTrue(report.complete)
+        self.assertEqual(48, len(report.summaries()))
+
+    def test_windows_run_concurrently(self):
+        self.gateway.handler = _hourly_activity(24, delay=0.3)
+        started = time.time()
+        report = self._fetcher(window=datetime.timedelta(hours=4), concurrency=6).fetch(
+            _epoch, _epoch + datetime.timedelta(hours=23))
+        self.assertEqual(6, len(report.windows))
+        self.assertLess(time.time() - started, 1.2)
+        self.assertEqual(24, len(report.summaries()))
+
+    def test_filter_and_range_checks(self):
+        self.gateway.handler = _hourly_activity(24)
+        report = self._fetcher(window=datetime.timedelta(hours=5)).fetch(
+            _epoch, _epoch + datetime.timedelta(hours=23), filter_by=HpsTransactionType.Charge)
+        self.assertEqual(_epoch + datetime.timedelta(hours=23), report.windows[-1].utc_end)
+        self.assertEqual(24, len(report.summaries()))
+        self.assertTrue(all(summary.transaction_type == HpsTransactionType.Charge for summary in report.summaries()))
+
+        self.assertRaises(HpsArgumentException, self._fetcher, window=datetime.timedelta(0))
+        self.assertRaises(HpsArgumentException, self._fetcher, concurrency=0)
+        self.assertRaises(HpsArgumentException, self._fetcher().fetch, None)
+        self.assertRaises(HpsArgumentException, self._fetcher().fetch, _epoch, _epoch - datetime.timedelta(1))
@@ -0,0 +1,153 @@
+import os
+import socket
+import unittest
+
+from securesubmit.infrastructure import HpsDuplicateTransactionException
+from securesubmit.services.gateway import (
+    HpsCreditService,
+    HpsGatewayException,
+    HpsExceptionCodes,
+    HpsTransactionDetails)
+from securesubmit.services.retry import HpsClientTxnIdGenerator, HpsRetryPolicy, _process_node_id
+from securesubmit.tests.stub_gateway import StubGateway, approval, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+from securesubmit.tests.test_transport import in_child
+
+
+def _node(client_txn_id):
+    return (client_txn_id >> HpsClientTxnIdGenerator.SEQUENCE_BITS) & 0xFFFF
+
+
+class ClientTxnIdGeneratorTests(unittest.TestCase):
+    def test_ids_are_unique_and_increasing(self):
+        generator = HpsClientTxnIdGenerator(node_id=7)
+        ids = [generator.next_id() for _ in range(10000)]
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sorted(ids), ids)
+        self.assertTrue(all(0 < i < 2 ** 63 for i in ids))
+        self.assertEqual(7, _node(ids[0]))
+
+    def test_process_node_id_follows_fork(self):
+        generator = HpsClientTxnIdGenerator()
+        parent_node = _node(generator.next_id())
+        child_node, child_pid = in_child(lambda: (_node(generator.next_id()), os.getpid()))
+
+        self.assertEqual(_process_node_id(os.getpid()) & 0xFFFF, parent_node)
+        self.assertEqual(_process_node_id(child_pid) & 0xFFFF, child_node)
+        self.assertEqual(parent_node, _node(generator.next_id()))
+        self.assertEqual(7, _node(HpsClientTxnIdGenerator(node_id=7).next_id()))
+
+    def test_process_node_id_depends_on_the_host(self):
+        self.assertNotEqual(_process_node_id(1234), _process_node_id(1234 + 1))
+        original = socket.gethostname
+        socket.gethostname = lambda: 'another-host'
+        try:
+            other = _process_node_id(os.getpid())
+        finally:
+            socket.gethostname = original
+        self.assertNotEqual(_process_node_id(os.getpid()), other)
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def test_backoff_is_capped(self):
+        policy = HpsRetryPolicy(backoff=0.1, max_backoff=0.3, jitter=False)
+        self.assertEqual([0.1, 0.2, 0.3, 0.3], [policy.delay(n) for n in range(1, 5)])
+
+    def test_jitter_stays_under_ceiling(self):
+        policy = HpsRetryPolicy(backoff=0.1, max_backoff=0.3)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= policy.delay(attempt) <= 0.3)
+
+
+class RetryTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def setUp(self):
+        del self.gateway.requests[:]
+        self.config = stub_config()
+        self.config.retry_policy = HpsRetryPolicy(backoff=0.001)
+        self.service = stubbed(HpsCreditService, self.gateway)(self.config)
+
+    def tearDown(self):
+        self.gateway.handler = approval
+
+    def _drop_first_sale(self, find_response):
+        attempts = []
+
+        def handler(tag, body):
+            if tag == 'FindTransactions':
+                return find_response
+            attempts.append(tag)
+            if len(attempts) == 1:
+                return None
+            return approval(tag, body)
+
+        return handler
+
+    def test_dropped_request_is_retried_when_gateway_has_no_record(self):
+        self.gateway.handler = self._drop_first_sale(pos_response('FindTransactions'))
+
+        details = HpsTransactionDetails()
+        details.client_transaction_id = '12345'
+        response = self.service.charge(10, 'usd', TestCreditCard.valid_visa, details=details)
+
+        self.assertEqual('00', response.response_code)
+        self.assertEqual(['CreditSale', 'FindTransactions', 'CreditSale'],
+                         [b.split('<Transaction><')[1].split('>')[0] for b in self.gateway.requests])
+        self.assertIn('<ClientTxnId>12345</ClientTxnId>', self.gateway.requests[1])
+
+    def test_dropped_request_is_not_retried_when_gateway_has_a_record(self):
+        self.gateway.handler = self._drop_first_sale(pos_response(
+            'FindTransactions', '<Transactions><GatewayTxnId>777</GatewayTxnId></Transactions>'))
+
+        details = HpsTransactionDetails()
+        details.client_transaction_id = '12345'
+        with self.assertRaises(HpsDuplicateTransactionException) as context:
+            self.service.charge(10, 'usd', TestCreditCard.valid_visa, details=details)
+
+        self.assertEqual(HpsExceptionCodes.duplicate_transaction, context.exception.code)
+        self.assertEqual(777, context.exception.transaction_id)
+        self.assertEqual('12345', context.exception.client_transaction_id)
+        self.assertEqual(2, len(self.gateway.requests))
+
+    def test_client_txn_id_is_generated(self):
+        self.gateway.handler = self._drop_first_sale(pos_response('FindTransactions'))
+
+        response = self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual('00', response.response_code)
+        self.assertIsNotNone(response.client_transaction_id)
+        self.assertEqual(3, len(self.gateway.requests))
+
+    def test_no_retry_without_client_txn_id(self):
+        self.config.retry_policy.generate_client_txn_id = False
+        self.gateway.handler = self._drop_first_sale(pos_response('FindTransactions'))
+
+        with self.assertRaises(HpsGatewayException) as context:
+            self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(HpsExceptionCodes.unknown_gateway_error, context.exception.code)
+        self.assertEqual(1, len(self.gateway.requests))
+
+    def test_dropped_lookup_is_not_retried(self):
+        self.config.retry_policy = HpsRetryPolicy(backoff=0, max_backoff=0)
+        self.gateway.handler = lambda tag, body: None
+
+        with self.assertRaises(HpsGatewayException):
+            self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(['CreditSale', 'FindTransactions'],
+                         [b.split('<Transaction><')[1].split('>')[0] for b in self.gateway.requests])
+        self.assertNotIn('<ClientTxnId>', self.gateway.requests[1].split('<Transaction>')[0])
+
+    def test_refused_connection_fails_after_retries(self):
+        self.service._url = 'http://127.0.0.1:1/'
+        with self.assertRaises(HpsGatewayException):
+            self.service.charge(10, 'usd', TestCreditCard.valid_visa)
+        self.assertEqual(0, len(self.gateway.requests))
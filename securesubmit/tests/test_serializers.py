@@ -0,0 +1,179 @@
+import copy
+import unittest
+import xml.etree.cElementTree as Et
+
+from securesubmit.entities import HpsDirectMarketData, HpsTransactionDetails
+from securesubmit.entities.check import HpsCheckHolder
+from securesubmit.entities.credit import HpsEncryptionData
+from securesubmit.infrastructure import HpsGatewayException
+from securesubmit.infrastructure.enums import CheckTypeType, DataEntryModeType, HpsExceptionCodes
+from securesubmit.services import xmlbackend
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.services.serializers import SCHEMAS, get_serializer, serialize
+from securesubmit.tests import element_requests
+from securesubmit.tests.stub_gateway import StubGateway, stub_config, stubbed
+from securesubmit.tests.test_data import TestCardHolder, TestCheck, TestCreditCard, TestGiftCard
+
+
+def _tostring(element):
+    """`element` as ElementTree writes it, whichever backend built it."""
+    return Et.tostring(Et.fromstring(xmlbackend.etree.tostring(element)))
+
+
+def _details():
+    details = HpsTransactionDetails()
+    details.memo = u'caf\xe9 & <bar>'
+    details.customer_id = '42'
+    details.invoice_number = 'INV-1'
+    return details
+
+
+def _encrypted_card():
+    card = copy.deepcopy(TestCreditCard.valid_visa)
+    card.encryption_data = HpsEncryptionData()
+    card.encryption_data.version = '01'
+    card.encryption_data.encrypted_track_number = 2
+    card.encryption_data.ktb = 'ktb'
+    return card
+
+
+_cards = [
+    TestCreditCard.valid_visa,
+    TestCreditCard.valid_visa_no_cvv,
+    _encrypted_card(),
+    TestCreditCard.valid_visa_track,
+    TestCreditCard.valid_visa_track_e3v2,
+    'supt_token"&',
+]
+
+
+class SerializerTests(unittest.TestCase):
+    def assertSameXml(self, tag, reference, **arguments):
+        self.assertEqual(_tostring(reference), serialize(tag, **arguments).xml)
+
+    def test_credit_sale(self):
+        for card in _cards:
+            for card_holder in (None, TestCardHolder.valid_card_holder):
+                self.assertSameXml(
+                    'CreditSale',
+                    element_requests.credit_sale(10, card, card_holder),
+                    amount=10, card_data=card, card_holder=card_holder,
+                    request_multi_use_token=False, descriptor=None, allow_partial_auth=False,
+                    details=None, direct_market_data=None, cpc_req=False,
+                    card_present=False, reader_present=False)
+
+        options = dict(card_holder=TestCardHolder.valid_card_holder, request_multi_use_token=True,
+                       descriptor='desc', allow_partial_auth=True, details=_details(),
+                       direct_market_data=HpsDirectMarketData('123', 1, 2), cpc_req=True,
+                       card_present=True, reader_present=True)
+        self.assertSameXml(
+            'CreditSale',
+            element_requests.credit_sale('10.50', TestCreditCard.valid_visa, **options),
+            amount='10.50', card_data=TestCreditCard.valid_visa, **options)
+
+    def test_credit_auth_and_verify(self):
+        for card in _cards:
+            options = dict(card_holder=TestCardHolder.valid_card_holder, request_multi_use_token=True,
+                           card_present=True, reader_present=False)
+            self.assertSameXml(
+                'CreditAccountVerify',
+                element_requests.credit_account_verify(card, **options),
+                card_data=card, **options)
+
+            options.update(descriptor=None, allow_partial_auth=True, details=_details(), cpc_req=False)
+            self.assertSameXml(
+                'CreditAuth',
+                element_requests.credit_auth(5, card, **options),
+                amount=5, card_data=card, **options)
+
+    def test_credit_return_and_reversal(self):
+        for card in (TestCreditCard.valid_visa, 'token', 1234):
+            for details in (None, _details(), HpsTransactionDetails()):
+                self.assertSameXml(
+                    'CreditReturn',
+                    element_requests.credit_return(5, card, TestCardHolder.valid_card_holder, details),
+                    amount=5, card_data=card, card_holder=TestCardHolder.valid_card_holder,
+                    details=details, card_present=False, reader_present=False)
+                self.assertSameXml(
+                    'CreditReversal',
+                    element_requests.credit_reversal(5, card, details),
+                    amount=5, card_data=card, details=details, card_present=False, reader_present=False)
+
+    def test_gift_card_sale(self):
+        encrypted = copy.deepcopy(TestGiftCard.valid_gift_card_manual)
+        encrypted.encryption_data = HpsEncryptionData()
+        encrypted.encryption_data.version = '01'
+
+        for gift_card in (TestGiftCard.valid_gift_card_manual, encrypted):
+            for currency in ('usd', 'points', 'eur'):
+                self.assertSameXml(
+                    'GiftCardSale',
+                    element_requests.gift_card_sale(10, gift_card, currency, 1, None),
+                    amount=10, gift_card=gift_card, currency=currency, gratuity=1, tax=None)
+
+    def test_check_sale(self):
+        full = copy.deepcopy(TestCheck.approve)
+        full.check_verify = True
+        full.check_type = CheckTypeType.business
+        full.data_entry_mode = DataEntryModeType.swipe
+        full.check_holder.ssnl4 = '1234'
+        full.check_holder.dob_year = '1980'
+
+        no_holder = copy.deepcopy(TestCheck.approve)
+        no_holder.check_holder = None
+
+        no_address = copy.deepcopy(TestCheck.approve)
+        no_address.check_holder = HpsCheckHolder()
+
+        for check in (TestCheck.approve, full, no_holder, no_address):
+            for action in ('SALE', 'RETURN'):
+                self.assertSameXml(
+                    'CheckSale',
+                    element_requests.check_sale(action, check, 10),
+                    action=action, check=check, amount=10)
+
+    def test_schema_builds_the_same_element(self):
+        arguments = dict(amount=10, card_data=TestCreditCard.valid_visa_track,
+                         card_holder=TestCardHolder.valid_card_holder, request_multi_use_token=False,
+                         descriptor='d', allow_partial_auth=False, details=_details(),
+                         direct_market_data=None, cpc_req=False, card_present=False, reader_present=False)
+        serializer = get_serializer('CreditSale')
+        self.assertEqual(Et.tostring(serializer.schema.to_element(arguments)),
+                         serializer.serialize(arguments))
+
+    def test_serializers_are_compiled_once(self):
+        for tag in SCHEMAS:
+            self.assertIs(get_serializer(tag), get_serializer(tag))
+
+
+class SerializedTransactionTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def test_charge_sends_serialized_request(self):
+        service = stubbed(HpsCreditService, self.gateway)(stub_config())
+        response = service.charge(10, 'usd', TestCreditCard.valid_visa, TestCardHolder.valid_card_holder)
+
+        self.assertEqual('00', response.response_code)
+        expected = _tostring(element_requests.credit_sale(
+            10, TestCreditCard.valid_visa, TestCardHolder.valid_card_holder))
+        self.assertIn('<Transaction>' + expected + '</Transaction>', self.gateway.requests[-1])
+
+    def test_bad_argument_is_a_gateway_error(self):
+        service = stubbed(HpsCreditService, self.gateway)(stub_config())
+        details = HpsTransactionDetails()
+        details.memo = 5
+        requests = len(self.gateway.requests)
+
+        with self.assertRaises(HpsGatewayException) as context:
+            service.charge(10, 'usd', TestCreditCard.valid_visa, details=details)
+        self.assertEqual(HpsExceptionCodes.unknown_gateway_error, context.exception.code)
+        self.assertIsInstance(context.exception.inner_exception, TypeError)
+        self.assertEqual(requests, len(self.gateway.requests))
@@ -0,0 +1,81 @@
+import unittest
+
+from securesubmit.services import tls
+from securesubmit.services.tls import HpsTlsContext, get_ssl_context, handshake_counts
+from securesubmit.services.transport import HpsHttpTransport, get_transport
+from securesubmit.tests.stub_gateway import StubGateway, pos_response
+from securesubmit.tests.test_transport import in_child
+
+
+class TlsContextTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway(lambda tag, body: pos_response(tag), tls=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def _request(self, transport):
+        return transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>').status
+
+    def test_sessions_are_resumed(self):
+        context = HpsTlsContext(self.gateway.ca_certs)
+        transport = HpsHttpTransport(ssl_context=context)
+
+        self.assertEqual(200, self._request(transport))
+        self.assertEqual(200, self._request(transport))
+        self.assertEqual((1, 0), context.handshakes())
+
+        # idle connections closed, as after an idle timeout
+        transport.clear()
+        self.assertEqual(200, self._request(transport))
+        self.assertEqual((1, 1), context.handshakes())
+
+        # a connection opened while another is still open
+        self.assertEqual(1, transport.warm_up(self.gateway.url, 2).opened)
+        self.assertEqual((1, 2), context.handshakes())
+
+    def test_transports_share_the_context(self):
+        context = HpsTlsContext(self.gateway.ca_certs)
+        self.assertEqual(200, self._request(HpsHttpTransport(ssl_context=context)))
+        self.assertEqual(200, self._request(HpsHttpTransport(ssl_context=context)))
+        self.assertEqual((1, 1), context.handshakes())
+
+    def test_server_is_verified(self):
+        transport = HpsHttpTransport(ssl_context=HpsTlsContext())
+        self.assertRaises(Exception, transport.request, 'POST', self.gateway.url, body='', retries=False)
+
+    def test_shared_context(self):
+        context = get_ssl_context()
+        self.assertIs(context, get_ssl_context())
+        self.assertEqual(context.handshakes(), handshake_counts())
+        self.assertIs(context, get_transport()._manager.connection_pool_kw['ssl_context'])
+        self.assertEqual((False, (0, 0)), in_child(lambda: (get_ssl_context() is context, handshake_counts())))
+        self.assertIs(context, tls._context)
+
+    def test_hosts_given_by_address_keep_sessions_apart(self):
+        class Socket(object):
+            def __init__(self, address):
+                self.address = address
+
+            def getpeername(self):
+                return self.address, 443
+
+        self.assertNotEqual(tls._session_key(Socket('10.0.0.1'), None), tls._session_key(Socket('10.0.0.2'), None))
+        self.assertEqual(tls._session_key(Socket('10.0.0.1'), None), tls._session_key(Socket('10.0.0.1'), None))
+
+    def test_without_the_private_bindings(self):
+        reused = tls._SSL_session_reused
+        tls._SSL_session_reused = None
+        try:
+            context = HpsTlsContext(self.gateway.ca_certs)
+            transport = HpsHttpTransport(ssl_context=context)
+            self.assertEqual(200, self._request(transport))
+            transport.clear()
+            self.assertEqual(200, self._request(transport))
+            self.assertEqual((2, 0), context.handshakes())
+        finally:
+            tls._SSL_session_reused = reused
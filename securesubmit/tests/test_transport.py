@@ -0,0 +1,262 @@
+import os
+import pickle
+import socket
+import threading
+import time
+import unittest
+
+from urllib3.exceptions import NewConnectionError
+
+from securesubmit.infrastructure import HpsGatewayException
+from securesubmit.infrastructure.enums import HpsExceptionCodes
+from securesubmit.services import HpsServicesConfig, transport as transport_module
+from securesubmit.services.gateway import HpsCreditService
+from securesubmit.services.token import HpsTokenService
+from securesubmit.services.transport import (
+    HpsHttpTransport, HpsPoolSettings, HpsWarmUpReport, get_transport, reset_transport)
+from securesubmit.tests.stub_gateway import StubGateway, pos_response, stub_config, stubbed
+from securesubmit.tests.test_data import TestCreditCard
+
+
+def in_child(function):
+    """Run `function` in a forked child and return what it returned."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read)
+            os.write(write, pickle.dumps(function()))
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    chunks = []
+    chunk = os.read(read, 65536)
+    while chunk:
+        chunks.append(chunk)
+        chunk = os.read(read, 65536)
+    os.close(read)
+    os.waitpid(pid, 0)
+    return pickle.loads(''.join(chunks)) if chunks else None
+
+
+def _closed_url():
+    """The URL of a local port nothing listens on."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+    return 'http://127.0.0.1:{0}/'.format(port)
+
+
+class TransportTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def test_services_with_same_settings_share_a_transport(self):
+        self.assertIs(get_transport(HpsServicesConfig()), get_transport(HpsServicesConfig()))
+        self.assertIs(get_transport(), get_transport(HpsServicesConfig()))
+
+    def test_pool_settings_come_from_config(self):
+        config = HpsServicesConfig()
+        config.pool_maxsize = 3
+        config.pool_block = True
+
+        transport = get_transport(config)
+        self.assertEqual(3, transport.settings.maxsize)
+        self.assertTrue(transport.settings.block)
+        self.assertIsNot(transport, get_transport())
+
+    def test_pool_grows_to_observed_concurrency(self):
+        release = threading.Event()
+
+        def slow_handler(tag, body):
+            release.wait(5)
+            return pos_response(tag)
+
+        self.gateway.handler = slow_handler
+        transport = HpsHttpTransport(HpsPoolSettings(maxsize=2, max_auto_size=8))
+        threads = [threading.Thread(target=transport.request, args=('POST', self.gateway.url),
+                                    kwargs={'body': '<Transaction><CreditSale/>'})
+                   for _ in range(6)]
+        try:
+            for thread in threads:
+                thread.start()
+            deadline = time.time() + 5
+            while transport.stats(self.gateway.url)[0] < 6 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        in_flight, peak, maxsize = transport.stats(self.gateway.url)
+        self.assertEqual(0, in_flight)
+        self.assertEqual(6, peak)
+        self.assertEqual(6, maxsize)
+        self.assertEqual(6, transport._manager.connection_from_url(self.gateway.url).pool.maxsize)
+
+    def test_idle_connections_are_reaped(self):
+        self.gateway.handler = lambda tag, body: pos_response(tag)
+        transport = HpsHttpTransport(HpsPoolSettings(idle_timeout=0))
+        transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+
+        pool = transport._manager.connection_from_url(self.gateway.url)
+        self.assertEqual(1, len([c for c in pool.pool.queue if c is not None]))
+
+        time.sleep(0.01)
+        transport.reap_idle()
+        self.assertEqual(0, len([c for c in pool.pool.queue if c is not None]))
+
+    def test_reaping_while_requests_run(self):
+        self.gateway.handler = lambda tag, body: pos_response(tag)
+        transport = HpsHttpTransport(HpsPoolSettings(maxsize=2, idle_timeout=0))
+        transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+        queue = transport._manager.connection_from_url(self.gateway.url).pool
+
+        base = queue.__class__
+
+        class SlowQueue(base):
+            # widens the gap a request could hand its connection back in
+            def _get(self):
+                time.sleep(0.001)
+                return base._get(self)
+        queue.__class__ = SlowQueue
+
+        errors = []
+        done = threading.Event()
+
+        def send():
+            try:
+                for _ in range(30):
+                    transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+            except Exception, e:
+                errors.append(e)
+
+        def reap():
+            try:
+                while not done.is_set():
+                    transport.reap_idle()
+            except Exception, e:
+                errors.append(e)
+
+        reaper = threading.Thread(target=reap)
+        reaper.start()
+        senders = [threading.Thread(target=send) for _ in range(6)]
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join(30)
+        done.set()
+        reaper.join(5)
+
+        self.assertEqual([], errors)
+        self.assertEqual(queue.maxsize, queue.qsize())
+
+    def _connections(self, transport):
+        pool = transport._manager.connection_from_url(self.gateway.url)
+        return [c for c in pool.pool.queue if c is not None]
+
+    def test_pools_are_rebuilt_after_fork(self):
+        self.gateway.handler = lambda tag, body: pos_response(tag)
+        transport = HpsHttpTransport()
+        transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+        manager = transport._manager
+        connection = self._connections(transport)[0]
+
+        def child():
+            response = transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+            return response.status, transport._manager is manager, self._connections(transport)[0] is connection
+
+        self.assertEqual((200, False, False), in_child(child))
+        self.assertIs(manager, transport._manager)
+        self.assertEqual([connection], self._connections(transport))
+        self.assertIsNotNone(connection.sock)
+
+    def test_registry_lock_held_at_fork(self):
+        transport = get_transport()
+        with transport_module._transports_lock:
+            result = in_child(lambda: get_transport() is transport)
+        self.assertTrue(result)
+
+    def test_reset_transport(self):
+        self.gateway.handler = lambda tag, body: pos_response(tag)
+        transport = get_transport()
+        transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+        manager = transport._manager
+
+        reset_transport()
+        self.assertIs(transport, get_transport())
+        self.assertIsNot(manager, transport._manager)
+        self.assertEqual(200, transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>').status)
+
+
+class WarmUpTests(unittest.TestCase):
+    gateway = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway.stop()
+
+    def _connections(self, transport):
+        pool = transport._manager.connection_from_url(self.gateway.url)
+        return [c for c in pool.pool.queue if c is not None and c.sock is not None]
+
+    def test_connections_are_opened_and_pooled(self):
+        transport = HpsHttpTransport()
+        report = transport.warm_up(self.gateway.url, 3)
+
+        self.assertEqual((3, 0, 3), (report.opened, report.reused, report.connections))
+        self.assertTrue(all(elapsed >= 0 for elapsed in report.handshake_times))
+        self.assertEqual(max(report.handshake_times), report.slowest)
+        connections = self._connections(transport)
+        self.assertEqual(3, len(connections))
+
+        report = transport.warm_up(self.gateway.url, 3)
+        self.assertEqual((0, 3), (report.opened, report.reused))
+        self.assertIsNone(report.slowest)
+
+        transport.request('POST', self.gateway.url, body='<Transaction><CreditSale/>')
+        self.assertEqual(set(connections), set(self._connections(transport)))
+
+    def test_pool_grows_to_the_connections_asked_for(self):
+        transport = HpsHttpTransport(HpsPoolSettings(maxsize=2, max_auto_size=3))
+        self.assertEqual(3, transport.warm_up(self.gateway.url, 5).opened)
+        self.assertEqual((0, 0, 3), transport.stats(self.gateway.url))
+
+        transport = HpsHttpTransport(HpsPoolSettings(maxsize=2, auto_size=False))
+        self.assertEqual(2, transport.warm_up(self.gateway.url, 5).opened)
+
+    def test_connection_failure(self):
+        url = _closed_url()
+        transport = HpsHttpTransport()
+        self.assertRaises(NewConnectionError, transport.warm_up, url, 2)
+        self.assertEqual(0, len([c for c in transport._manager.connection_from_url(url).pool.queue
+                                 if c is not None and c.sock is not None]))
+
+    def test_services(self):
+        credit = stubbed(HpsCreditService, self.gateway)(stub_config())
+        report = credit.warm_up(2)
+        self.assertIsInstance(report, HpsWarmUpReport)
+        self.assertEqual(2, report.connections)
+        self.assertEqual('00', credit.charge(10, 'usd', TestCreditCard.valid_visa).response_code)
+
+        credit._url = _closed_url()
+        with self.assertRaises(HpsGatewayException) as context:
+            credit.warm_up()
+        self.assertEqual(HpsExceptionCodes.unknown_gateway_error, context.exception.code)
+
+        tokens = HpsTokenService('pkapi_cert_jKc1FtuyAydZhZfbB3')
+        tokens._url = self.gateway.url
+        self.assertEqual(1, tokens.warm_up().connections)
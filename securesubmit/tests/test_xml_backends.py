@@ -0,0 +1,97 @@
+import unittest
+
+import xmltodict
+
+from securesubmit.entities.credit import HpsCharge, HpsReversal, HpsVoid
+from securesubmit.infrastructure import HpsException
+from securesubmit.services import xmlbackend
+from securesubmit.services.parser import parse_response
+from securesubmit.services.xmlbackend import BACKENDS, PORTICO_NAMESPACES, _DictTarget
+from securesubmit.tests.stub_gateway import pos_response
+from securesubmit.tests.test_parser import _approval, _state, _token_data
+
+_details = ('<Details><GatewayTxnId>1</GatewayTxnId><TxnStatus>A</TxnStatus></Details>'
+            '<Details><GatewayTxnId>2</GatewayTxnId><TxnStatus xsi:nil="true"/></Details>'
+            '<Details><GatewayTxnId>3</GatewayTxnId><Memo>caf\xc3\xa9 &amp; <![CDATA[<bar>]]></Memo></Details>')
+
+ENVELOPES = [
+    pos_response('CreditSale', _approval, client_txn_id='42', header_extra=_token_data),
+    pos_response('CreditSale', '<RspCode>05</RspCode><RspText>DECLINE</RspText>'),
+    pos_response('CreditSale', ''),
+    pos_response(None, gateway_rsp_code='-2', gateway_rsp_msg='Authentication Error'),
+    pos_response('ReportActivity', _details),
+    pos_response('CreditVoid', '<Note lang="en">voided <Code>00</Code></Note>'),
+    pos_response('CreditSale', '<Other xmlns="urn:other"><RspCode>00</RspCode></Other>'),
+    pos_response('CreditSale', _approval).replace('><', '>\n    <'),
+]
+
+
+def _request(etree):
+    transaction = etree.Element('CreditSale')
+    block1 = etree.SubElement(transaction, 'Block1')
+    etree.SubElement(block1, 'Amt').text = '10'
+    etree.SubElement(block1, 'AllowDup').text = 'Y'
+    holder = etree.SubElement(block1, 'CardHolderData')
+    etree.SubElement(holder, 'CardHolderFirstName').text = u'J\xfcrgen & <Sons>'
+    etree.SubElement(holder, 'CardHolderLastName')
+    token = etree.SubElement(etree.SubElement(block1, 'CardData'), 'TokenData')
+    token.set('type', 'a"b')
+    etree.SubElement(token, 'TokenValue').text = 'supt_abc'
+    return transaction
+
+
+class _BackendConformance(object):
+    """The same envelopes through a backend, compared with what the
+    standard library backend makes of them."""
+
+    backend = None
+
+    def test_parse_matches_xmltodict(self):
+        for raw_response in ENVELOPES:
+            expected = xmltodict.parse(raw_response, process_namespaces=True, namespaces=PORTICO_NAMESPACES)
+            self.assertEqual(expected, self.backend.parse(raw_response))
+
+    def test_parse_response_matches(self):
+        for raw_response in ENVELOPES[:4]:
+            for entity_type in (HpsCharge, HpsReversal, HpsVoid):
+                expected = parse_response(raw_response, entity_type, BACKENDS['stdlib'])
+                actual = parse_response(raw_response, entity_type, self.backend)
+                self.assertEqual(_state(expected.entity), _state(actual.entity))
+                self.assertEqual(expected.transaction_type, actual.transaction_type)
+
+    def test_chunked_responses(self):
+        for raw_response in ENVELOPES:
+            chunks = [raw_response[i:i + 7] for i in range(0, len(raw_response), 7)]
+            self.assertEqual(self.backend.parse(raw_response), self.backend.parse(iter(chunks)))
+            self.assertEqual(self.backend.etree.tostring(self.backend.tree(raw_response)),
+                             self.backend.etree.tostring(self.backend.tree(iter(chunks))))
+            self.assertEqual(_state(parse_response(raw_response, HpsCharge, self.backend).entity),
+                             _state(parse_response(iter(chunks), HpsCharge, self.backend).entity))
+
+    def test_unexpected_document(self):
+        self.assertRaises(HpsException, parse_response, '<html><body>Bad Gateway</body></html>',
+                          HpsCharge, self.backend)
+        self.assertRaises(Exception, parse_response, '<html><body>', HpsCharge, self.backend)
+
+    def test_builds_the_same_request(self):
+        etree = self.backend.etree
+        expected = xmltodict.parse(BACKENDS['stdlib'].etree.tostring(_request(BACKENDS['stdlib'].etree)))
+        self.assertEqual(expected, xmltodict.parse(etree.tostring(_request(etree))))
+
+
+class StdlibBackendTests(_BackendConformance, unittest.TestCase):
+    backend = BACKENDS['stdlib']
+
+    def test_dict_target_matches_xmltodict(self):
+        for raw_response in ENVELOPES:
+            expected = xmltodict.parse(raw_response, process_namespaces=True, namespaces=PORTICO_NAMESPACES)
+            self.assertEqual(expected, self.backend.feed(raw_response, _DictTarget(PORTICO_NAMESPACES)))
+
+
+@unittest.skipUnless('lxml' in BACKENDS, 'lxml is not installed')
+class LxmlBackendTests(_BackendConformance, unittest.TestCase):
+    backend = BACKENDS.get('lxml')
+
+    def test_is_the_default(self):
+        self.assertIs(self.backend, xmlbackend.backend)
+        self.assertIs(self.backend.etree, xmlbackend.etree)